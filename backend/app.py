@@ -1,56 +1,334 @@
-from flask import Flask, request, jsonify
-import pdfplumber
+"""Flask API for soil and leaf report extraction and LLM commentary.
+
+Routes live on the ``api`` blueprint and ``create_app()`` builds the app
+(``gunicorn 'app:create_app()'``); the module-level ``app`` serves
+``python app.py`` and ``flask run``. pdfplumber, the OCR libraries and
+openai are imported on first use by the subsystem that needs them, so a
+worker starts in a fraction of the time and a process that only serves
+comments never loads the PDF stack. Set ``APP_WARMUP=1`` (or call
+``warmup()``) to import them up front instead, e.g. in the master of a
+preforking server so every worker inherits them.
+
+The caches, the job store and the thread pools are created on first use
+in each process (see ``process_local``), so SQLite connections and pool
+threads are never shared across a fork.
+"""
+from flask import (Blueprint, Flask, Response, current_app, g, request,
+                   jsonify, stream_with_context)
 import os
-import traceback
-from pdf2image import convert_from_bytes
-import pytesseract
-from PIL import Image
+import io
+import contextvars
+import json
+import hashlib
+import tempfile
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing
 from flask_cors import CORS
+from werkzeug.exceptions import RequestEntityTooLarge
 import re
-import difflib
-import openai
 from dotenv import load_dotenv
+from ocr_pipeline import ocr_pdf_bytes, ocr_settings
+from cache import TieredCache
+from jobs import JobQueue, JobStore, QueueFull
+from llm_gateway import LLMGateway, LLMUnavailable
+from metrics import (ANALYSES, BATCH_FILES, PAGES, REGISTRY, STAGE_SECONDS,
+                     TABLES)
+from nutrient_names import canonical_name
+from process_local import process_local
+from prompts import (plant_summary_prompt, section_nutrients, soil_prompt,
+                     template_id)
+from tracing import TraceBuffer, activate, set_current, traced
+from tracing import event as trace_event
 load_dotenv()
 
 OPENAI_API_KEY = os.environ.get('OPENAI_API_KEY')
-client = openai.OpenAI(api_key=OPENAI_API_KEY)
 
-app = Flask(__name__)
-CORS(app)
+
+def warmup():
+    """Import the PDF, OCR and OpenAI libraries now rather than on first use.
+
+    The client itself is still created lazily: its connection pool must
+    not be shared across a fork.
+    """
+    import openai  # noqa: F401
+    import pdf2image  # noqa: F401
+    import pdfplumber  # noqa: F401
+    import pytesseract  # noqa: F401
+
+
+api = Blueprint('api', __name__)
+
+# Bump whenever a change to the extraction code alters its output, so cached
+# results from older parsers are never served.
+PARSER_VERSION = '4'
+
+# Pages with fewer characters than this in their text layer are treated as
+# scanned images and OCR'd instead of parsed by pdfplumber
+TEXT_LAYER_MIN_CHARS = int(os.environ.get('TEXT_LAYER_MIN_CHARS', 20))
+
+# Sampled per-request stage traces, read back through /debug/traces
+TRACES = TraceBuffer(
+    capacity=int(os.environ.get('TRACE_BUFFER_SIZE', 64)),
+    max_events=int(os.environ.get('TRACE_MAX_EVENTS', 256)),
+    sample_rate=float(os.environ.get('TRACE_SAMPLE_RATE', 0)))
+# Only these endpoints are traced; scrapes and polls would flood the buffer
+TRACED_ENDPOINTS = {'api.extract_soil_report',
+                    'api.extract_soil_report_batch', 'api.submit_extraction_job',
+                    'api.generate_comments', 'api.generate_soil_comments',
+                    'api.generate_soil_comments_batch'}
+
+
+@api.before_request
+def start_trace():
+    trace = None
+    if TRACES.enabled and request.endpoint in TRACED_ENDPOINTS:
+        trace = TRACES.start(request.endpoint)
+    g.trace = trace
+    set_current(trace)
+
+
+@api.after_request
+def add_trace_header(response):
+    trace = g.get('trace')
+    if trace is not None:
+        response.headers['X-Trace-Id'] = trace.id
+    return response
+
+
+@api.teardown_request
+def finish_trace(exc):
+    # Runs once the view returns and, for a streamed response, again once
+    # the stream has been sent, so the duration covers the whole stream
+    trace = g.get('trace')
+    if trace is not None:
+        trace.finish()
+    set_current(None)
+
+
+extraction_cache = process_local(lambda: TieredCache(
+    memory_entries=int(os.environ.get('EXTRACTION_CACHE_MEMORY_ENTRIES', 64)),
+    disk_path=os.environ.get(
+        'EXTRACTION_CACHE_PATH',
+        os.path.join(tempfile.gettempdir(), 'plant-therapy-cache',
+                     'extraction.sqlite3')),
+    disk_max_bytes=int(os.environ.get(
+        'EXTRACTION_CACHE_MAX_BYTES', 256 * 1024 * 1024))))
+
+
+def extraction_settings_digest():
+    """Hash of the server settings that shape extracted analyses.
+
+    The disk tier outlives restarts, so a change to the OCR rendering or
+    to page routing must not serve analyses made under the old settings.
+    """
+    settings = dict(ocr_settings(),
+                    text_layer_min_chars=TEXT_LAYER_MIN_CHARS)
+    payload = json.dumps(settings, sort_keys=True)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()[:16]
+
+
+# A streamed extraction keeps its analyses for the extraction cache only
+# up to this many bytes of records; past it they are dropped as they are
+# sent and the result is not cached
+STREAM_CACHE_MAX_BYTES = int(os.environ.get(
+    'STREAM_CACHE_MAX_BYTES', 4 * 1024 * 1024))
+
+
+def extraction_cache_key(pdf_bytes, options=None):
+    key = (f'{PARSER_VERSION}:{extraction_settings_digest()}:'
+           f'{hashlib.sha256(pdf_bytes).hexdigest()}')
+    if options:
+        # Page budgets and filters can change the result
+        key += ':' + json.dumps(options, sort_keys=True)
+    return key
+
+
+def extraction_options():
+    """Page budget and stop options for iter_analyses from the query string.
+
+    ``max_pages`` and ``max_analyses`` take integers; ``nutrient_pages_only=1``
+    skips pages whose text mentions no nutrients or report metadata.
+    """
+    options = {}
+    for name in ('max_pages', 'max_analyses'):
+        value = request.args.get(name, type=int)
+        if value is not None and value > 0:
+            options[name] = value
+    if request.args.get('nutrient_pages_only', '').lower() in ('1', 'true'):
+        options['nutrient_pages_only'] = True
+    return options
+
+
+COMMENTS_MODEL = 'gpt-3.5-turbo'
+# Upper bound on completions in flight from batch endpoints
+llm_executor = process_local(lambda: ThreadPoolExecutor(
+    max_workers=int(os.environ.get('LLM_MAX_CONCURRENCY', 8)),
+    thread_name_prefix='llm'))
+
+# Every completion goes through here; see llm_gateway for the limits
+llm_gateway = LLMGateway(
+    api_key=OPENAI_API_KEY,
+    base_url=os.environ.get('LLM_BASE_URL'),
+    timeout=float(os.environ.get('LLM_TIMEOUT', 30)),
+    max_retries=int(os.environ.get('LLM_MAX_RETRIES', 4)),
+    backoff_max=float(os.environ.get('LLM_BACKOFF_MAX', 30)),
+    requests_per_minute=int(os.environ.get('LLM_REQUESTS_PER_MINUTE', 0)),
+    tokens_per_minute=int(os.environ.get('LLM_TOKENS_PER_MINUTE', 0)),
+    max_in_flight=int(os.environ.get(
+        'LLM_MAX_IN_FLIGHT', os.environ.get('LLM_MAX_CONCURRENCY', 8))))
+
+llm_cache = process_local(lambda: TieredCache(
+    memory_entries=int(os.environ.get('LLM_CACHE_MEMORY_ENTRIES', 512)),
+    disk_path=os.environ.get('LLM_CACHE_PATH'),
+    disk_max_bytes=int(os.environ.get(
+        'LLM_CACHE_MAX_BYTES', 64 * 1024 * 1024)),
+    ttl=int(os.environ.get('LLM_CACHE_TTL', 24 * 3600))))
+
+
+def llm_cache_key(section, deficient, optimal, excess, nutrients=()):
+    """Hash of everything that shapes a generated summary.
+
+    Nutrient name lists are sorted and the nutrient rows reduced to the
+    fields the prompts use, so equivalent requests share an entry. The
+    versioned template id changes whenever the prompt wording does.
+    """
+    normalized = {
+        'template': template_id(section),
+        'section': section,
+        'deficient': sorted(deficient),
+        'optimal': sorted(optimal),
+        'excess': sorted(excess),
+        'nutrients': sorted(
+            (json.dumps({field: n.get(field) for field in
+                         ('name', 'current', 'unit', 'ideal', 'ideal_range')},
+                        sort_keys=True)
+             for n in nutrients)),
+        'model': COMMENTS_MODEL
+    }
+    payload = json.dumps(normalized, sort_keys=True)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def llm_cache_bypassed(data):
+    return str(data.get('cache', '')).lower() == 'bypass'
+
+
+# PDFs of one batch upload extracted at once; OCR'd pages still share the
+# OCR process pool
+batch_executor = process_local(lambda: ThreadPoolExecutor(
+    max_workers=int(os.environ.get('BATCH_MAX_WORKERS', 4)),
+    thread_name_prefix='batch'))
+BATCH_MAX_FILES = int(os.environ.get('BATCH_MAX_FILES', 100))
+BATCH_MAX_FILE_BYTES = int(os.environ.get(
+    'BATCH_MAX_FILE_BYTES', 50 * 1024 * 1024))
+# Bytes of all the files of a batch together, zipped ones decompressed
+BATCH_MAX_TOTAL_BYTES = int(os.environ.get(
+    'BATCH_MAX_TOTAL_BYTES', 500 * 1024 * 1024))
+# Requests with a larger body are refused with 413 before being read
+MAX_UPLOAD_BYTES = int(os.environ.get('MAX_UPLOAD_BYTES', BATCH_MAX_TOTAL_BYTES))
+
+job_queue = process_local(lambda: JobQueue(
+    JobStore(os.environ.get(
+        'JOBS_DB_PATH',
+        os.path.join(tempfile.gettempdir(), 'plant-therapy-cache',
+                     'jobs.sqlite3'))),
+    max_workers=int(os.environ.get('JOBS_MAX_WORKERS', 2)),
+    max_age=int(os.environ.get('JOBS_MAX_AGE', 3600)),
+    max_pending=int(os.environ.get('JOBS_MAX_PENDING', 16))))
+# Seconds a client turned away by a full job queue is asked to wait
+JOBS_RETRY_AFTER = os.environ.get('JOBS_RETRY_AFTER', '10')
+
+
+def has_text_layer(page):
+    """Whether a page carries enough text for pdfplumber (else OCR it)."""
+    return len(page.chars) >= TEXT_LAYER_MIN_CHARS
+
+
+def iter_tables_with_pdfplumber(file, progress=None, max_pages=None,
+                                page_filter=None, routing=None):
+    """Yield the tables of a PDF page by page as they are extracted.
+
+    Only the first ``max_pages`` pages are read. Image-only pages (no usable
+    text layer) are not searched for tables; pages for which
+    ``page_filter(page)`` is false are skipped as well. If ``routing`` is
+    given, the numbers of the pages read are appended to its ``'text'`` and
+    ``'image'`` lists, so image-only pages can be sent to OCR afterwards.
+    Each page's parsed objects are freed once its tables have been
+    consumed, and closing the generator early closes the PDF.
+    ``progress(done, total)`` is called after each page.
+    """
+    import pdfplumber
+
+    with pdfplumber.open(file) as pdf:
+        total = len(pdf.pages)
+        if max_pages is not None:
+            total = min(total, max_pages)
+        for page_num in range(total):
+            page = pdf.pages[page_num]
+            try:
+                if not has_text_layer(page):
+                    trace_event('route', 'page %d: no text layer', page_num + 1)
+                    if routing is not None:
+                        routing['image'].append(page_num + 1)
+                elif page_filter is None or page_filter(page):
+                    if routing is not None:
+                        routing['text'].append(page_num + 1)
+                    with STAGE_SECONDS.time(stage='pdfplumber'):
+                        page_tables = page.extract_tables()
+                    PAGES.inc(stage='tables')
+                    TABLES.inc(len(page_tables))
+                    trace_event('tables', 'page %d: %d tables',
+                                page_num + 1, len(page_tables))
+                    for t_idx, table in enumerate(page_tables):
+                        trace_event('tables', 'page %d table %d first rows: %r',
+                                    page_num + 1, t_idx + 1, table[:3])
+                        yield table
+                else:
+                    trace_event('route', 'page %d: skipped by page filter',
+                                page_num + 1)
+            finally:
+                page.flush_cache()
+            if progress:
+                progress(page_num + 1, total)
 
 
 def extract_tables_with_pdfplumber(file):
-    tables = []
+    return list(iter_tables_with_pdfplumber(file))
+
+
+def extract_text_layers(file, page_numbers):
+    """Text layer of each of the given (1-based) pages, by page number."""
+    import pdfplumber
+
+    texts = {}
     with pdfplumber.open(file) as pdf:
-        for page_num, page in enumerate(pdf.pages):
-            page_tables = page.extract_tables()
-            app.logger.info(
-                f'Page {
-                    page_num +
-                    1}: Found {
-                    len(page_tables)} tables')
-            for t_idx, table in enumerate(page_tables):
-                tables.append(table)
-                app.logger.info(
-                    f'Table {t_idx + 1} (first 3 rows): {table[:3]}')
-    return tables
-
-
-def extract_text_with_ocr(file):
-    images = convert_from_bytes(file.read())
+        for page_number in page_numbers:
+            page = pdf.pages[page_number - 1]
+            texts[page_number] = page.extract_text() or ''
+            page.flush_cache()
+    return texts
+
+
+def extract_text_with_ocr(file, progress=None, max_pages=None):
+    page_texts = ocr_pdf_bytes(file.read(), progress=progress,
+                               max_pages=max_pages)
     all_lines = []
-    for idx, image in enumerate(images):
-        text = pytesseract.image_to_string(image)
-        app.logger.info(f'OCR Page {idx +
-                                    1} text (first 300 chars): {text[:300]}')
-        lines = text.splitlines()
-        all_lines.extend(lines)
+    for idx, text in enumerate(page_texts):
+        trace_event('ocr', 'page %d text: %s', idx + 1, text)
+        all_lines.extend(text.splitlines())
     return all_lines
 
 
+NUMBER_PATTERN = re.compile(r'\d+\.?\d*')
+UNIT_PATTERN = re.compile(r'\s*(ppm|%|mg/kg|mS/cm)')
+FIRST_NUMBER_PATTERN = re.compile(r'[-+]?\d*\.\d+|\d+')
+NON_NUMERIC_PATTERN = re.compile(r'[^0-9.]+')
+
+
 def parse_range(val):
     # Extract numbers from a string like "99 - 124 ppm" and return the midpoint
-    nums = re.findall(r'\d+\.?\d*', val)
+    nums = NUMBER_PATTERN.findall(val)
     if len(nums) == 2:
         return (float(nums[0]) + float(nums[1])) / 2
     elif len(nums) == 1:
@@ -58,53 +336,32 @@ def parse_range(val):
     return None
 
 
-# List of known nutrient names for matching
-KNOWN_NUTRIENTS = [
-    'Nitrate',
-    'Ammonium',
-    'Phosphorus',
-    'Potassium',
-    'Calcium',
-    'Magnesium',
-    'Sodium',
-    'Sulphur',
-    'Iron',
-    'Copper',
-    'Manganese',
-    'Boron',
-    'Zinc',
-    'Cobalt',
-    'Molybdenum',
-    'Silica',
-    'Aluminium',
-    'Aluminum',
-    'Ca/Mg Ratio',
-    'Ca/K',
-    'Mg/K',
-    'K/Na',
-    'P/Zn',
-    'Fe/Mn',
-    'Organic Matter',
-    'Organic Carbon',
-    'Conductivity',
-    'Paramagnetism',
-    'Base Saturation',
-    'Other Bases',
-    'Silicon',
-    'Do (Hot CaCl2)',
-    'jum (Mehlich II!)',
-    'ium (Mehlich Ill)']
-
-# Expanded custom mapping for common garbled OCR nutrient names
-GARBLED_NUTRIENT_MAP = {
-    'jum (Mehlich II!)': 'Calcium',
-    # Also used for Potassium, will handle below
-    'ium (Mehlich Ill)': 'Magnesium',
-    'Do (Hot CaCl2)': 'Sodium',
-    'Silicon (CaCl2)': 'Silicon',
-    '(KCl)': 'Potassium',
-    # Add more mappings as needed based on OCR output
-}
+def parse_value(val):
+    # Extract the first number from a cell like "1200 ppm"; "<" readings are 0
+    if not val:
+        return 0
+    val_clean = UNIT_PATTERN.sub('', val)
+    if '<' in val_clean:
+        return 0
+    match = FIRST_NUMBER_PATTERN.search(val_clean)
+    if match:
+        return float(match.group())
+    return 0
+
+
+def parse_range_midpoint(range_str):
+    # Midpoint of an "low - high" range string, or None if it is not one
+    if not range_str or '-' not in range_str:
+        return None
+    try:
+        parts = [float(NON_NUMERIC_PATTERN.sub('', p))
+                 for p in range_str.split('-')]
+    except ValueError:
+        return None
+    if len(parts) == 2:
+        return sum(parts) / 2
+    return None
+
 
 # Ordered list of expected nutrients (update as needed for your report)
 ORDERED_NUTRIENTS = [
@@ -139,6 +396,160 @@ NUTRIENT_IMAGE_ORDER = [
 ]
 
 
+# Words that mark a page worth extracting tables from: nutrient and section
+# names plus the metadata labels MetadataIndex looks for
+NUTRIENT_PAGE_PATTERN = re.compile('|'.join(re.escape(word) for word in (
+    ORDERED_NUTRIENTS + ['Sulfur', 'Nitrate', 'Ammonium', 'Organic',
+                         'Conductivity', 'Saturation', 'Exchange', 'Paddock',
+                         'Crop', 'Location'])), re.IGNORECASE)
+
+
+def has_nutrient_keywords(page):
+    """Page filter for iter_tables_with_pdfplumber: skip glossary pages."""
+    return bool(NUTRIENT_PAGE_PATTERN.search(page.extract_text() or ''))
+
+
+BASE_SATURATION_NAMES = frozenset([
+    'Calcium', 'Magnesium', 'Potassium', 'Sodium', 'Aluminum', 'Hydrogen',
+    'Other Bases'])
+
+
+def map_header_columns(header_row):
+    header_map = {}
+    for idx, cell in enumerate(header_row):
+        if not cell:
+            continue
+        cell_l = cell.strip().lower()
+        if 'element' in cell_l or 'category' in cell_l:
+            header_map['name'] = idx
+        elif 'level' in cell_l:
+            header_map['current'] = idx
+        elif 'range' in cell_l:
+            header_map['ideal'] = idx
+        elif 'unit' in cell_l:
+            header_map['unit'] = idx
+    return header_map
+
+
+def classify_table(table):
+    """Tag a table with its kind and column map in a single walk of its rows.
+
+    Kinds are 'element' and 'tae' for tables with a header row, and
+    'base_saturation', 'metadata' or 'unknown' for headerless tables, which
+    are parsed positionally (name, level, range).
+    """
+    has_base_saturation = False
+    for i, row in enumerate(table):
+        is_tae = False
+        for cell in row:
+            if cell and isinstance(cell, str):
+                cell_u = cell.upper()
+                if 'ELEMENT' in cell_u:
+                    return {'kind': 'element', 'header_idx': i,
+                            'columns': map_header_columns(row)}
+                if 'T.A.E' in cell_u:
+                    is_tae = True
+        if is_tae:
+            return {'kind': 'tae', 'header_idx': i,
+                    'columns': map_header_columns(row)}
+        if not has_base_saturation and row and len(row) >= 2:
+            name = row[0].strip() if row[0] else ''
+            if name in BASE_SATURATION_NAMES and any(
+                    cell and '%' in cell for cell in row[1:3]):
+                has_base_saturation = True
+    if has_base_saturation:
+        kind = 'base_saturation'
+    elif 2 <= len(table) <= 4:
+        kind = 'metadata'
+    else:
+        kind = 'unknown'
+    return {'kind': kind, 'header_idx': None, 'columns': None}
+
+
+def parse_header_rows(table, classification):
+    """Parse the rows below the header of an element or TAE table."""
+    columns = classification['columns']
+    name_idx = columns.get('name')
+    current_idx = columns.get('current')
+    ideal_idx = columns.get('ideal')
+    category = 'tae' if classification['kind'] == 'tae' else None
+    nutrients = []
+    for row in table[classification['header_idx'] + 1:]:
+        if not row or len(row) < 2:
+            continue
+        # Extract the range string as shown in the PDF
+        range_str = row[ideal_idx].strip() if ideal_idx is not None and row[ideal_idx] else None
+        current_raw = row[current_idx] if current_idx is not None else None
+        name = row[name_idx].strip() if name_idx is not None and row[name_idx] else ''
+        nutrient_row = {
+            'name': name,
+            'canonical': canonical_name(name),
+            'current': parse_value(current_raw) if current_idx is not None else None,
+            # For compatibility, keep 'ideal' as the midpoint if possible
+            'ideal': parse_range_midpoint(range_str),
+            'unit': '',
+            'range': range_str,
+            'category': category
+        }
+        if category:
+            trace_event('parse', 'TAE nutrient: %r', nutrient_row)
+        # Try to extract unit from current value
+        if current_raw and '%' in current_raw:
+            nutrient_row['unit'] = '%'
+        elif current_raw and 'ppm' in current_raw:
+            nutrient_row['unit'] = 'ppm'
+        nutrients.append(nutrient_row)
+    return nutrients
+
+
+def parse_positional_rows(table):
+    """Parse a headerless table as name, level and range columns."""
+    nutrients = []
+    for row in table:
+        if not row or len(row) < 2:
+            continue
+        name = row[0].strip() if row[0] else ''
+        current_raw = row[1].strip() if row[1] else ''
+        ideal_raw = row[2].strip() if len(row) > 2 and row[2] else ''
+        # Skip empty names and header rows
+        if not name or 'ELEMENT' in name or 'CATEGORY' in name:
+            continue
+        unit = ''
+        if 'ppm' in current_raw or 'ppm' in ideal_raw:
+            unit = 'ppm'
+        elif '%' in current_raw or '%' in ideal_raw:
+            unit = '%'
+        current = parse_value(current_raw)
+        ideal = parse_range(ideal_raw)
+        # Always include base saturation nutrients with % unit, even if ideal is missing
+        if name in BASE_SATURATION_NAMES and unit == '%':
+            nutrient_row = {
+                'name': name,
+                'canonical': canonical_name(name),
+                'current': current,
+                'ideal': ideal,
+                'unit': unit
+            }
+            trace_event('parse', 'base saturation row: %r', nutrient_row)
+            nutrients.append(nutrient_row)
+            continue
+        # Only add if we have a valid name and some data
+        if current > 0 or ideal is not None:
+            # A headerless table never contains a T.A.E. cell: classify_table
+            # would have picked that row up as a TAE header.
+            nutrient_row = {
+                'name': name,
+                'canonical': canonical_name(name),
+                'current': current,
+                'ideal': ideal,
+                'unit': unit,
+                'category': None
+            }
+            trace_event('parse', 'positional row: %r', nutrient_row)
+            nutrients.append(nutrient_row)
+    return nutrients
+
+
 def extract_nutrients_from_text(text):
     import re
     # Only include lines that start with a valid nutrient code (strict match)
@@ -153,9 +564,8 @@ def extract_nutrients_from_text(text):
     for line in lines:
         if re.match(prefix_pattern, line.strip()):
             nutrient_lines.append(line)
-    print('DEBUG: Lines considered as nutrients:')
-    for l in nutrient_lines:
-        print(f'  {l}')
+    trace_event('parse', '%d nutrient lines: %r', len(nutrient_lines),
+                nutrient_lines)
     nutrients = []
     for line in nutrient_lines:
         # Match pattern: "N - Nitrogen 1.61 % 3.5 - 5.5 %"
@@ -185,6 +595,7 @@ def extract_nutrients_from_text(text):
             current_val = float(current) if current != '0' else 0
             nutrient_data = {
                 'name': name,
+                'canonical': canonical_name(name),
                 'current': current_val,
                 'ideal': ideal,
                 'unit': unit
@@ -193,349 +604,710 @@ def extract_nutrients_from_text(text):
     return nutrients
 
 
-@app.route('/extract-soil-report', methods=['POST'])
+def iter_table_analyses(tables):
+    """Yield an analysis for each nutrient table as soon as it is parsed."""
+    metadata_index = MetadataIndex()
+    analysis_id = 0
+    for table_idx, table in enumerate(tables):
+        with STAGE_SECONDS.time(stage='metadata'):
+            metadata_index.add(table)
+        if not table or len(table) < 2:
+            continue
+        with STAGE_SECONDS.time(stage='classify'):
+            classification = classify_table(table)
+            if classification['header_idx'] is not None:
+                trace_event('classify', 'table %d: %s header %r, mapping %r',
+                            table_idx + 1, classification['kind'],
+                            table[classification['header_idx']],
+                            classification['columns'])
+                nutrients = parse_header_rows(table, classification)
+            else:
+                trace_event('classify', 'table %d: no header row, parsing '
+                            'by position', table_idx + 1)
+                nutrients = parse_positional_rows(table)
+
+        # If we found valid nutrients, add this as an analysis
+        if nutrients:
+            with STAGE_SECONDS.time(stage='metadata'):
+                info = metadata_index.info(table_idx)
+            ANALYSES.inc(source='tables')
+            yield {
+                'id': analysis_id,
+                'nutrients': nutrients,
+                'info': info
+            }
+            analysis_id += 1
+
+
+def nutrients_from_page_texts(page_texts):
+    """Nutrients parsed from the joined texts of pages, in page order."""
+    lines = []
+    for page_number in sorted(page_texts):
+        trace_event('text', 'page %d text: %s', page_number,
+                    page_texts[page_number])
+        lines.extend(page_texts[page_number].splitlines())
+    return extract_nutrients_from_text('\n'.join(lines))
+
+
+def iter_analyses(file, progress=None, max_pages=None, max_analyses=None,
+                  nutrient_pages_only=False):
+    """Yield the analyses of a soil report.
+
+    Pages with a text layer are searched for tables by pdfplumber and only
+    image-only pages are OCR'd; their text is parsed into one more
+    analysis. If no tables are found at all, the text layer of the other
+    pages is parsed along with it, and if that yields no nutrients either,
+    those pages are OCR'd as well: a scanned page can carry a thin text
+    layer (a scanner stamp, a page header) and still be an image.
+
+    ``max_pages`` limits how many pages are read (by either stage),
+    ``max_analyses`` stops reading once that many analyses were found, and
+    ``nutrient_pages_only`` skips pages without nutrient keywords. A caller
+    can also simply stop iterating; the PDF is closed either way.
+
+    ``progress(stage, done, total)`` reports pages processed by the
+    'tables' and 'ocr' stages.
+    """
+    table_progress = ocr_progress = None
+    if progress:
+        def table_progress(done, total):
+            progress('tables', done, total)
+
+        def ocr_progress(done, total):
+            progress('ocr', done, total)
+
+    # Try to extract nutrients from tables (text-based PDF)
+    found = 0
+    routing = {'text': [], 'image': []}
+    page_filter = has_nutrient_keywords if nutrient_pages_only else None
+    with closing(iter_tables_with_pdfplumber(
+            file, progress=table_progress, max_pages=max_pages,
+            page_filter=page_filter, routing=routing)) as tables:
+        for analysis in iter_table_analyses(tables):
+            found += 1
+            yield analysis
+            if max_analyses is not None and found >= max_analyses:
+                return
+    if found and not routing['image']:
+        return
+
+    def ocr_pages(pages):
+        trace_event('ocr', 'OCR of %d pages: %r', len(pages), pages)
+        file.seek(0)
+        page_texts.update(zip(pages, ocr_pdf_bytes(
+            file.read(), progress=ocr_progress, pages=pages)))
+
+    page_texts = {}
+    ocr_done = bool(routing['image'])
+    if routing['image']:
+        ocr_pages(routing['image'])
+    if not found and routing['text']:
+        trace_event('text', 'no tables found, parsing the text layer of '
+                    '%d pages', len(routing['text']))
+        file.seek(0)
+        page_texts.update(extract_text_layers(file, routing['text']))
+    nutrients_by_image_order = nutrients_from_page_texts(page_texts)
+    if not nutrients_by_image_order and not found and routing['text']:
+        ocr_pages(routing['text'])
+        ocr_done = True
+        nutrients_by_image_order = nutrients_from_page_texts(page_texts)
+    if nutrients_by_image_order:
+        trace_event('text', '%d nutrients parsed from page text',
+                    len(nutrients_by_image_order))
+        ANALYSES.inc(source='ocr' if ocr_done else 'text')
+        yield {
+            'id': found,
+            'nutrients': nutrients_by_image_order,
+            'info': {'name': 'OCR Analysis', 'page': min(page_texts)}
+        }
+
+
+def wants_ndjson_stream():
+    return (request.args.get('stream', '').lower() in ('1', 'true')
+            or 'application/x-ndjson' in request.headers.get('Accept', ''))
+
+
+def ndjson_record(record):
+    return json.dumps(record) + '\n'
+
+
+def stream_analyses(file, cache_key, cached_analyses, options, trace=None):
+    """NDJSON records: one per analysis, then a summary (or error) record."""
+    # The request's teardown has already cleared the current trace by the
+    # time the response body is iterated
+    with activate(trace):
+        yield from _stream_analyses(file, cache_key, cached_analyses, options)
+
+
+def _stream_analyses(file, cache_key, cached_analyses, options):
+    """Records of the analyses as they are parsed.
+
+    Each analysis is also kept for the extraction cache until the records
+    pass STREAM_CACHE_MAX_BYTES; a larger report is sent without being
+    kept, so memory stays flat however long it is, and is not cached.
+    """
+    try:
+        count = 0
+        if cached_analyses is not None:
+            for analysis in cached_analyses:
+                count += 1
+                yield ndjson_record({'type': 'analysis', 'analysis': analysis})
+        else:
+            analyses = []
+            kept_bytes = 0
+            for analysis in iter_analyses(file, **options):
+                count += 1
+                record = ndjson_record({'type': 'analysis', 'analysis': analysis})
+                if analyses is not None:
+                    kept_bytes += len(record)
+                    if kept_bytes > STREAM_CACHE_MAX_BYTES:
+                        trace_event('cache', 'streamed result over %d bytes, '
+                                    'not cached', STREAM_CACHE_MAX_BYTES)
+                        analyses = None
+                    else:
+                        analyses.append(analysis)
+                yield record
+            if count and analyses is not None:
+                extraction_cache().set(cache_key, analyses)
+        if count:
+            yield ndjson_record({'type': 'summary', 'count': count})
+        else:
+            yield ndjson_record({
+                'type': 'error',
+                'error': 'No nutrients extracted from PDF (neither tables nor OCR).'
+            })
+    except Exception as e:
+        current_app.logger.exception('Exception during streamed PDF extraction')
+        trace_event('error', 'extraction failed: %r', e)
+        yield ndjson_record({
+            'type': 'error',
+            'error': 'Exception during PDF extraction',
+            'details': str(e)
+        })
+
+
+@api.route('/extract-soil-report', methods=['POST'])
 def extract_soil_report():
+    """Extract soil analyses from an uploaded PDF.
+
+    With ``?stream=1`` or ``Accept: application/x-ndjson`` the response is
+    newline-delimited JSON: an ``analysis`` record as soon as each table is
+    parsed, then a final ``summary`` (or ``error``) record. ``max_pages``,
+    ``max_analyses`` and ``nutrient_pages_only`` limit the pages read (see
+    extraction_options).
+    """
     try:
         if 'file' not in request.files:
-            app.logger.error('No file uploaded')
+            current_app.logger.error('No file uploaded')
             return jsonify({'error': 'No file uploaded'}), 400
         file = request.files['file']
-        app.logger.info(f'Received file: {file.filename}')
+        trace_event('upload', 'received %s', file.filename)
         file.seek(0)
-        tables = extract_tables_with_pdfplumber(file)
-        app.logger.info(f'Extracted {len(tables)} tables from PDF')
-        for idx, table in enumerate(tables):
-            app.logger.info(f'Table {idx + 1} has {len(table)} rows')
-        file.seek(0)
-        
+        # Work from an in-memory copy: a streamed response outlives the
+        # request's upload stream
+        with STAGE_SECONDS.time(stage='upload_read'):
+            pdf_bytes = file.read()
+        options = extraction_options()
+        cache_key = extraction_cache_key(pdf_bytes, options)
+        cached_analyses = extraction_cache().get(cache_key)
+        if cached_analyses is not None:
+            trace_event('cache', 'extraction cache hit')
+        pdf_file = io.BytesIO(pdf_bytes)
+
+        if wants_ndjson_stream():
+            return Response(
+                stream_with_context(
+                    stream_analyses(pdf_file, cache_key, cached_analyses,
+                                    options, g.trace)),
+                mimetype='application/x-ndjson')
+
+        if cached_analyses is not None:
+            return jsonify({
+                'analyses': cached_analyses,
+                'count': len(cached_analyses)
+            })
+
         # Store all found analyses
-        all_analyses = []
-        analysis_id = 0
-        
-        # Try to extract nutrients from tables (text-based PDF)
-        if tables:
-            for table_idx, table in enumerate(tables):
-                if not table or len(table) < 2:
-                    continue
-                    
-                # Find header row and map columns
-                header_row = None
-                header_idx = 0
-                is_tae_table = False
-                for i, row in enumerate(table):
-                    if any(cell and isinstance(cell, str)
-                           and 'ELEMENT' in cell.upper() for cell in row):
-                        header_row = row
-                        header_idx = i
-                        app.logger.info(f'Element table detected! Row: {row}')
-                        break
-                    # Check if this is a TAE table
-                    for cell in row:
-                        if cell and isinstance(cell, str):
-                            if 'T.A.E.' in cell.upper() or 'T.A.E' in cell.upper():
-                                is_tae_table = True
-                                header_row = row
-                                header_idx = i
-                                app.logger.info(f'TAE table detected! Row: {row}')
-                                break
-                    if is_tae_table:
-                        break
-                        
-                if header_row:
-                    header_map = {}
-                    for idx, cell in enumerate(header_row):
-                        if not cell:
-                            continue
-                        cell_l = cell.strip().lower()
-                        if 'element' in cell_l or 'category' in cell_l:
-                            header_map['name'] = idx
-                        elif 'your level' in cell_l or 'level' in cell_l:
-                            header_map['current'] = idx
-                        elif 'acceptable range' in cell_l or 'range' in cell_l:
-                            header_map['ideal'] = idx
-                        elif 'unit' in cell_l:
-                            header_map['unit'] = idx
-                            
-                    app.logger.info(f'Detected header row: {header_row}')
-                    app.logger.info(f'Header mapping: {header_map}')
-                    
-                    # Parse data rows
-                    nutrients = []
-                    for row in table[header_idx + 1:]:
-                        if not row or len(row) < 2:
-                            continue
-                        # Extract the range string as shown in the PDF
-                        range_str = row[header_map['ideal']].strip(
-                        ) if 'ideal' in header_map and row[header_map['ideal']] else None
-                        # Parse the value as before
-
-                        def parse_value(val):
-                            if not val:
-                                return 0
-                            val_clean = re.sub(
-                                r'\s*(ppm|%|mg/kg|mS/cm)', '', val)
-                            if '<' in val_clean:
-                                return 0
-                            # Extract the first number from the string
-                            match = re.search(r'[-+]?\d*\.\d+|\d+', val_clean)
-                            if match:
-                                return float(match.group())
-                            return 0
-                        current = parse_value(
-                            row[header_map['current']]) if 'current' in header_map else None
-                        # For compatibility, keep 'ideal' as the midpoint if
-                        # possible
-                        ideal = None
-                        if range_str and '-' in range_str:
-                            try:
-                                parts = [float(re.sub(r'[^0-9.]+', '', p))
-                                         for p in range_str.split('-')]
-                                if len(parts) == 2:
-                                    ideal = sum(parts) / 2
-                            except Exception:
-                                ideal = None
-                        nutrient_row = {
-                            'name': row[header_map['name']].strip() if 'name' in header_map and row[header_map['name']] else '',
-                            'current': current,
-                            'ideal': ideal,
-                            'unit': '',
-                            'range': range_str,
-                            'category': 'tae' if is_tae_table else None
-                        }
-                        if is_tae_table:
-                            app.logger.info(f'TAE nutrient created: {nutrient_row}')
-                        # Try to extract unit from current value
-                        if row[header_map['current']
-                               ] and '%' in row[header_map['current']]:
-                            nutrient_row['unit'] = '%'
-                        elif row[header_map['current']] and 'ppm' in row[header_map['current']]:
-                            nutrient_row['unit'] = 'ppm'
-                        nutrients.append(nutrient_row)
-                        
-                    # If we found valid nutrients, add this as an analysis
-                    if nutrients:
-                        # Try to extract analysis info from the table
-                        analysis_info = extract_analysis_info(tables, table_idx)
-                        all_analyses.append({
-                            'id': analysis_id,
-                            'nutrients': nutrients,
-                            'info': analysis_info
-                        })
-                        analysis_id += 1
-                        
-                else:
-                    # Fallback: try to extract from all rows with at least 2
-                    # columns
-                    app.logger.warning(
-                        'No header row detected, using fallback extraction for this table.')
-                    nutrients = []
-                    for row in table:
-                        if not row or len(row) < 2:
-                            continue
-                        name = row[0].strip() if row[0] else ''
-                        current_raw = row[1].strip() if row[1] else ''
-                        ideal_raw = row[2].strip() if len(
-                            row) > 2 and row[2] else ''
-                        # Skip empty names and header rows
-                        if not name or 'ELEMENT' in name or 'CATEGORY' in name:
-                            continue
-                        unit = ''
-                        if 'ppm' in current_raw or 'ppm' in ideal_raw:
-                            unit = 'ppm'
-                        elif '%' in current_raw or '%' in ideal_raw:
-                            unit = '%'
-
-                        def parse_value(val):
-                            if not val:
-                                return 0
-                            # Remove unit from value
-                            val_clean = re.sub(
-                                r'\s*(ppm|%|mg/kg|mS/cm)', '', val)
-                            if '<' in val_clean:
-                                return 0
-                            # Extract the first number from the string
-                            match = re.search(r'[-+]?\d*\.\d+|\d+', val_clean)
-                            if match:
-                                return float(match.group())
-                            return 0
-                        current = parse_value(current_raw)
-                        ideal = parse_range(ideal_raw)
-                        # PATCH: Always include base saturation nutrients with % unit, even if ideal is missing
-                        base_sat_names = ['Calcium', 'Magnesium', 'Potassium', 'Sodium', 'Aluminum', 'Hydrogen', 'Other Bases']
-                        if name in base_sat_names and unit == '%':
-                            nutrient_row = {
-                                'name': name,
-                                'current': current,
-                                'ideal': ideal if ideal is not None else None,
-                                'unit': unit
-                            }
-                            app.logger.info(
-                                f'Base saturation PATCH: {nutrient_row}')
-                            nutrients.append(nutrient_row)
-                            continue
-                        # Only add if we have a valid name and some data
-                        if name and (current > 0 or ideal is not None):
-                            # Check if this table contains TAE data by looking at the table content
-                            is_tae_table = False
-                            for table_row in table:
-                                for cell in table_row:
-                                    if cell and isinstance(cell, str):
-                                        if 'T.A.E.' in cell.upper() or 'T.A.E' in cell.upper():
-                                            is_tae_table = True
-                                            app.logger.info(f'TAE table detected in fallback! Row: {table_row}')
-                                            break
-                                if is_tae_table:
-                                    break
-                            nutrient_row = {
-                                'name': name,
-                                'current': current,
-                                'ideal': ideal,
-                                'unit': unit,
-                                'category': 'tae' if is_tae_table else None
-                            }
-                            app.logger.info(
-                                f'Fallback parsed nutrient row: {nutrient_row}')
-                            nutrients.append(nutrient_row)
-                            
-                    # If we found valid nutrients, add this as an analysis
-                    if nutrients:
-                        analysis_info = extract_analysis_info(tables, table_idx)
-                        all_analyses.append({
-                            'id': analysis_id,
-                            'nutrients': nutrients,
-                            'info': analysis_info
-                        })
-                        analysis_id += 1
-
-        # If no tables found, try OCR
-        if not all_analyses:
-            app.logger.warning('No tables found with pdfplumber, trying OCR...')
-            file.seek(0)
-            ocr_lines = extract_text_with_ocr(file)
-            app.logger.info(
-                "Original OCR lines for debug:\n" +
-                "\n".join(ocr_lines))
-            ocr_text = '\n'.join(ocr_lines)
-            nutrients_by_image_order = extract_nutrients_from_text(ocr_text)
-            if nutrients_by_image_order:
-                app.logger.info(
-                    f'Final nutrients array (by image order): {nutrients_by_image_order}')
-                all_analyses.append({
-                    'id': 0,
-                    'nutrients': nutrients_by_image_order,
-                    'info': {'name': 'OCR Analysis', 'page': 1}
-                })
+        all_analyses = list(iter_analyses(pdf_file, **options))
 
         # Return all analyses found
         if all_analyses:
-            app.logger.info(f'Found {len(all_analyses)} analyses in PDF')
+            trace_event('result', '%d analyses', len(all_analyses))
+            extraction_cache().set(cache_key, all_analyses)
             return jsonify({
                 'analyses': all_analyses,
                 'count': len(all_analyses)
             })
 
-        app.logger.warning(
-            'No nutrients extracted from PDF (neither tables nor OCR).')
+        current_app.logger.warning(
+            'No nutrients extracted from %s (neither tables nor OCR).',
+            file.filename)
         return jsonify(
             {'error': 'No nutrients extracted from PDF (neither tables nor OCR).'}), 400
+    except RequestEntityTooLarge:
+        raise
     except Exception as e:
-        app.logger.error('Exception during PDF extraction: ' + str(e))
-        traceback.print_exc()
+        current_app.logger.exception('Exception during PDF extraction')
+        trace_event('error', 'extraction failed: %r', e)
         return jsonify(
             {'error': 'Exception during PDF extraction', 'details': str(e)}), 500
 
 
-def extract_analysis_info(tables, table_idx):
-    """Extract analysis information from all tables up to and including the current one (to catch header metadata)"""
-    import re
-    from datetime import datetime
-    info = {
-        'name': f'Analysis {table_idx + 1}',
-        'page': table_idx + 1,
-        'crop': 'Unknown',
-        'location': 'Unknown',
-        'date': 'Unknown',
-        'paddock': 'Unknown'
-    }
-    date_pattern = re.compile(r"\d{2}/\d{2}/\d{4}")
-    
-    # First, try to extract from the table immediately before the nutrient table
-    if table_idx > 0:
-        prev_table = tables[table_idx - 1]
-        if 2 <= len(prev_table) <= 4:
-            rows = [row[0] if row and isinstance(row[0], str) else '' for row in prev_table]
-            rows = [r.strip() for r in rows if r and r.strip()]
-            if len(rows) >= 2:
-                # First row: crop
-                if not date_pattern.match(rows[0]):
-                    info['crop'] = rows[0]
-                # Second row: paddock (if not a date and not a known crop)
-                if len(rows) > 1:
-                    if not date_pattern.match(rows[1]) and rows[1] != info['crop']:
-                        info['paddock'] = rows[1]
-                        print(f"Extracted paddock (immediate): {info['paddock']} from table {table_idx - 1}")
-                # Third row: date
-                if len(rows) > 2:
-                    if date_pattern.match(rows[2]):
-                        info['date'] = rows[2]
-    
-    # Scan all tables from the start up to and including the current table for any missing info
-    for idx in range(0, table_idx + 1):
-        if idx < 0 or idx >= len(tables):
+def extract_pdf_bytes(pdf_bytes, options, progress=None):
+    """The analyses of a PDF, through the extraction cache.
+
+    On a cache hit ``progress`` gets one ``('cache', n, n)`` call for the
+    n analyses found, so a job never shows 0/0 once done. Raises
+    ValueError if no nutrients could be extracted.
+    """
+    cache_key = extraction_cache_key(pdf_bytes, options)
+    all_analyses = extraction_cache().get(cache_key)
+    if all_analyses is not None:
+        if progress is not None:
+            progress('cache', len(all_analyses), len(all_analyses))
+    else:
+        all_analyses = list(iter_analyses(
+            io.BytesIO(pdf_bytes), progress=progress, **options))
+        if not all_analyses:
+            raise ValueError(
+                'No nutrients extracted from PDF (neither tables nor OCR).')
+        extraction_cache().set(cache_key, all_analyses)
+    return all_analyses
+
+
+def run_extraction_job(pdf_bytes, options, progress=None):
+    # Jobs run on pool threads, outside the submitting request's trace
+    with traced(TRACES, 'extraction_job'):
+        all_analyses = extract_pdf_bytes(pdf_bytes, options, progress)
+    return {'analyses': all_analyses, 'count': len(all_analyses)}
+
+
+@api.route('/jobs/extract', methods=['POST'])
+def submit_extraction_job():
+    """Queue a soil report extraction and return its job id immediately.
+
+    Accepts the same query options as /extract-soil-report. Answers 503
+    with Retry-After while JOBS_MAX_PENDING jobs are queued or running.
+    """
+    if 'file' not in request.files:
+        current_app.logger.error('No file uploaded')
+        return jsonify({'error': 'No file uploaded'}), 400
+    file = request.files['file']
+    trace_event('upload', 'queueing %s', file.filename)
+    with STAGE_SECONDS.time(stage='upload_read'):
+        pdf_bytes = file.read()
+    try:
+        job_id = job_queue().submit('extract', run_extraction_job, pdf_bytes,
+                                    extraction_options())
+    except QueueFull as e:
+        current_app.logger.warning('Job queue full: %s', e)
+        return jsonify({'error': f'Too many extraction jobs ({e}), '
+                                 f'try again later'}), 503, {
+            'Retry-After': JOBS_RETRY_AFTER}
+    return jsonify({'job_id': job_id, 'status': 'queued'}), 202, {
+        'Location': f'/jobs/{job_id}'}
+
+
+def is_pdf(data):
+    # The header may follow up to 1 KiB of junk
+    return b'%PDF-' in data[:1024]
+
+
+class BatchTooLarge(Exception):
+    """A batch upload holds more files or bytes than a batch may."""
+
+
+def read_zip_pdfs(name, data, max_files, max_bytes):
+    """(name, bytes, error) of each PDF in a zip archive, and the number
+    of bytes decompressed.
+
+    Members are counted and decompressed one at a time, and BatchTooLarge
+    is raised as soon as there are more than ``max_files`` PDFs or they
+    come to more than ``max_bytes``, so a zip bomb is never expanded
+    past the batch limits.
+    """
+    entries = []
+    total_bytes = 0
+    with zipfile.ZipFile(io.BytesIO(data)) as archive:
+        for info in archive.infolist():
+            member = info.filename
+            if (info.is_dir() or not member.lower().endswith('.pdf')
+                    or member.startswith('__MACOSX/')):
+                continue
+            if len(entries) == max_files:
+                raise BatchTooLarge(
+                    f'Too many files, at most {BATCH_MAX_FILES} per batch')
+            # Read one byte past the limits: the sizes in the header can lie
+            with archive.open(info) as f:
+                pdf_bytes = f.read(
+                    min(BATCH_MAX_FILE_BYTES, max_bytes - total_bytes) + 1)
+            total_bytes += len(pdf_bytes)
+            if total_bytes > max_bytes:
+                raise BatchTooLarge(f'Files are larger than '
+                                    f'{BATCH_MAX_TOTAL_BYTES} bytes in total')
+            entries.append(batch_entry(f'{name}/{member}', pdf_bytes))
+    return entries, total_bytes
+
+
+def batch_entry(name, data):
+    if len(data) > BATCH_MAX_FILE_BYTES:
+        return name, None, f'File is larger than {BATCH_MAX_FILE_BYTES} bytes'
+    if not is_pdf(data):
+        return name, None, 'Not a PDF'
+    return name, data, None
+
+
+def read_batch_uploads(uploads):
+    """(name, bytes, error) of each uploaded PDF, zip archives expanded.
+
+    Names are made unique so that every entry gets its own result.
+    Raises BatchTooLarge past BATCH_MAX_FILES entries or
+    BATCH_MAX_TOTAL_BYTES bytes read.
+    """
+    entries = []
+    total_bytes = 0
+    for upload in uploads:
+        if len(entries) >= BATCH_MAX_FILES:
+            raise BatchTooLarge(
+                f'Too many files, at most {BATCH_MAX_FILES} per batch')
+        name = upload.filename or f'file-{len(entries) + 1}'
+        remaining = BATCH_MAX_TOTAL_BYTES - total_bytes
+        with STAGE_SECONDS.time(stage='upload_read'):
+            # The form parser spools large files to disk; never read more
+            # of one than the batch has room for
+            data = upload.read(remaining + 1)
+        if len(data) > remaining:
+            raise BatchTooLarge(f'Files are larger than '
+                                f'{BATCH_MAX_TOTAL_BYTES} bytes in total')
+        if zipfile.is_zipfile(io.BytesIO(data)):
+            try:
+                members, zip_bytes = read_zip_pdfs(
+                    name, data, BATCH_MAX_FILES - len(entries),
+                    remaining)
+            except (zipfile.BadZipFile, RuntimeError, NotImplementedError) as e:
+                # Corrupt, encrypted or unsupported compression
+                entries.append((name, None, f'Cannot read zip archive: {e}'))
+                continue
+            total_bytes += zip_bytes
+            entries.extend(members)
+        else:
+            total_bytes += len(data)
+            entries.append(batch_entry(name, data))
+    seen = {}
+    unique = []
+    for name, data, error in entries:
+        count = seen[name] = seen.get(name, 0) + 1
+        if count > 1:
+            stem, ext = os.path.splitext(name)
+            name = f'{stem} ({count}){ext}'
+        unique.append((name, data, error))
+    return unique
+
+
+@api.errorhandler(RequestEntityTooLarge)
+def upload_too_large(error):
+    return jsonify({'error': f'Upload is larger than {MAX_UPLOAD_BYTES} bytes'}), 413
+
+
+@api.route('/extract-soil-report/batch', methods=['POST'])
+def extract_soil_report_batch():
+    """Extract the analyses of many soil reports in one request.
+
+    Takes any number of ``files`` (PDFs or zip archives of PDFs) and the
+    query options of /extract-soil-report. Identical files are extracted
+    once, and distinct ones concurrently (up to BATCH_MAX_WORKERS). The
+    response maps each file name (``archive.zip/member.pdf`` for zipped
+    files) to ``{"analyses", "count"}`` or to ``{"error"}``, plus
+    ``duplicate_of`` for a copy of an earlier file; one bad file does not
+    fail the batch.
+    """
+    uploads = request.files.getlist('files') + request.files.getlist('file')
+    if not uploads:
+        return jsonify({'error': 'No files uploaded'}), 400
+    try:
+        entries = read_batch_uploads(uploads)
+    except BatchTooLarge as e:
+        return jsonify({'error': str(e)}), 400
+    trace_event('upload', 'batch of %d files', len(entries))
+
+    options = extraction_options()
+    futures = {}
+    first_names = {}
+    digests = {}
+    for name, data, error in entries:
+        if error is not None:
+            continue
+        digest = hashlib.sha256(data).hexdigest()
+        digests[name] = digest
+        if digest not in futures:
+            first_names[digest] = name
+            futures[digest] = batch_executor().submit(
+                contextvars.copy_context().run, extract_pdf_bytes, data,
+                options)
+
+    files = {}
+    for name, data, error in entries:
+        if error is None:
+            digest = digests[name]
+            try:
+                analyses = futures[digest].result()
+            except ValueError as e:
+                error = str(e)
+            except Exception as e:
+                current_app.logger.exception(
+                    'Exception during PDF extraction of %s', name)
+                error = f'Exception during PDF extraction: {e}'
+        if error is not None:
+            BATCH_FILES.inc(outcome='error')
+            files[name] = {'error': error}
             continue
-        table = tables[idx]
-        # Heuristic: If table has 2-4 rows, try to extract missing info
-        if 2 <= len(table) <= 4:
-            rows = [row[0] if row and isinstance(row[0], str) else '' for row in table]
-            rows = [r.strip() for r in rows if r and r.strip()]
-            if len(rows) >= 2:
-                # First row: crop (if not already found)
-                if info['crop'] == 'Unknown' and not date_pattern.match(rows[0]):
-                    info['crop'] = rows[0]
-                # Second row: paddock (if not already found and not a date and not a known crop)
-                if info['paddock'] == 'Unknown' and len(rows) > 1:
-                    if not date_pattern.match(rows[1]) and rows[1] != info['crop']:
-                        info['paddock'] = rows[1]
-                        print(f"Extracted paddock (heuristic): {info['paddock']} from table {idx}")
-                # Third row: date (if not already found)
-                if info['date'] == 'Unknown' and len(rows) > 2:
-                    if date_pattern.match(rows[2]):
-                        info['date'] = rows[2]
-        # Also check for explicit PADDOCK: lines as fallback
+        result = {'analyses': analyses, 'count': len(analyses)}
+        if first_names[digest] != name:
+            BATCH_FILES.inc(outcome='duplicate')
+            result['duplicate_of'] = first_names[digest]
+        else:
+            BATCH_FILES.inc(outcome='ok')
+        files[name] = result
+    errors = sum('error' in result for result in files.values())
+    trace_event('result', '%d files, %d errors', len(files), errors)
+    return jsonify({'files': files, 'count': len(files) - errors,
+                    'errors': errors})
+
+
+@api.route('/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """Status, page progress and (once done) the result of a job."""
+    job = job_queue().store.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Unknown job'}), 404
+    return jsonify(job)
+
+
+DATE_PATTERN = re.compile(r"\d{2}/\d{2}/\d{4}")
+PADDOCK_PATTERN = re.compile(r"PADDOCK:?\s*([\w\-\s]+)", re.IGNORECASE)
+CROP_PATTERN = re.compile(r"CROP:?\s*([\w\-\s]+)", re.IGNORECASE)
+LOCATION_PATTERN = re.compile(r"LOCATION:?\s*([\w\-\s]+)", re.IGNORECASE)
+
+UNKNOWN = 'Unknown'
+
+
+def metadata_rows(table):
+    """First-column values of a short (2-4 row) header table, else None."""
+    if not 2 <= len(table) <= 4:
+        return None
+    rows = [row[0] if row and isinstance(row[0], str) else '' for row in table]
+    rows = [r.strip() for r in rows if r and r.strip()]
+    return rows if len(rows) >= 2 else None
+
+
+class MetadataIndex:
+    """Crop, paddock, date and location lookups for the tables of a PDF.
+
+    Analysis info used to be found by rescanning tables 0..N for each
+    analysis. The index is fed tables in order with ``add`` and records
+    where each value first (or, for explicit PADDOCK: lines, last) appears,
+    so ``info(table_idx)`` is answered from prefix arrays with the same
+    precedence rules:
+
+    - the short table right before the nutrient table wins for crop, paddock
+      and date;
+    - otherwise the first crop/date/location found in tables 0..N is used;
+    - an explicit "PADDOCK:" row overrides everything before it, and a
+      heuristic paddock (second row of a short table) only fills the gap
+      when no paddock is known and it differs from the current crop.
+
+    ``info`` only looks at tables up to ``table_idx``, so it can be called
+    as soon as that table has been added.
+    """
+
+    def __init__(self, tables=()):
+        self.short_rows = []
+        # Prefix values after tables 0..i (UNKNOWN when not seen yet)
+        self.crop = []
+        self.date = []
+        self.location = []
+        # (table index, value) of the last explicit PADDOCK: row in 0..i
+        self.explicit_paddock = []
+        # Heuristic paddock candidates in table order
+        self.heuristic_table = []
+        self.heuristic_value = []
+        # Index of the first candidate in any table >= i
+        self.first_heuristic = []
+        # Next candidate at or after i that is valid against the running
+        # crop, and next candidate whose value differs from candidate i
+        self.next_valid = []
+        self.next_different = []
+        # Pointers above that wait for a later candidate to resolve them
+        self._pending_tables = []
+        self._pending_valid = []
+        self._pending_different = []
+        self._crop = self._date = self._location = UNKNOWN
+        self._explicit = None
+        for table in tables:
+            self.add(table)
+
+    def _add_heuristic(self, table_idx, value):
+        i = len(self.heuristic_table)
+        self.heuristic_table.append(table_idx)
+        self.heuristic_value.append(value)
+        self.next_valid.append(None)
+        self.next_different.append(None)
+        for pending in self._pending_tables:
+            self.first_heuristic[pending] = i
+        self._pending_tables = []
+        # Valid when no short table precedes the analysis, in which case the
+        # crop in force is the running one
+        self._pending_valid.append(i)
+        if value != self._crop:
+            for pending in self._pending_valid:
+                self.next_valid[pending] = i
+            self._pending_valid = []
+        # Unresolved candidates always share the previous candidate's value
+        if self._pending_different and self.heuristic_value[self._pending_different[-1]] != value:
+            for pending in self._pending_different:
+                self.next_different[pending] = i
+            self._pending_different = []
+        self._pending_different.append(i)
+
+    def add(self, table):
+        """Index the next table of the PDF."""
+        table_idx = len(self.short_rows)
+        rows = metadata_rows(table)
+        self.short_rows.append(rows)
+        self.first_heuristic.append(None)
+        self._pending_tables.append(table_idx)
+        if rows:
+            if self._crop == UNKNOWN and not DATE_PATTERN.match(rows[0]):
+                self._crop = rows[0]
+            if rows[1] != UNKNOWN and not DATE_PATTERN.match(rows[1]):
+                self._add_heuristic(table_idx, rows[1])
+            if self._date == UNKNOWN and len(rows) > 2 and DATE_PATTERN.match(rows[2]):
+                self._date = rows[2]
         for row in table:
             if not row:
                 continue
             row_text = ' '.join([str(cell) for cell in row if cell])
-            paddock_match = re.search(r"PADDOCK:?\s*([\w\-\s]+)", row_text, re.IGNORECASE)
+            paddock_match = PADDOCK_PATTERN.search(row_text)
             if paddock_match:
                 paddock_val = paddock_match.group(1).strip()
                 if paddock_val:
-                    info['paddock'] = paddock_val
-                    print(f"Extracted paddock (explicit): {info['paddock']} from row: {row_text}")
-            # Crop
-            if info['crop'] == 'Unknown':
-                crop_match = re.search(r"CROP:?\s*([\w\-\s]+)", row_text, re.IGNORECASE)
-                if crop_match:
-                    crop_val = crop_match.group(1).strip()
-                    if crop_val:
-                        info['crop'] = crop_val
-            # Date
-            if info['date'] == 'Unknown':
-                date_match = date_pattern.search(row_text)
+                    self._explicit = (table_idx, paddock_val)
+            if self._crop == UNKNOWN:
+                crop_match = CROP_PATTERN.search(row_text)
+                if crop_match and crop_match.group(1).strip():
+                    self._crop = crop_match.group(1).strip()
+            if self._date == UNKNOWN:
+                date_match = DATE_PATTERN.search(row_text)
                 if date_match:
-                    info['date'] = date_match.group(0)
-            # Location
-            if info['location'] == 'Unknown':
-                loc_match = re.search(r"LOCATION:?\s*([\w\-\s]+)", row_text, re.IGNORECASE)
-                if loc_match:
-                    loc_val = loc_match.group(1).strip()
-                    if loc_val:
-                        info['location'] = loc_val
-    print(f"Final extracted info for analysis {table_idx + 1}: {info}")
-    return info
-
-
-@app.route('/generate-comments', methods=['POST'])
+                    self._date = date_match.group(0)
+            if self._location == UNKNOWN:
+                loc_match = LOCATION_PATTERN.search(row_text)
+                if loc_match and loc_match.group(1).strip():
+                    self._location = loc_match.group(1).strip()
+        self.crop.append(self._crop)
+        self.date.append(self._date)
+        self.location.append(self._location)
+        self.explicit_paddock.append(self._explicit)
+
+    def _heuristic_paddock(self, start_table, table_idx, crop):
+        # First candidate in tables start_table..table_idx that differs from
+        # the crop in force when it was read
+        if start_table > table_idx:
+            return UNKNOWN
+        i = self.first_heuristic[start_table]
+        if i is not None and crop != UNKNOWN:
+            if self.heuristic_value[i] == crop:
+                i = self.next_different[i]
+        elif i is not None:
+            i = self.next_valid[i]
+        if i is not None and self.heuristic_table[i] <= table_idx:
+            return self.heuristic_value[i]
+        return UNKNOWN
+
+    def info(self, table_idx):
+        """Analysis info for the nutrient table at ``table_idx``."""
+        # The short table immediately before the nutrient table wins
+        prev_crop = prev_paddock = prev_date = UNKNOWN
+        rows = self.short_rows[table_idx - 1] if table_idx > 0 else None
+        if rows:
+            if not DATE_PATTERN.match(rows[0]):
+                prev_crop = rows[0]
+            if not DATE_PATTERN.match(rows[1]) and rows[1] != prev_crop:
+                prev_paddock = rows[1]
+            if len(rows) > 2 and DATE_PATTERN.match(rows[2]):
+                prev_date = rows[2]
+
+        crop = prev_crop if prev_crop != UNKNOWN else self.crop[table_idx]
+        date = prev_date if prev_date != UNKNOWN else self.date[table_idx]
+
+        explicit = self.explicit_paddock[table_idx]
+        if explicit is not None and explicit[1] != UNKNOWN:
+            paddock = explicit[1]
+        elif explicit is not None:
+            paddock = self._heuristic_paddock(explicit[0] + 1, table_idx, prev_crop)
+        elif prev_paddock != UNKNOWN:
+            paddock = prev_paddock
+        else:
+            paddock = self._heuristic_paddock(0, table_idx, prev_crop)
+
+        return {
+            'name': f'Analysis {table_idx + 1}',
+            'page': table_idx + 1,
+            'crop': crop,
+            'location': self.location[table_idx],
+            'date': date,
+            'paddock': paddock
+        }
+
+
+@api.route('/extraction-cache/stats', methods=['GET'])
+def extraction_cache_stats():
+    return jsonify(extraction_cache().stats())
+
+
+@api.route('/llm-cache/stats', methods=['GET'])
+def llm_cache_stats():
+    return jsonify(llm_cache().stats())
+
+
+@api.route('/debug/traces', methods=['GET'])
+def list_traces():
+    """Summaries of the most recent sampled request traces, newest first."""
+    if not TRACES.enabled:
+        return jsonify({'error': 'Tracing is off (set TRACE_SAMPLE_RATE)'}), 404
+    return jsonify({'traces': [trace.summary() for trace in TRACES.recent()]})
+
+
+@api.route('/debug/traces/<trace_id>', methods=['GET'])
+def get_trace(trace_id):
+    """One trace with its events, formatted on this read."""
+    trace = TRACES.get(trace_id) if TRACES.enabled else None
+    if trace is None:
+        return jsonify({'error': 'Unknown trace'}), 404
+    return jsonify(trace.to_dict())
+
+
+@api.route('/metrics', methods=['GET'])
+def metrics():
+    """Stage timings and extraction/LLM counters in Prometheus text format."""
+    return Response(REGISTRY.render(),
+                    content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+def complete_prompt(prompt):
+    """Run a comments prompt through the chat model and return its text."""
+    return llm_gateway.complete(
+        COMMENTS_MODEL, [{"role": "user", "content": prompt}],
+        max_tokens=300, temperature=0.7).strip()
+
+
+def llm_unavailable(error):
+    """503 for a provider that kept failing, so clients know to retry."""
+    return jsonify({'error': str(error)}), 503, {
+        'Retry-After': str(int(llm_gateway.backoff_max))}
+
+
+@api.route('/generate-comments', methods=['POST'])
 def generate_comments():
     try:
         data = request.get_json()
@@ -543,33 +1315,15 @@ def generate_comments():
         optimal = data.get('optimal', [])
         excess = data.get('excess', [])
 
-        # Enhanced prompt for more detailed and professional response
-        prompt = f"""
-As a professional plant nutritionist and agronomist, provide a BRIEF executive summary for a Plant Therapy Report based on the following nutrient analysis:
-
-DEFICIENT NUTRIENTS: {', '.join(deficient) if deficient else 'None'}
-OPTIMAL NUTRIENTS: {', '.join(optimal) if optimal else 'None'}
-EXCESS NUTRIENTS: {', '.join(excess) if excess else 'None'}
-
-Provide a complete executive summary (2-3 sentences) that gives a brief overview of the plant's nutritional status. Make sure to complete your thoughts and provide a full summary. Do NOT include detailed nutrient descriptions, specific functions, or management recommendations. Keep it brief and professional.
+        cache_key = llm_cache_key('plantSummary', deficient, optimal, excess)
+        if not llm_cache_bypassed(data):
+            cached_summary = llm_cache().get(cache_key)
+            if cached_summary is not None:
+                return jsonify({'summary': cached_summary})
 
-IMPORTANT: When mentioning nutrients, use the format "**Full Name (Abbreviation)**" - for example: **Nitrogen (N)**, **Phosphorus (P)**, **Calcium (Ca)**, **Magnesium (Mg)**, **Potassium (K)**, **Boron (B)**, **Copper (Cu)**, **Zinc (Zn)**, **Iron (Fe)**, **Manganese (Mn)**, **Molybdenum (Mo)**, **Sulphur (S)**, **Sodium (Na)**.
-
-Focus on:
-- Brief overview of nutritional status
-- Professional tone
-- Complete sentences and thoughts
-- No detailed nutrient analysis
-- Use bold formatting for nutrient names
-"""
-
-        response = client.chat.completions.create(
-            model="gpt-3.5-turbo",
-            messages=[{"role": "user", "content": prompt}],
-            max_tokens=300,
-            temperature=0.7
-        )
-        summary = response.choices[0].message.content.strip()
+        # Enhanced prompt for more detailed and professional response
+        prompt = plant_summary_prompt(deficient, optimal, excess)
+        summary = complete_prompt(prompt)
 
         # Remove any detailed nutrient descriptions that might still be generated
         import re
@@ -584,224 +1338,136 @@ Focus on:
         cleaned = re.sub(r"(With proper management.*?)(?=\n\n|\n[A-Z]|$)", "", cleaned, flags=re.DOTALL)
         # Remove any extra blank lines
         cleaned = re.sub(r"\n{3,}", "\n\n", cleaned)
+        llm_cache().set(cache_key, cleaned.strip())
         return jsonify({'summary': cleaned.strip()})
+    except LLMUnavailable as e:
+        return llm_unavailable(e)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 
-@app.route('/generate-soil-comments', methods=['POST'])
+def soil_section_summary(data):
+    """Generate (or fetch from cache) the summary for one report section.
+
+    ``data`` is a /generate-soil-comments request body.
+    """
+    section = data.get('section', '')
+    deficient = data.get('deficient', [])
+    optimal = data.get('optimal', [])
+    excess = data.get('excess', [])
+    nutrients_data = section_nutrients(section, data.get('nutrients', []))
+
+    cache_key = llm_cache_key(
+        section, deficient, optimal, excess, nutrients_data)
+    if not llm_cache_bypassed(data):
+        cached_summary = llm_cache().get(cache_key)
+        if cached_summary is not None:
+            return cached_summary
+
+    prompt = soil_prompt(section, deficient, optimal, excess, nutrients_data)
+    summary = complete_prompt(prompt)
+
+    # Clean up any overly detailed responses
+    import re
+    cleaned = re.sub(r"\n{3,}", "\n\n", summary)
+    llm_cache().set(cache_key, cleaned.strip())
+    return cleaned.strip()
+
+
+@api.route('/generate-soil-comments', methods=['POST'])
 def generate_soil_comments():
     try:
-        data = request.get_json()
-        section = data.get('section', '')
-        deficient = data.get('deficient', [])
-        optimal = data.get('optimal', [])
-        excess = data.get('excess', [])
-        nutrients_data = data.get('nutrients', [])
-
-        # Create section-specific prompts
-        section_prompts = {
-            'organicMatter': f"""
-As a professional soil scientist and agronomist, provide a BRIEF analysis of the soil's organic matter status for a Soil Therapy Report.
-
-ORGANIC MATTER DATA: {', '.join([
-    f"{n.get('name', 'Unknown')}: {n.get('current', 'N/A')} {n.get('unit', '')} (Ideal Range: {n.get('ideal_range', [None, None])[0]}–{n.get('ideal_range', [None, None])[1]} {n.get('unit', '')})"
-    if n.get('ideal_range') else
-    f"{n.get('name', 'Unknown')}: {n.get('current', 'N/A')} {n.get('unit', '')}"
-    for n in nutrients_data if 'organic matter' in n.get('name', '').lower()
-])}
-
-DEFICIENT: {', '.join(deficient) if deficient else 'None'}
-OPTIMAL: {', '.join(optimal) if optimal else 'None'}
-EXCESS: {', '.join(excess) if excess else 'None'}
-
-CRITICAL INSTRUCTIONS:
-- Focus ONLY on ORGANIC MATTER values, NOT organic carbon values
-- Use ONLY the ideal range for determining organic matter status
-- A nutrient is "deficient" if current value < lower bound of ideal range
-- A nutrient is "excess" if current value > upper bound of ideal range  
-- A nutrient is "optimal" if current value is within the ideal range (including bounds)
-- IGNORE any target values - use only the ideal range
-- NEVER mention "organic carbon" or "LECO" in your response - only discuss "organic matter"
-
-EXAMPLE:
-If the organic matter value is 5.95% and the ideal range is 4.0–10.0%, you MUST call it "optimal" (not deficient).
-If the value is 2.0% and the ideal range is 4.0–10.0%, you MUST call it "deficient."
-If the value is 12.0% and the ideal range is 4.0–10.0%, you MUST call it "excess."
-
-Provide a 2-3 sentence analysis focusing on:
-- **Organic matter levels** and their implications for soil health and fertility
-- Impact on **nutrient availability**, **soil structure**, and **water retention**
-- Brief mention of **management strategies** to improve organic matter if needed
-Use professional soil science terminology and bold formatting for key terms. Focus on practical implications for crop production.
-""",
-            'cec': f"""
-As a professional soil scientist and agronomist, provide a BRIEF analysis of the soil's Cation Exchange Capacity (CEC) for a Soil Therapy Report.
-
-CEC DATA: {', '.join([
-    f"{n.get('name', 'Unknown')}: {n.get('current', 'N/A')} {n.get('unit', '')}"
-    for n in nutrients_data if 'cec' in n.get('name', '').lower() or 'cation exchange' in n.get('name', '').lower()
-])}
-
-DEFICIENT: {', '.join(deficient) if deficient else 'None'}
-OPTIMAL: {', '.join(optimal) if optimal else 'None'}
-EXCESS: {', '.join(excess) if excess else 'None'}
-
-CRITICAL INSTRUCTIONS:
-- Focus ONLY on CEC (Cation Exchange Capacity) values
-- CEC is a soil property that indicates the soil's ability to hold and exchange cations
-- CEC interpretation depends on soil type and texture, not fixed ideal ranges
-- CEC is measured in meq/100g or cmol/kg units
-- Low CEC (< 10 meq/100g): Sandy soils, low nutrient retention, requires more frequent fertilization
-- Medium CEC (10-25 meq/100g): Loamy soils, good nutrient retention, balanced fertilization
-- High CEC (> 25 meq/100g): Clay soils, excellent nutrient retention, efficient fertilizer use
-
-Provide a 2-3 sentence analysis focusing on:
-- **CEC levels** and their implications for **soil texture** and **nutrient retention capacity**
-- Impact on **fertilizer efficiency** and **nutrient availability** to plants
-- Brief mention of **soil management** considerations based on CEC characteristics
-Use professional soil science terminology and bold formatting for key terms. Focus on practical implications for fertilizer management and soil fertility.
-""",
-            'soilPh': f"""
-As a professional soil scientist and agronomist, provide a BRIEF analysis of the soil's pH status for a Soil Therapy Report.
-
-pH DATA: {', '.join([f"{n.get('name', 'Unknown')}: {n.get('current', 'N/A')} {n.get('unit', '')} (Target: {n.get('ideal', 'N/A')})" for n in nutrients_data])}
-
-DEFICIENT: {', '.join(deficient) if deficient else 'None'}
-OPTIMAL: {', '.join(optimal) if optimal else 'None'}
-EXCESS: {', '.join(excess) if excess else 'None'}
-
-Provide a 2-3 sentence analysis focusing on:
-- **pH levels** and their impact on **nutrient availability** and **plant uptake**
-- Implications for **soil biology**, **microbial activity**, and **crop performance**
-- Brief mention of **pH management strategies** if adjustment is needed
-Use professional soil science terminology and bold formatting for key terms. Focus on practical implications for crop nutrition and soil health.
-""",
-            'baseSaturation': f"""
-As a professional soil scientist and agronomist, provide a BRIEF analysis of the soil's base saturation for a Soil Therapy Report.
-
-BASE SATURATION DATA: {', '.join([
-    f"{n.get('name', 'Unknown')}: {n.get('current', 'N/A')} {n.get('unit', '')} (Ideal Range: {n.get('ideal_range', [None, None])[0]}–{n.get('ideal_range', [None, None])[1]} {n.get('unit', '')})"
-    if n.get('ideal_range') else
-    f"{n.get('name', 'Unknown')}: {n.get('current', 'N/A')} {n.get('unit', '')}"
-    for n in nutrients_data if 'base saturation' in n.get('name', '').lower() or 'ca' in n.get('name', '').lower() or 'mg' in n.get('name', '').lower() or 'k' in n.get('name', '').lower() or 'na' in n.get('name', '').lower()
-])}
-
-DEFICIENT: {', '.join(deficient) if deficient else 'None'}
-OPTIMAL: {', '.join(optimal) if optimal else 'None'}
-EXCESS: {', '.join(excess) if excess else 'None'}
-
-CRITICAL INSTRUCTIONS:
-- Focus ONLY on base saturation values (Ca, Mg, K, Na percentages)
-- Use ONLY the ideal range for determining base saturation status
-- A nutrient is "deficient" if current value < lower bound of ideal range
-- A nutrient is "excess" if current value > upper bound of ideal range  
-- A nutrient is "optimal" if current value is within the ideal range (including bounds)
-- IGNORE any target values - use only the ideal range
-- Base saturation is measured as percentage of CEC occupied by base cations
-- Ideal Ca: 65-80%, Mg: 10-20%, K: 2-5%, Na: < 3%
-
-EXAMPLE:
-If the Ca saturation is 70% and the ideal range is 65-80%, you MUST call it "optimal."
-If the Ca saturation is 50% and the ideal range is 65-80%, you MUST call it "deficient."
-If the Ca saturation is 85% and the ideal range is 65-80%, you MUST call it "excess."
-
-Provide a 2-3 sentence analysis focusing on:
-- **Base saturation levels** and their implications for **soil fertility** and **nutrient balance**
-- Impact on **cation availability** and **soil chemistry** for optimal crop nutrition
-- Brief mention of **management implications** for maintaining proper cation ratios
-Use professional soil science terminology and bold formatting for key terms. Focus on practical implications for soil fertility management.
-""",
-            'availableNutrients': f"""
-As a professional soil scientist and agronomist, provide a BRIEF analysis of the soil's available nutrients for a Soil Therapy Report.
-
-AVAILABLE NUTRIENTS DATA: {', '.join([f"{n.get('name', 'Unknown')}: {n.get('current', 'N/A')} {n.get('unit', '')} (Target: {n.get('ideal', 'N/A')})" for n in nutrients_data])}
-
-DEFICIENT: {', '.join(deficient) if deficient else 'None'}
-OPTIMAL: {', '.join(optimal) if optimal else 'None'}
-EXCESS: {', '.join(excess) if excess else 'None'}
-
-Provide a 2-3 sentence analysis focusing on:
-- **Key nutrient deficiencies** or **excesses** and their impact on **crop nutrition**
-- Implications for **plant growth**, **yield potential**, and **nutrient uptake efficiency**
-- Brief mention of **fertilization priorities** and **nutrient management strategies**
-Use professional soil science terminology and bold formatting for key terms. Focus on practical implications for crop production and soil fertility.
-""",
-            'lamotteReams': f"""
-As a professional soil scientist and agronomist, provide a BRIEF analysis of the soil's LaMotte/Reams test results for a Soil Therapy Report.
-
-LAMOTTE/REAMS DATA: {', '.join([
-    f"{n.get('name', 'Unknown')}: {n.get('current', 'N/A')} {n.get('unit', '')} (Ideal Range: {n.get('ideal_range', [None, None])[0]}–{n.get('ideal_range', [None, None])[1]} {n.get('unit', '')})"
-    if n.get('ideal_range') else
-    f"{n.get('name', 'Unknown')}: {n.get('current', 'N/A')} {n.get('unit', '')}"
-    for n in nutrients_data
-])}
-
-DEFICIENT: {', '.join(deficient) if deficient else 'None'}
-OPTIMAL: {', '.join(optimal) if optimal else 'None'}
-EXCESS: {', '.join(excess) if excess else 'None'}
-
-CRITICAL INSTRUCTIONS:
-- Use ONLY the ideal range for determining nutrient status.
-- A nutrient is "deficient" if current value < lower bound of ideal range.
-- A nutrient is "excess" if current value > upper bound of ideal range.
-- A nutrient is "optimal" if current value is within the ideal range (including bounds).
-- IGNORE any target values - use only the ideal range.
-- You MUST use the DEFICIENT, OPTIMAL, and EXCESS lists above to describe the nutrient status in your summary.
-
-In your summary, clearly state which nutrients are deficient, optimal, or in excess, using the DEFICIENT, OPTIMAL, and EXCESS lists above. Integrate this information naturally into your 2-3 sentence analysis, as you would for other sections. Do not use a separate status line or bullet points.
-
-Focus on:
-- **Key nutrient deficiencies** or **excesses** and their impact on **crop nutrition**
-- Implications for **plant growth**, **yield potential**, and **nutrient uptake efficiency**
-- Brief mention of **fertilization priorities** and **nutrient management strategies**
-Use professional soil science terminology and bold formatting for key terms. Focus on practical implications for crop production and soil fertility.
-""",
-            'tae': f"""
-As a professional soil scientist and agronomist, provide a BRIEF analysis of the soil's Total Available Elements (TAE) for a Soil Therapy Report.
-
-TAE DATA: {', '.join([f"{n.get('name', 'Unknown')}: {n.get('current', 'N/A')} {n.get('unit', '')} (Target: {n.get('ideal', 'N/A')})" for n in nutrients_data])}
-
-DEFICIENT: {', '.join(deficient) if deficient else 'None'}
-OPTIMAL: {', '.join(optimal) if optimal else 'None'}
-EXCESS: {', '.join(excess) if excess else 'None'}
-
-Provide a 2-3 sentence analysis focusing on:
-- **TAE levels** and their implications for **soil fertility** and **nutrient reserves**
-- Impact on **nutrient availability** and **plant nutrition** based on total element analysis
-- Brief mention of **management implications** for optimizing soil fertility and crop nutrition
-Use professional soil science terminology and bold formatting for key terms. Focus on practical implications for soil fertility management.
-"""
-        }
-
-        prompt = section_prompts.get(section, f"""
-As a professional soil scientist and agronomist, provide a BRIEF analysis for a Soil Therapy Report.
+        return jsonify({'summary': soil_section_summary(request.get_json())})
+    except LLMUnavailable as e:
+        return llm_unavailable(e)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
 
-SECTION: {section}
-DEFICIENT: {', '.join(deficient) if deficient else 'None'}
-OPTIMAL: {', '.join(optimal) if optimal else 'None'}
-EXCESS: {', '.join(excess) if excess else 'None'}
 
-Provide a 2-3 sentence analysis focusing on soil health and fertility implications.
-Use professional soil science terminology and bold formatting for key terms.
-""")
+def section_names_error(sections):
+    """Why ``sections`` cannot be answered keyed by name, or None."""
+    names = [section.get('section') for section in sections]
+    if not all(names):
+        return 'Every section needs a "section" name'
+    duplicates = sorted({name for name in names if names.count(name) > 1})
+    if duplicates:
+        return f'Duplicate sections: {", ".join(duplicates)}'
+    return None
 
-        response = client.chat.completions.create(
-            model="gpt-3.5-turbo",
-            messages=[{"role": "user", "content": prompt}],
-            max_tokens=300,
-            temperature=0.7
-        )
-        summary = response.choices[0].message.content.strip()
 
-        # Clean up any overly detailed responses
-        import re
-        cleaned = re.sub(r"\n{3,}", "\n\n", summary)
-        return jsonify({'summary': cleaned.strip()})
+def submit_sections(sections):
+    """Queue a summary for each section on the shared LLM pool."""
+    # Each task runs in a copy of this context, so its events land on the
+    # request's trace
+    return {section.get('section', ''): llm_executor().submit(
+        contextvars.copy_context().run, soil_section_summary, section)
+        for section in sections}
+
+
+def collect_sections(futures):
+    """Wait for submitted sections; returns ``(summaries, errors)``."""
+    summaries = {}
+    errors = {}
+    for name, future in futures.items():
+        try:
+            summaries[name] = future.result()
+        except Exception as e:
+            errors[name] = str(e)
+    return summaries, errors
+
+
+@api.route('/generate-soil-comments/batch', methods=['POST'])
+def generate_soil_comments_batch():
+    """Summaries for every section of one or many paddocks in one request.
+
+    The body is either ``{"sections": [...]}`` for one paddock or
+    ``{"paddocks": [{"id": ..., "sections": [...]}, ...]}``, where each
+    section is a /generate-soil-comments request body. All completions are
+    dispatched at once, bounded by LLM_MAX_CONCURRENCY. Results are keyed
+    by section name, so a paddock with a nameless or repeated section is
+    rejected with 400 before any completion is requested.
+    """
+    try:
+        data = request.get_json()
+        paddocks = data['paddocks'] if 'paddocks' in data else [data]
+        for paddock in paddocks:
+            error = section_names_error(paddock.get('sections', []))
+            if error is not None:
+                if 'paddocks' in data:
+                    error = f'Paddock {paddock.get("id")!r}: {error}'
+                return jsonify({'error': error}), 400
+        if 'paddocks' in data:
+            # Submit every section of every paddock before waiting on any
+            submitted = [(paddock.get('id'), submit_sections(paddock.get('sections', [])))
+                         for paddock in data['paddocks']]
+            results = []
+            for paddock_id, futures in submitted:
+                summaries, errors = collect_sections(futures)
+                results.append({'id': paddock_id, 'summaries': summaries,
+                                'errors': errors})
+            return jsonify({'paddocks': results})
+        summaries, errors = collect_sections(
+            submit_sections(data.get('sections', [])))
+        return jsonify({'summaries': summaries, 'errors': errors})
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 
+def create_app(warm=None):
+    """Build the Flask app; ``warm`` (default: ``APP_WARMUP``) runs warmup()."""
+    if warm is None:
+        warm = os.environ.get('APP_WARMUP', '').lower() in ('1', 'true')
+    if warm:
+        warmup()
+    flask_app = Flask(__name__)
+    flask_app.config['MAX_CONTENT_LENGTH'] = MAX_UPLOAD_BYTES
+    CORS(flask_app)
+    flask_app.register_blueprint(api)
+    return flask_app
+
+
+app = create_app()
+
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 5000))
     app.run(host='0.0.0.0', port=port, debug=True)
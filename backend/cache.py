@@ -0,0 +1,187 @@
+"""Two-tier cache for JSON-serializable results.
+
+The memory tier is a small LRU keyed by string; the disk tier is a SQLite
+table with least-recently-used eviction once the stored payloads exceed a
+byte budget. Entries can optionally expire after a TTL. Values are stored as
+JSON text in both tiers so every hit hands back a fresh object that callers
+are free to modify.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+class LRUCache:
+    """Thread-safe in-memory LRU mapping of string keys to JSON text."""
+
+    def __init__(self, max_entries=128):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires = entry
+            if expires is not None and expires <= time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, expires=None):
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (value, expires)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class SQLiteStore:
+    """On-disk JSON store bounded by the total size of its payloads."""
+
+    def __init__(self, path, max_bytes=256 * 1024 * 1024):
+        self.path = path
+        self.max_bytes = max_bytes
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        with self._conn:
+            self._conn.execute(
+                'CREATE TABLE IF NOT EXISTS entries ('
+                'key TEXT PRIMARY KEY, value TEXT NOT NULL, '
+                'size INTEGER NOT NULL, accessed REAL NOT NULL, expires REAL)')
+            columns = [row[1] for row in self._conn.execute(
+                'PRAGMA table_info(entries)')]
+            if 'expires' not in columns:
+                self._conn.execute('ALTER TABLE entries ADD COLUMN expires REAL')
+            self._conn.execute(
+                'CREATE INDEX IF NOT EXISTS entries_accessed '
+                'ON entries (accessed)')
+
+    def get(self, key):
+        """Return ``(value, expires)`` for ``key``, or None if absent."""
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT value, expires FROM entries WHERE key = ?',
+                (key,)).fetchone()
+            if row is None:
+                return None
+            if row[1] is not None and row[1] <= time.time():
+                with self._conn:
+                    self._conn.execute(
+                        'DELETE FROM entries WHERE key = ?', (key,))
+                return None
+            with self._conn:
+                self._conn.execute(
+                    'UPDATE entries SET accessed = ? WHERE key = ?',
+                    (time.time(), key))
+            return row
+
+    def set(self, key, value, expires=None):
+        size = len(value.encode('utf-8'))
+        if size > self.max_bytes:
+            return
+        with self._lock, self._conn:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO entries '
+                '(key, value, size, accessed, expires) VALUES (?, ?, ?, ?, ?)',
+                (key, value, size, time.time(), expires))
+            self._evict()
+
+    def _evict(self):
+        self._conn.execute(
+            'DELETE FROM entries WHERE expires IS NOT NULL AND expires <= ?',
+            (time.time(),))
+        total = self._conn.execute(
+            'SELECT COALESCE(SUM(size), 0) FROM entries').fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for key, size in self._conn.execute(
+                'SELECT key, size FROM entries ORDER BY accessed').fetchall():
+            self._conn.execute('DELETE FROM entries WHERE key = ?', (key,))
+            total -= size
+            if total <= self.max_bytes:
+                break
+
+    def clear(self):
+        with self._lock, self._conn:
+            self._conn.execute('DELETE FROM entries')
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute(
+                'SELECT COUNT(*) FROM entries').fetchone()[0]
+
+
+class TieredCache:
+    """Memory LRU in front of an optional SQLite store, with hit counters.
+
+    With ``ttl`` (seconds) set, entries expire that long after being stored.
+    """
+
+    def __init__(self, memory_entries=128, disk_path=None,
+                 disk_max_bytes=256 * 1024 * 1024, ttl=None):
+        self.ttl = ttl
+        self.memory = LRUCache(memory_entries)
+        self.disk = SQLiteStore(disk_path, disk_max_bytes) if disk_path else None
+        self._lock = threading.Lock()
+        self._counters = {'hits': 0, 'memory_hits': 0, 'disk_hits': 0,
+                          'misses': 0, 'stores': 0}
+
+    def _count(self, *names):
+        with self._lock:
+            for name in names:
+                self._counters[name] += 1
+
+    def get(self, key):
+        """Return the cached value for ``key``, or None on a miss."""
+        value = self.memory.get(key)
+        if value is not None:
+            self._count('hits', 'memory_hits')
+            return json.loads(value)
+        if self.disk is not None:
+            entry = self.disk.get(key)
+            if entry is not None:
+                value, expires = entry
+                self.memory.set(key, value, expires)
+                self._count('hits', 'disk_hits')
+                return json.loads(value)
+        self._count('misses')
+        return None
+
+    def set(self, key, value):
+        serialized = json.dumps(value)
+        expires = time.time() + self.ttl if self.ttl else None
+        self.memory.set(key, serialized, expires)
+        if self.disk is not None:
+            self.disk.set(key, serialized, expires)
+        self._count('stores')
+
+    def clear(self):
+        self.memory.clear()
+        if self.disk is not None:
+            self.disk.clear()
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._counters)
+        stats['memory_entries'] = len(self.memory)
+        stats['disk_entries'] = len(self.disk) if self.disk is not None else 0
+        return stats
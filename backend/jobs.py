@@ -0,0 +1,144 @@
+"""Background jobs with progress, backed by a local SQLite table.
+
+Jobs run on a thread pool inside the server process. Their status,
+progress and result live in SQLite, so any server process sharing the
+database file can answer a status poll. A job's arguments (an uploaded
+PDF) stay in memory until it finishes, so the number of jobs queued or
+running per process is bounded.
+"""
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+
+class QueueFull(Exception):
+    """As many jobs are queued or running as the queue takes."""
+
+
+class JobStore:
+    """Job records keyed by id: status, stage, page progress and result."""
+
+    def __init__(self, path):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        with self._conn:
+            self._conn.execute(
+                'CREATE TABLE IF NOT EXISTS jobs ('
+                'id TEXT PRIMARY KEY, kind TEXT NOT NULL, status TEXT NOT NULL, '
+                'stage TEXT, done INTEGER NOT NULL DEFAULT 0, '
+                'total INTEGER NOT NULL DEFAULT 0, result TEXT, error TEXT, '
+                'created REAL NOT NULL, updated REAL NOT NULL)')
+
+    def create(self, kind):
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                'INSERT INTO jobs (id, kind, status, created, updated) '
+                'VALUES (?, ?, ?, ?, ?)', (job_id, kind, 'queued', now, now))
+        return job_id
+
+    def update(self, job_id, **fields):
+        if 'result' in fields:
+            fields['result'] = json.dumps(fields['result'])
+        fields['updated'] = time.time()
+        assignments = ', '.join(f'{name} = ?' for name in fields)
+        with self._lock, self._conn:
+            self._conn.execute(
+                f'UPDATE jobs SET {assignments} WHERE id = ?',
+                (*fields.values(), job_id))
+
+    def get(self, job_id):
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT id, kind, status, stage, done, total, result, error, '
+                'created, updated FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = {
+            'id': row[0],
+            'kind': row[1],
+            'status': row[2],
+            'progress': {'stage': row[3], 'done': row[4], 'total': row[5]},
+            'created': row[8],
+            'updated': row[9]
+        }
+        if row[6] is not None:
+            job['result'] = json.loads(row[6])
+        if row[7] is not None:
+            job['error'] = row[7]
+        return job
+
+    def prune(self, max_age):
+        """Delete finished jobs not updated within ``max_age`` seconds."""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "DELETE FROM jobs WHERE status IN ('done', 'failed') "
+                'AND updated < ?', (time.time() - max_age,))
+
+
+class JobQueue:
+    """Run callables on a bounded thread pool and record them in a store.
+
+    A submitted callable is invoked as ``fn(*args, progress=report)`` where
+    ``report(stage, done, total)`` updates the job's progress. Its return
+    value becomes the job result; an exception marks the job as failed.
+
+    ``submit`` raises QueueFull once ``max_pending`` jobs are queued or
+    running (0: no limit).
+    """
+
+    def __init__(self, store, max_workers=2, max_age=3600, max_pending=16):
+        self.store = store
+        self.max_age = max_age
+        self.max_pending = max_pending
+        self._pending = 0
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix='job')
+
+    def submit(self, kind, fn, *args):
+        with self._lock:
+            if self.max_pending and self._pending >= self.max_pending:
+                raise QueueFull(f'{self._pending} jobs are already queued '
+                                f'or running')
+            self._pending += 1
+        try:
+            self.store.prune(self.max_age)
+            job_id = self.store.create(kind)
+            self._executor.submit(self._run, job_id, fn, args)
+        except BaseException:
+            self._done()
+            raise
+        return job_id
+
+    def _done(self):
+        with self._lock:
+            self._pending -= 1
+
+    def _run(self, job_id, fn, args):
+        def report(stage, done, total):
+            self.store.update(job_id, stage=stage, done=done, total=total)
+
+        try:
+            self.store.update(job_id, status='running')
+            try:
+                result = fn(*args, progress=report)
+            except Exception as e:
+                logger.exception('Job %s failed', job_id)
+                self.store.update(job_id, status='failed', error=str(e))
+            else:
+                self.store.update(job_id, status='done', result=result)
+        finally:
+            self._done()
@@ -0,0 +1,205 @@
+"""Rate-limited, retrying access to the chat completions API.
+
+Every completion in the server goes through one ``LLMGateway``, which
+
+- shares a single OpenAI client per process, so HTTP connections are
+  kept alive and reused across requests
+- caps the completions in flight and paces them with token buckets for
+  requests and tokens per minute, so bursts queue here instead of being
+  rejected by the provider
+- retries rate limits (429), server errors (5xx), timeouts and dropped
+  connections with jittered exponential backoff, honouring Retry-After
+- gives every call a timeout
+
+Waits, attempts, retries and token usage are recorded in ``metrics``.
+``base_url`` points the gateway at any OpenAI-compatible server, e.g.
+``benchmarks/fake_llm_server.py`` for local load tests.
+"""
+import random
+import threading
+import time
+
+from metrics import LLM_REQUESTS, LLM_RETRIES, LLM_TOKENS, STAGE_SECONDS
+from tracing import event as trace_event
+
+
+class LLMUnavailable(Exception):
+    """The provider kept failing (rate limit, 5xx, timeout) through every retry."""
+
+
+class TokenBucket:
+    """Allows ``per_minute`` units a minute, in bursts of up to that many.
+
+    ``acquire`` reserves its units right away and sleeps off any shortfall,
+    so concurrent callers are served in the order they arrived.
+    """
+
+    def __init__(self, per_minute, clock=time.monotonic, sleep=time.sleep):
+        self.capacity = float(per_minute)
+        self.rate = self.capacity / 60
+        self._clock = clock
+        self._sleep = sleep
+        self._tokens = self.capacity
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = self._clock()
+        self._tokens = min(self.capacity,
+                           self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self, amount=1):
+        """Take ``amount`` units, waiting until they are available.
+
+        Returns the seconds waited.
+        """
+        with self._lock:
+            self._refill()
+            self._tokens -= min(amount, self.capacity)
+            delay = -self._tokens / self.rate if self._tokens < 0 else 0.0
+        if delay:
+            self._sleep(delay)
+        return delay
+
+    def refund(self, amount):
+        """Give back units that were reserved but not used (or, if
+        ``amount`` is negative, charge for units used beyond the reservation)."""
+        with self._lock:
+            self._refill()
+            self._tokens = min(self.capacity, self._tokens + amount)
+
+
+def retry_reason(error):
+    """Why a failed completion is worth retrying, or None if it is not."""
+    import openai
+
+    if isinstance(error, openai.APITimeoutError):
+        return 'timeout'
+    if isinstance(error, openai.APIConnectionError):
+        return 'connection'
+    if isinstance(error, openai.APIStatusError):
+        if error.status_code == 429:
+            # An exhausted quota does not come back by waiting
+            if getattr(error, 'code', None) == 'insufficient_quota':
+                return None
+            return 'rate_limit'
+        if error.status_code >= 500:
+            return 'server_error'
+    return None
+
+
+def retry_after(error):
+    """Seconds the provider asked us to wait, from Retry-After, or None."""
+    response = getattr(error, 'response', None)
+    if response is None:
+        return None
+    headers = response.headers
+    try:
+        if 'retry-after-ms' in headers:
+            return float(headers['retry-after-ms']) / 1000
+        if 'retry-after' in headers:
+            return float(headers['retry-after'])
+    except ValueError:
+        # An HTTP date; fall back to our own backoff
+        pass
+    return None
+
+
+class LLMGateway:
+    """Chat completions through a shared client with limits and retries.
+
+    A ``requests_per_minute`` or ``tokens_per_minute`` of 0 disables that
+    bucket. Tokens are reserved up front from an estimate of the prompt
+    and ``max_tokens``, then settled against the reported usage.
+    """
+
+    def __init__(self, api_key=None, base_url=None, timeout=30.0,
+                 max_retries=4, backoff_base=0.5, backoff_max=30.0,
+                 requests_per_minute=0, tokens_per_minute=0, max_in_flight=8):
+        self.api_key = api_key
+        self.base_url = base_url or None
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.requests = TokenBucket(requests_per_minute) if requests_per_minute else None
+        self.tokens = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+        self._in_flight = threading.BoundedSemaphore(max_in_flight)
+        self._client = None
+        self._client_lock = threading.Lock()
+
+    @property
+    def client(self):
+        """The OpenAI client, importing openai and creating it on first use."""
+        with self._client_lock:
+            if self._client is None:
+                import openai
+                # Retries are ours, so that they go through the limiter
+                self._client = openai.OpenAI(
+                    api_key=self.api_key, base_url=self.base_url,
+                    timeout=self.timeout, max_retries=0)
+            return self._client
+
+    def retry_delay(self, attempt, error):
+        """Full-jitter exponential backoff, or the provider's Retry-After."""
+        requested = retry_after(error)
+        if requested is not None:
+            return min(requested, self.backoff_max)
+        return random.uniform(
+            0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    def _wait_for_capacity(self, estimated_tokens):
+        waited = 0.0
+        if self.requests is not None:
+            waited += self.requests.acquire()
+        if self.tokens is not None:
+            waited += self.tokens.acquire(estimated_tokens)
+        if waited:
+            STAGE_SECONDS.observe(waited, stage='llm_wait')
+
+    def complete(self, model, messages, max_tokens, temperature=None):
+        """Text of a chat completion.
+
+        Raises LLMUnavailable once retries are exhausted, and any other
+        API error (bad request, authentication...) straight away.
+        """
+        options = {} if temperature is None else {'temperature': temperature}
+        estimated_tokens = (sum(len(m['content']) for m in messages) // 4
+                            + max_tokens)
+        for attempt in range(self.max_retries + 1):
+            self._wait_for_capacity(estimated_tokens)
+            try:
+                with self._in_flight, STAGE_SECONDS.time(stage='llm'):
+                    response = self.client.chat.completions.create(
+                        model=model, messages=messages, max_tokens=max_tokens,
+                        timeout=self.timeout, **options)
+            except Exception as e:
+                if self.tokens is not None:
+                    self.tokens.refund(estimated_tokens)
+                reason = retry_reason(e)
+                if reason is None:
+                    LLM_REQUESTS.inc(outcome='error')
+                    raise
+                if attempt == self.max_retries:
+                    LLM_REQUESTS.inc(outcome='error')
+                    raise LLMUnavailable(
+                        f'Completion failed after {attempt + 1} attempts '
+                        f'({reason}): {e}') from e
+                delay = self.retry_delay(attempt, e)
+                LLM_RETRIES.inc(reason=reason)
+                trace_event('llm', 'attempt %d failed (%s), retrying in %.2fs',
+                            attempt + 1, reason, delay)
+                time.sleep(delay)
+                continue
+
+            LLM_REQUESTS.inc(outcome='ok')
+            usage = response.usage
+            if usage is not None:
+                LLM_TOKENS.inc(usage.prompt_tokens, kind='prompt')
+                LLM_TOKENS.inc(usage.completion_tokens, kind='completion')
+                if self.tokens is not None:
+                    self.tokens.refund(estimated_tokens - usage.total_tokens)
+                trace_event('llm', 'completion: %d prompt + %d completion tokens',
+                            usage.prompt_tokens, usage.completion_tokens)
+            return response.choices[0].message.content
@@ -0,0 +1,178 @@
+"""In-process counters and latency histograms for the extraction hot path.
+
+Metrics are kept per server process and rendered in the Prometheus text
+exposition format by the ``/metrics`` endpoint. Stage timings cover the
+upload read, pdfplumber table extraction, table classification, metadata
+lookup, OCR rasterization and recognition, LLM calls and the time LLM
+calls wait for the rate limiter.
+"""
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+
+# Seconds; wide enough for both per-table parsing and slow OCR/LLM calls
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0,
+                   2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _escape(value):
+    return (str(value).replace('\\', r'\\').replace('"', r'\"')
+            .replace('\n', r'\n'))
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"'
+                          for name, value in labels) + '}'
+
+
+class _Metric:
+    type = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(
+                f'{self.name} expects labels {self.labelnames}, got {tuple(labels)}')
+        return tuple((name, labels[name]) for name in self.labelnames)
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}',
+                 f'# TYPE {self.name} {self.type}']
+        with self._lock:
+            items = sorted(self._values.items(), key=lambda item: str(item[0]))
+            lines.extend(self._render_samples(items))
+        return lines
+
+
+class Counter(_Metric):
+    """Monotonic count, optionally split by labels."""
+
+    type = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+    def _render_samples(self, items):
+        for key, value in items:
+            yield f'{self.name}{_format_labels(key)} {value}'
+
+
+class Histogram(_Metric):
+    """Distribution of observed values over fixed upper-bound buckets."""
+
+    type = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(),
+                 buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                # Per-bucket counts (last one is +Inf), sum, count
+                entry = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            entry[0][index] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe the wall time spent in the ``with`` block."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def count(self, **labels):
+        with self._lock:
+            entry = self._values.get(self._key(labels))
+            return entry[2] if entry else 0
+
+    def _render_samples(self, items):
+        bounds = [f'{bound:g}' for bound in self.buckets] + ['+Inf']
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(bounds, counts):
+                cumulative += bucket_count
+                labels = _format_labels(key + (('le', bound),))
+                yield f'{self.name}_bucket{labels} {cumulative}'
+            yield f'{self.name}_sum{_format_labels(key)} {total}'
+            yield f'{self.name}_count{_format_labels(key)} {count}'
+
+
+class Registry:
+    """Named collection of metrics rendered together."""
+
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self.register(Counter(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(),
+                  buckets=DEFAULT_BUCKETS):
+        return self.register(
+            Histogram(name, documentation, labelnames, buckets))
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+STAGE_SECONDS = REGISTRY.histogram(
+    'plant_therapy_stage_seconds',
+    'Time spent in each extraction and commentary stage.', ('stage',))
+PAGES = REGISTRY.counter(
+    'plant_therapy_pages_total',
+    'PDF pages processed, by stage (tables or ocr).', ('stage',))
+TABLES = REGISTRY.counter(
+    'plant_therapy_tables_total', 'Tables found by pdfplumber.')
+OCR_CACHE = REGISTRY.counter(
+    'plant_therapy_ocr_cache_total',
+    'OCR page cache lookups, by result (hit or miss).', ('result',))
+ANALYSES = REGISTRY.counter(
+    'plant_therapy_analyses_total',
+    'Analyses extracted, by source (tables, ocr or text).', ('source',))
+BATCH_FILES = REGISTRY.counter(
+    'plant_therapy_batch_files_total',
+    'Files of batch uploads, by outcome (ok, duplicate or error).',
+    ('outcome',))
+LLM_REQUESTS = REGISTRY.counter(
+    'plant_therapy_llm_requests_total',
+    'Chat completion requests, by outcome (ok or error).', ('outcome',))
+LLM_RETRIES = REGISTRY.counter(
+    'plant_therapy_llm_retries_total',
+    'Chat completion attempts retried, by reason (rate_limit, server_error, '
+    'timeout or connection).', ('reason',))
+LLM_TOKENS = REGISTRY.counter(
+    'plant_therapy_llm_tokens_total',
+    'Tokens used by chat completions, by kind (prompt or completion).',
+    ('kind',))
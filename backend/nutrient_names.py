@@ -0,0 +1,156 @@
+"""Canonical names for the nutrients printed on soil and leaf reports.
+
+Labs print the same nutrient many ways ("Sulfur (KCl)", "Sulphur",
+"S - Sulphur") and OCR garbles some beyond recognition ("jum (Mehlich
+II!)"). ``canonical_name`` resolves a printed name in three steps:
+
+1. known OCR garbles, matched on the raw text
+2. an alias map keyed by the normalized name: lowercased, without the
+   "X - " symbol prefix, the extraction method in parentheses and
+   punctuation
+3. for misspellings, a character trigram index over the alias keys,
+   accepting the best match with a Dice similarity of at least
+   ``FUZZY_MIN_SIMILARITY`` among the keys with at least as many words,
+   so that a compound ("Calcium Carbonate") is not taken for the nutrient
+   it starts with
+
+Results are memoized, so a name seen before costs one dict lookup and a
+new one only scores the aliases it shares a trigram with. This module has
+no dependencies so the leaf scoring script can use it as well.
+"""
+import re
+from collections import Counter
+from functools import lru_cache
+
+# Canonical name -> other (normalized) names labs use for it
+ALIASES = {
+    'Nitrogen': ['n', 'total nitrogen', 'nitrogen total'],
+    'Nitrate': ['nitrate n', 'nitrate nitrogen', 'no3', 'no3 n'],
+    'Ammonium': ['ammonium n', 'ammonium nitrogen', 'nh4', 'nh4 n'],
+    'Phosphorus': ['p', 'phosphorous', 'phosphate'],
+    'Potassium': ['k', 'potash'],
+    'Calcium': ['ca'],
+    'Magnesium': ['mg'],
+    'Sodium': ['na'],
+    'Sulphur': ['s', 'sulfur', 'sulphate', 'sulfate', 'sulphate sulphur',
+                'sulfate sulfur'],
+    'Iron': ['fe'],
+    'Copper': ['cu'],
+    'Manganese': ['mn'],
+    'Boron': ['b'],
+    'Zinc': ['zn'],
+    'Cobalt': ['co'],
+    'Molybdenum': ['mo'],
+    'Silicon': ['si', 'silica'],
+    'Aluminium': ['al', 'aluminum'],
+    'Hydrogen': ['h'],
+    'Other Bases': [],
+    'Base Saturation': [],
+    'Organic Matter': ['om'],
+    'Organic Carbon': ['oc'],
+    'Conductivity': ['ec', 'electrical conductivity'],
+    'Paramagnetism': [],
+    'pH': ['ph level'],
+    'CEC': ['cation exchange capacity', 'tec', 'total exchange capacity'],
+    'Ca/Mg Ratio': ['ca mg', 'ca mg ratio', 'calcium magnesium ratio'],
+    'Ca/K': ['ca k', 'ca k ratio', 'calcium potassium ratio'],
+    'Mg/K': ['mg k', 'mg k ratio', 'magnesium potassium ratio'],
+    'K/Na': ['k na', 'k na ratio', 'potassium sodium ratio'],
+    'P/Zn': ['p zn', 'p zn ratio', 'phosphorus zinc ratio'],
+    'Fe/Mn': ['fe mn', 'fe mn ratio', 'iron manganese ratio'],
+}
+
+# Common garbled OCR nutrient names, matched before normalizing
+GARBLED_NUTRIENT_MAP = {
+    'jum (Mehlich II!)': 'Calcium',
+    'ium (Mehlich Ill)': 'Magnesium',
+    'Do (Hot CaCl2)': 'Sodium',
+    'Silicon (CaCl2)': 'Silicon',
+    '(KCl)': 'Potassium',
+}
+
+FUZZY_MIN_SIMILARITY = 0.6
+# Shorter keys (chemical symbols, "om") only ever match exactly
+FUZZY_MIN_LENGTH = 4
+
+SYMBOL_PREFIX_PATTERN = re.compile(r'^[A-Z][a-z]?\s+-\s+(?=\S)')
+PARENTHESES_PATTERN = re.compile(r'\([^)]*\)?')
+NON_WORD_PATTERN = re.compile(r'[^a-z0-9]+')
+
+
+def normalize_name(name):
+    """Lowercased words of a name, without symbol prefix or parentheses."""
+    name = SYMBOL_PREFIX_PATTERN.sub('', name.strip())
+    name = PARENTHESES_PATTERN.sub(' ', name)
+    return ' '.join(NON_WORD_PATTERN.sub(' ', name.lower()).split())
+
+
+def trigrams(key):
+    padded = f' {key} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class NameIndex:
+    """Exact lookups plus a trigram index for fuzzy ones over {key: name}."""
+
+    def __init__(self, names):
+        self._names = dict(names)
+        self._grams = {}
+        self._sizes = {}
+        self._words = {}
+        for key in self._names:
+            if len(key) < FUZZY_MIN_LENGTH:
+                continue
+            grams = trigrams(key)
+            self._sizes[key] = len(grams)
+            self._words[key] = len(key.split())
+            for gram in grams:
+                self._grams.setdefault(gram, []).append(key)
+
+    def lookup(self, key, min_similarity=FUZZY_MIN_SIMILARITY):
+        """The name for ``key``, its closest fuzzy match, or None.
+
+        Fuzzy matches only consider keys with at least as many words as
+        ``key``: extra words make it a different thing, not a misspelling.
+        """
+        name = self._names.get(key)
+        if name is not None or len(key) < FUZZY_MIN_LENGTH:
+            return name
+        grams = trigrams(key)
+        words = len(key.split())
+        shared = Counter()
+        for gram in grams:
+            shared.update(self._grams.get(gram, ()))
+        best_key, best = None, 0.0
+        # Sorted so that ties always resolve the same way
+        for candidate, count in sorted(shared.items()):
+            if self._words[candidate] < words:
+                continue
+            similarity = 2 * count / (len(grams) + self._sizes[candidate])
+            if similarity > best:
+                best_key, best = candidate, similarity
+        return self._names[best_key] if best >= min_similarity else None
+
+
+def _alias_keys():
+    keys = {}
+    for canonical, aliases in ALIASES.items():
+        keys[normalize_name(canonical)] = canonical
+        for alias in aliases:
+            keys[alias] = canonical
+    return keys
+
+
+NAME_INDEX = NameIndex(_alias_keys())
+
+
+@lru_cache(maxsize=4096)
+def canonical_name(name):
+    """Canonical name for a nutrient name as printed, or None if unknown."""
+    if not name:
+        return None
+    garbled = GARBLED_NUTRIENT_MAP.get(name.strip())
+    if garbled is not None:
+        return garbled
+    key = normalize_name(name)
+    return NAME_INDEX.lookup(key) if key else None
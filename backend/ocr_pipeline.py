@@ -0,0 +1,182 @@
+"""Page-level OCR for scanned soil reports.
+
+Pages are rasterized one at a time (``first_page``/``last_page``) inside a
+bounded process pool, so at most ``OCR_MAX_WORKERS`` page images are held in
+memory at once and recognition runs on every core. Results are returned in
+page order regardless of which worker finishes first. Workers time their
+rasterize and recognize steps and the parent process records them.
+
+Pages are rendered in grayscale by default (``OCR_GRAYSCALE``) and can be
+cropped to the region holding the tables with ``OCR_CROP``, given as
+``left,top,right,bottom`` fractions of the page, e.g. ``0,0.1,1,0.7``.
+
+Recognized text is cached on disk per page image: the key is a hash of the
+rasterized (and cropped) pixels plus the tesseract version and config, so a
+page that was seen before, in this PDF or any other, skips recognition.
+
+pdf2image and pytesseract are imported on first use, so importing this
+module costs nothing until a scanned page actually needs OCR.
+"""
+import hashlib
+import os
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from cache import TieredCache
+from metrics import OCR_CACHE, PAGES, STAGE_SECONDS
+from process_local import process_local
+from tracing import event as trace_event
+
+OCR_MAX_WORKERS = int(os.environ.get('OCR_MAX_WORKERS', os.cpu_count() or 1))
+OCR_DPI = int(os.environ.get('OCR_DPI', 200))
+OCR_GRAYSCALE = os.environ.get('OCR_GRAYSCALE', '1').lower() in ('1', 'true')
+
+
+def parse_crop(value):
+    """``'left,top,right,bottom'`` page fractions to a tuple, or None."""
+    if not value:
+        return None
+    box = tuple(float(part) for part in value.split(','))
+    if len(box) != 4 or not (0 <= box[0] < box[2] <= 1 and 0 <= box[1] < box[3] <= 1):
+        raise ValueError(f'Invalid OCR crop box: {value!r}')
+    return box
+
+
+OCR_CROP = parse_crop(os.environ.get('OCR_CROP'))
+OCR_TESSERACT_CONFIG = os.environ.get('OCR_TESSERACT_CONFIG', '')
+OCR_CACHE_PATH = os.environ.get(
+    'OCR_CACHE_PATH',
+    os.path.join(tempfile.gettempdir(), 'plant-therapy-cache', 'ocr.sqlite3'))
+OCR_CACHE_MAX_BYTES = int(os.environ.get('OCR_CACHE_MAX_BYTES', 64 * 1024 * 1024))
+
+
+
+def ocr_settings():
+    """The OCR settings that shape recognized text, for cache keys."""
+    return {'dpi': OCR_DPI, 'grayscale': OCR_GRAYSCALE, 'crop': OCR_CROP,
+            'tesseract_config': OCR_TESSERACT_CONFIG}
+
+
+_tesseract_version = None
+
+# The pool and the cache's SQLite handle belong to the process that made
+# them; OCR workers open their own page cache, sharing its disk tier
+_executor = process_local(
+    lambda: ProcessPoolExecutor(max_workers=OCR_MAX_WORKERS))
+_page_cache = process_local(
+    lambda: TieredCache(memory_entries=0, disk_path=OCR_CACHE_PATH,
+                        disk_max_bytes=OCR_CACHE_MAX_BYTES)
+    if OCR_CACHE_PATH else None)
+
+
+def get_executor():
+    """Return the shared OCR process pool, creating it on first use."""
+    return _executor()
+
+
+def get_page_cache():
+    """Return this process's handle on the page OCR cache, or None if off."""
+    return _page_cache()
+
+
+def page_cache_key(image, config=OCR_TESSERACT_CONFIG):
+    """Hash of a page image's pixels and everything that shapes its text."""
+    global _tesseract_version
+    if _tesseract_version is None:
+        import pytesseract
+        _tesseract_version = str(pytesseract.get_tesseract_version())
+    digest = hashlib.sha256(
+        f'{_tesseract_version}:{config}:{image.mode}:{image.size}'.encode('utf-8'))
+    digest.update(image.tobytes())
+    return digest.hexdigest()
+
+
+def recognize(image, config=OCR_TESSERACT_CONFIG):
+    """OCR a page image through the page cache; returns ``(text, cached)``."""
+    import pytesseract
+
+    cache = get_page_cache()
+    if cache is None:
+        return pytesseract.image_to_string(image, config=config), False
+    key = page_cache_key(image, config)
+    text = cache.get(key)
+    if text is not None:
+        return text, True
+    text = pytesseract.image_to_string(image, config=config)
+    cache.set(key, text)
+    return text, False
+
+
+def ocr_page(pdf_path, page_number, dpi=OCR_DPI, grayscale=OCR_GRAYSCALE,
+             crop=OCR_CROP):
+    """Rasterize a single page of ``pdf_path`` and OCR it.
+
+    Returns ``(text, rasterize_seconds, recognize_seconds, cached)``.
+    """
+    from pdf2image import convert_from_path
+
+    start = time.perf_counter()
+    images = convert_from_path(
+        pdf_path, dpi=dpi, first_page=page_number, last_page=page_number,
+        grayscale=grayscale)
+    rasterized = time.perf_counter()
+    if not images:
+        return '', rasterized - start, 0.0, False
+    image = images[0]
+    try:
+        if crop:
+            width, height = image.size
+            cropped = image.crop((round(crop[0] * width), round(crop[1] * height),
+                                  round(crop[2] * width), round(crop[3] * height)))
+            image.close()
+            image = cropped
+        text, cached = recognize(image)
+    finally:
+        image.close()
+    return text, rasterized - start, time.perf_counter() - rasterized, cached
+
+
+def ocr_pdf_bytes(pdf_bytes, dpi=OCR_DPI, progress=None, max_pages=None,
+                  pages=None, grayscale=OCR_GRAYSCALE, crop=OCR_CROP):
+    """OCR the pages of a PDF and return their texts in page order.
+
+    ``pages`` lists the (1-based) page numbers to OCR; by default every
+    page is read, or only the first ``max_pages`` when that is set.
+    ``progress(done, total)`` is called each time a page finishes.
+    """
+    # Workers read the PDF from disk so each task only carries a path and a
+    # page number instead of a copy of the whole upload.
+    with tempfile.NamedTemporaryFile(suffix='.pdf', delete=False) as tmp:
+        tmp.write(pdf_bytes)
+        pdf_path = tmp.name
+    try:
+        if pages is None:
+            from pdf2image import pdfinfo_from_path
+            page_count = pdfinfo_from_path(pdf_path)['Pages']
+            if max_pages is not None:
+                page_count = min(page_count, max_pages)
+            pages = range(1, page_count + 1)
+        page_count = len(pages)
+        executor = get_executor()
+        futures = {executor.submit(ocr_page, pdf_path, page_number, dpi,
+                                   grayscale, crop): page_number
+                   for page_number in pages}
+        for done, future in enumerate(as_completed(futures), 1):
+            if future.exception() is None:
+                _, rasterize_seconds, recognize_seconds, cached = future.result()
+                STAGE_SECONDS.observe(rasterize_seconds, stage='ocr_rasterize')
+                STAGE_SECONDS.observe(recognize_seconds, stage='ocr_recognize')
+                PAGES.inc(stage='ocr')
+                OCR_CACHE.inc(result='hit' if cached else 'miss')
+                trace_event('ocr', 'page %d: rasterized in %.3fs, recognized '
+                            'in %.3fs (cached: %s)', futures[future],
+                            rasterize_seconds, recognize_seconds, cached)
+            else:
+                trace_event('ocr', 'page %d failed: %r', futures[future],
+                            future.exception())
+            if progress:
+                progress(done, page_count)
+        return [future.result()[0] for future in futures]
+    finally:
+        os.unlink(pdf_path)
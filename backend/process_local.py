@@ -0,0 +1,32 @@
+"""Objects that belong to one process: built on first use, rebuilt after fork.
+
+SQLite connections, thread pools and process pools must not cross
+``fork()``. A preforking server that imports the app in its master would
+hand every worker the same connection, and pools whose management
+threads exist only in the master. ``process_local`` defers building them
+to first use and makes a forked child build its own.
+"""
+import os
+import threading
+
+
+def process_local(factory):
+    """A getter for ``factory()``, called on first use in each process."""
+    lock = threading.Lock()
+    instance = []
+
+    def get():
+        with lock:
+            if not instance:
+                instance.append(factory())
+            return instance[0]
+
+    def reset_in_child():
+        # The parent's lock may have been held mid-fork
+        nonlocal lock
+        lock = threading.Lock()
+        instance.clear()
+
+    if hasattr(os, 'register_at_fork'):  # POSIX only
+        os.register_at_fork(after_in_child=reset_in_child)
+    return get
@@ -0,0 +1,287 @@
+"""Prompt templates for the generated report comments.
+
+Templates are plain format strings built once at import. A request formats
+only the section it asks for, with that section's nutrient rows picked out
+in a single pass over the payload. Every template has an id that includes
+TEMPLATE_VERSION; bump the version whenever the wording or the row
+formatting changes so cached summaries from old prompts stop matching.
+"""
+
+TEMPLATE_VERSION = '1'
+
+PLANT_SUMMARY_TEMPLATE = """
+As a professional plant nutritionist and agronomist, provide a BRIEF executive summary for a Plant Therapy Report based on the following nutrient analysis:
+
+DEFICIENT NUTRIENTS: {deficient}
+OPTIMAL NUTRIENTS: {optimal}
+EXCESS NUTRIENTS: {excess}
+
+Provide a complete executive summary (2-3 sentences) that gives a brief overview of the plant's nutritional status. Make sure to complete your thoughts and provide a full summary. Do NOT include detailed nutrient descriptions, specific functions, or management recommendations. Keep it brief and professional.
+
+IMPORTANT: When mentioning nutrients, use the format "**Full Name (Abbreviation)**" - for example: **Nitrogen (N)**, **Phosphorus (P)**, **Calcium (Ca)**, **Magnesium (Mg)**, **Potassium (K)**, **Boron (B)**, **Copper (Cu)**, **Zinc (Zn)**, **Iron (Fe)**, **Manganese (Mn)**, **Molybdenum (Mo)**, **Sulphur (S)**, **Sodium (Na)**.
+
+Focus on:
+- Brief overview of nutritional status
+- Professional tone
+- Complete sentences and thoughts
+- No detailed nutrient analysis
+- Use bold formatting for nutrient names
+"""
+
+ORGANIC_MATTER_TEMPLATE = """
+As a professional soil scientist and agronomist, provide a BRIEF analysis of the soil's organic matter status for a Soil Therapy Report.
+
+ORGANIC MATTER DATA: {data}
+
+DEFICIENT: {deficient}
+OPTIMAL: {optimal}
+EXCESS: {excess}
+
+CRITICAL INSTRUCTIONS:
+- Focus ONLY on ORGANIC MATTER values, NOT organic carbon values
+- Use ONLY the ideal range for determining organic matter status
+- A nutrient is "deficient" if current value < lower bound of ideal range
+- A nutrient is "excess" if current value > upper bound of ideal range  
+- A nutrient is "optimal" if current value is within the ideal range (including bounds)
+- IGNORE any target values - use only the ideal range
+- NEVER mention "organic carbon" or "LECO" in your response - only discuss "organic matter"
+
+EXAMPLE:
+If the organic matter value is 5.95% and the ideal range is 4.0–10.0%, you MUST call it "optimal" (not deficient).
+If the value is 2.0% and the ideal range is 4.0–10.0%, you MUST call it "deficient."
+If the value is 12.0% and the ideal range is 4.0–10.0%, you MUST call it "excess."
+
+Provide a 2-3 sentence analysis focusing on:
+- **Organic matter levels** and their implications for soil health and fertility
+- Impact on **nutrient availability**, **soil structure**, and **water retention**
+- Brief mention of **management strategies** to improve organic matter if needed
+Use professional soil science terminology and bold formatting for key terms. Focus on practical implications for crop production.
+"""
+
+CEC_TEMPLATE = """
+As a professional soil scientist and agronomist, provide a BRIEF analysis of the soil's Cation Exchange Capacity (CEC) for a Soil Therapy Report.
+
+CEC DATA: {data}
+
+DEFICIENT: {deficient}
+OPTIMAL: {optimal}
+EXCESS: {excess}
+
+CRITICAL INSTRUCTIONS:
+- Focus ONLY on CEC (Cation Exchange Capacity) values
+- CEC is a soil property that indicates the soil's ability to hold and exchange cations
+- CEC interpretation depends on soil type and texture, not fixed ideal ranges
+- CEC is measured in meq/100g or cmol/kg units
+- Low CEC (< 10 meq/100g): Sandy soils, low nutrient retention, requires more frequent fertilization
+- Medium CEC (10-25 meq/100g): Loamy soils, good nutrient retention, balanced fertilization
+- High CEC (> 25 meq/100g): Clay soils, excellent nutrient retention, efficient fertilizer use
+
+Provide a 2-3 sentence analysis focusing on:
+- **CEC levels** and their implications for **soil texture** and **nutrient retention capacity**
+- Impact on **fertilizer efficiency** and **nutrient availability** to plants
+- Brief mention of **soil management** considerations based on CEC characteristics
+Use professional soil science terminology and bold formatting for key terms. Focus on practical implications for fertilizer management and soil fertility.
+"""
+
+SOIL_PH_TEMPLATE = """
+As a professional soil scientist and agronomist, provide a BRIEF analysis of the soil's pH status for a Soil Therapy Report.
+
+pH DATA: {data}
+
+DEFICIENT: {deficient}
+OPTIMAL: {optimal}
+EXCESS: {excess}
+
+Provide a 2-3 sentence analysis focusing on:
+- **pH levels** and their impact on **nutrient availability** and **plant uptake**
+- Implications for **soil biology**, **microbial activity**, and **crop performance**
+- Brief mention of **pH management strategies** if adjustment is needed
+Use professional soil science terminology and bold formatting for key terms. Focus on practical implications for crop nutrition and soil health.
+"""
+
+BASE_SATURATION_TEMPLATE = """
+As a professional soil scientist and agronomist, provide a BRIEF analysis of the soil's base saturation for a Soil Therapy Report.
+
+BASE SATURATION DATA: {data}
+
+DEFICIENT: {deficient}
+OPTIMAL: {optimal}
+EXCESS: {excess}
+
+CRITICAL INSTRUCTIONS:
+- Focus ONLY on base saturation values (Ca, Mg, K, Na percentages)
+- Use ONLY the ideal range for determining base saturation status
+- A nutrient is "deficient" if current value < lower bound of ideal range
+- A nutrient is "excess" if current value > upper bound of ideal range  
+- A nutrient is "optimal" if current value is within the ideal range (including bounds)
+- IGNORE any target values - use only the ideal range
+- Base saturation is measured as percentage of CEC occupied by base cations
+- Ideal Ca: 65-80%, Mg: 10-20%, K: 2-5%, Na: < 3%
+
+EXAMPLE:
+If the Ca saturation is 70% and the ideal range is 65-80%, you MUST call it "optimal."
+If the Ca saturation is 50% and the ideal range is 65-80%, you MUST call it "deficient."
+If the Ca saturation is 85% and the ideal range is 65-80%, you MUST call it "excess."
+
+Provide a 2-3 sentence analysis focusing on:
+- **Base saturation levels** and their implications for **soil fertility** and **nutrient balance**
+- Impact on **cation availability** and **soil chemistry** for optimal crop nutrition
+- Brief mention of **management implications** for maintaining proper cation ratios
+Use professional soil science terminology and bold formatting for key terms. Focus on practical implications for soil fertility management.
+"""
+
+AVAILABLE_NUTRIENTS_TEMPLATE = """
+As a professional soil scientist and agronomist, provide a BRIEF analysis of the soil's available nutrients for a Soil Therapy Report.
+
+AVAILABLE NUTRIENTS DATA: {data}
+
+DEFICIENT: {deficient}
+OPTIMAL: {optimal}
+EXCESS: {excess}
+
+Provide a 2-3 sentence analysis focusing on:
+- **Key nutrient deficiencies** or **excesses** and their impact on **crop nutrition**
+- Implications for **plant growth**, **yield potential**, and **nutrient uptake efficiency**
+- Brief mention of **fertilization priorities** and **nutrient management strategies**
+Use professional soil science terminology and bold formatting for key terms. Focus on practical implications for crop production and soil fertility.
+"""
+
+LAMOTTE_REAMS_TEMPLATE = """
+As a professional soil scientist and agronomist, provide a BRIEF analysis of the soil's LaMotte/Reams test results for a Soil Therapy Report.
+
+LAMOTTE/REAMS DATA: {data}
+
+DEFICIENT: {deficient}
+OPTIMAL: {optimal}
+EXCESS: {excess}
+
+CRITICAL INSTRUCTIONS:
+- Use ONLY the ideal range for determining nutrient status.
+- A nutrient is "deficient" if current value < lower bound of ideal range.
+- A nutrient is "excess" if current value > upper bound of ideal range.
+- A nutrient is "optimal" if current value is within the ideal range (including bounds).
+- IGNORE any target values - use only the ideal range.
+- You MUST use the DEFICIENT, OPTIMAL, and EXCESS lists above to describe the nutrient status in your summary.
+
+In your summary, clearly state which nutrients are deficient, optimal, or in excess, using the DEFICIENT, OPTIMAL, and EXCESS lists above. Integrate this information naturally into your 2-3 sentence analysis, as you would for other sections. Do not use a separate status line or bullet points.
+
+Focus on:
+- **Key nutrient deficiencies** or **excesses** and their impact on **crop nutrition**
+- Implications for **plant growth**, **yield potential**, and **nutrient uptake efficiency**
+- Brief mention of **fertilization priorities** and **nutrient management strategies**
+Use professional soil science terminology and bold formatting for key terms. Focus on practical implications for crop production and soil fertility.
+"""
+
+TAE_TEMPLATE = """
+As a professional soil scientist and agronomist, provide a BRIEF analysis of the soil's Total Available Elements (TAE) for a Soil Therapy Report.
+
+TAE DATA: {data}
+
+DEFICIENT: {deficient}
+OPTIMAL: {optimal}
+EXCESS: {excess}
+
+Provide a 2-3 sentence analysis focusing on:
+- **TAE levels** and their implications for **soil fertility** and **nutrient reserves**
+- Impact on **nutrient availability** and **plant nutrition** based on total element analysis
+- Brief mention of **management implications** for optimizing soil fertility and crop nutrition
+Use professional soil science terminology and bold formatting for key terms. Focus on practical implications for soil fertility management.
+"""
+
+DEFAULT_SOIL_TEMPLATE = """
+As a professional soil scientist and agronomist, provide a BRIEF analysis for a Soil Therapy Report.
+
+SECTION: {section}
+DEFICIENT: {deficient}
+OPTIMAL: {optimal}
+EXCESS: {excess}
+
+Provide a 2-3 sentence analysis focusing on soil health and fertility implications.
+Use professional soil science terminology and bold formatting for key terms.
+"""
+
+
+def _join(names):
+    return ', '.join(names) if names else 'None'
+
+
+def _plain_line(n):
+    return f"{n.get('name', 'Unknown')}: {n.get('current', 'N/A')} {n.get('unit', '')}"
+
+
+def _range_line(n):
+    if n.get('ideal_range'):
+        return f"{n.get('name', 'Unknown')}: {n.get('current', 'N/A')} {n.get('unit', '')} (Ideal Range: {n.get('ideal_range', [None, None])[0]}–{n.get('ideal_range', [None, None])[1]} {n.get('unit', '')})"
+    return _plain_line(n)
+
+
+def _target_line(n):
+    return f"{n.get('name', 'Unknown')}: {n.get('current', 'N/A')} {n.get('unit', '')} (Target: {n.get('ideal', 'N/A')})"
+
+
+def _is_organic_matter(name):
+    return 'organic matter' in name
+
+
+def _is_cec(name):
+    return 'cec' in name or 'cation exchange' in name
+
+
+def _is_base_saturation(name):
+    return ('base saturation' in name or 'ca' in name or 'mg' in name
+            or 'k' in name or 'na' in name)
+
+
+# Section -> (template, row formatter, row filter on the lowercased name).
+# A filter of None keeps every nutrient.
+SOIL_SECTIONS = {
+    'organicMatter': (ORGANIC_MATTER_TEMPLATE, _range_line, _is_organic_matter),
+    'cec': (CEC_TEMPLATE, _plain_line, _is_cec),
+    'soilPh': (SOIL_PH_TEMPLATE, _target_line, None),
+    'baseSaturation': (BASE_SATURATION_TEMPLATE, _range_line, _is_base_saturation),
+    'availableNutrients': (AVAILABLE_NUTRIENTS_TEMPLATE, _target_line, None),
+    'lamotteReams': (LAMOTTE_REAMS_TEMPLATE, _range_line, None),
+    'tae': (TAE_TEMPLATE, _target_line, None),
+}
+
+
+def template_id(section):
+    """Versioned id of the template used for ``section``."""
+    if section == 'plantSummary':
+        return f'plant/summary/v{TEMPLATE_VERSION}'
+    if section in SOIL_SECTIONS:
+        return f'soil/{section}/v{TEMPLATE_VERSION}'
+    return f'soil/default/v{TEMPLATE_VERSION}'
+
+
+def section_nutrients(section, nutrients):
+    """The nutrient rows that appear in ``section``'s prompt."""
+    if section not in SOIL_SECTIONS:
+        return []
+    keep = SOIL_SECTIONS[section][2]
+    if keep is None:
+        return list(nutrients)
+    return [n for n in nutrients if keep(n.get('name', '').lower())]
+
+
+def soil_prompt(section, deficient, optimal, excess, nutrients):
+    """Prompt for one soil report section.
+
+    ``nutrients`` must already be filtered with ``section_nutrients``.
+    """
+    if section not in SOIL_SECTIONS:
+        return DEFAULT_SOIL_TEMPLATE.format(
+            section=section, deficient=_join(deficient),
+            optimal=_join(optimal), excess=_join(excess))
+    template, line, _ = SOIL_SECTIONS[section]
+    return template.format(
+        data=', '.join([line(n) for n in nutrients]),
+        deficient=_join(deficient), optimal=_join(optimal),
+        excess=_join(excess))
+
+
+def plant_summary_prompt(deficient, optimal, excess):
+    """Prompt for the Plant Therapy executive summary."""
+    return PLANT_SUMMARY_TEMPLATE.format(
+        deficient=_join(deficient), optimal=_join(optimal),
+        excess=_join(excess))
@@ -0,0 +1,139 @@
+"""Sampled per-request traces of extraction stage events.
+
+A trace collects the stage events of one request (pages routed, tables
+found, rows parsed, OCR text...) in a bounded deque. Events keep their
+message template and arguments as given; nothing is formatted until the
+trace is read through the ``/debug/traces`` endpoints. Finished traces
+are kept in a ring buffer of the most recent ones.
+
+Tracing is off unless ``TRACE_SAMPLE_RATE`` is above 0 (1 traces every
+request). An unsampled request pays one context variable lookup per
+``event`` call.
+"""
+import contextvars
+import itertools
+import random
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+# Formatted event messages are cut to this many characters, so a trace of
+# a long OCR page stays readable
+MAX_MESSAGE_CHARS = 2000
+
+_current = contextvars.ContextVar('trace', default=None)
+
+
+class Trace:
+    """Bounded list of (seconds since start, stage, message, args) events."""
+
+    def __init__(self, trace_id, name, max_events):
+        self.id = trace_id
+        self.name = name
+        self.started = time.time()
+        self.duration = None
+        self.dropped = 0
+        self._start = time.perf_counter()
+        self._events = deque(maxlen=max_events)
+
+    def event(self, stage, message, *args):
+        if len(self._events) == self._events.maxlen:
+            self.dropped += 1
+        self._events.append(
+            (time.perf_counter() - self._start, stage, message, args))
+
+    def finish(self):
+        self.duration = time.perf_counter() - self._start
+
+    def summary(self):
+        return {'id': self.id, 'name': self.name, 'started': self.started,
+                'duration': self.duration, 'events': len(self._events),
+                'dropped': self.dropped}
+
+    def to_dict(self):
+        """The summary plus every kept event, formatted now."""
+        events = []
+        for offset, stage, message, args in list(self._events):
+            try:
+                text = message % args if args else message
+            except Exception as e:
+                text = f'{message} {args!r} (format error: {e})'
+            events.append({'t': round(offset, 6), 'stage': stage,
+                           'message': text[:MAX_MESSAGE_CHARS]})
+        return dict(self.summary(), events=events)
+
+
+class TraceBuffer:
+    """The last ``capacity`` traces, newest first; samples which to keep."""
+
+    def __init__(self, capacity=64, max_events=256, sample_rate=0.0):
+        self.sample_rate = sample_rate
+        self.max_events = max_events
+        self._traces = deque(maxlen=capacity)
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return self.sample_rate > 0
+
+    def start(self, name):
+        """A new trace, or None if this request is not sampled."""
+        if not self.enabled or random.random() >= self.sample_rate:
+            return None
+        with self._lock:
+            trace = Trace(f'{next(self._ids):x}', name, self.max_events)
+            self._traces.appendleft(trace)
+        return trace
+
+    def get(self, trace_id):
+        with self._lock:
+            for trace in self._traces:
+                if trace.id == trace_id:
+                    return trace
+        return None
+
+    def recent(self):
+        with self._lock:
+            return list(self._traces)
+
+
+def current_trace():
+    return _current.get()
+
+
+def event(stage, message, *args):
+    """Record an event on the current trace, if any; ``message % args``
+    is only formatted when the trace is read."""
+    trace = _current.get()
+    if trace is not None:
+        trace.event(stage, message, *args)
+
+
+def set_current(trace):
+    """Make ``trace`` current from here on, for request hooks that cannot
+    wrap the whole request in ``activate``."""
+    _current.set(trace)
+
+
+@contextmanager
+def activate(trace):
+    """Make ``trace`` (possibly None) current for the ``with`` block."""
+    token = _current.set(trace)
+    try:
+        yield trace
+    finally:
+        _current.reset(token)
+
+
+@contextmanager
+def traced(buffer, name):
+    """Start a (sampled) trace, make it current and finish it on exit."""
+    trace = buffer.start(name)
+    with activate(trace):
+        try:
+            yield trace
+        finally:
+            if trace is not None:
+                trace.finish()
@@ -0,0 +1,197 @@
+"""Benchmark the PDF extraction stages over a synthetic report corpus.
+
+Each (stage, variant, pages) measurement runs in a fresh process so its
+peak RSS is not inflated by earlier runs. The best of ``--repeat`` timings
+is reported. Results are written as JSON and can be compared against a
+stored baseline run, in which case the exit status is 1 if any stage got
+slower or bigger than the tolerance allows.
+
+    python benchmarks/bench_extraction.py --pages 1 10 50 200 \\
+        --output results.json --baseline benchmarks/baseline.json
+
+Stages:
+
+- extract_tables_with_pdfplumber / extract_soil_report (backend/app.py) on
+  the text and multi-paddock soil reports
+- extract_text_with_ocr / extract_soil_report on the scanned soil report
+  (skipped when poppler or tesseract is not installed)
+- extract_reports (plant_nutritional_deviation_score_2.py) on leaf reports
+"""
+import argparse
+import io
+import json
+import logging
+import multiprocessing
+import os
+import platform
+import resource
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+sys.path[:0] = [HERE, ROOT, os.path.join(ROOT, 'backend')]
+
+import synthetic_reports  # noqa: E402
+
+STAGES = {
+    'text': ('extract_tables_with_pdfplumber', 'extract_soil_report'),
+    'multi_paddock': ('extract_tables_with_pdfplumber', 'extract_soil_report'),
+    'scanned': ('extract_text_with_ocr', 'extract_soil_report'),
+    'leaf': ('extract_reports',),
+}
+
+
+def _peak_rss_kb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and kilobytes elsewhere
+    return peak // 1024 if sys.platform == 'darwin' else peak
+
+
+def _stage_callable(stage):
+    if stage == 'extract_reports':
+        import plant_nutritional_deviation_score_2 as scoring
+        return lambda path, data: len(scoring.extract_reports(path))
+    import app
+    # Warnings about headerless tables would drown out the results table
+    app.app.logger.setLevel(logging.ERROR)
+    if stage == 'extract_tables_with_pdfplumber':
+        return lambda path, data: len(app.extract_tables_with_pdfplumber(io.BytesIO(data)))
+    if stage == 'extract_text_with_ocr':
+        return lambda path, data: len(app.extract_text_with_ocr(io.BytesIO(data)))
+    client = app.app.test_client()
+
+    def post(path, data):
+        response = client.post('/extract-soil-report', data={
+            'file': (io.BytesIO(data), os.path.basename(path))})
+        return (response.get_json() or {}).get('count', 0)
+    return post
+
+
+def _measure(stage, path, repeat, queue):
+    try:
+        run = _stage_callable(stage)
+        with open(path, 'rb') as f:
+            data = f.read()
+        import_rss = _peak_rss_kb()
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            items = run(path, data)
+            timings.append(time.perf_counter() - start)
+        queue.put({'seconds': min(timings), 'items': items,
+                   'import_rss_kb': import_rss, 'peak_rss_kb': _peak_rss_kb()})
+    except Exception as e:
+        queue.put({'error': f'{type(e).__name__}: {e}'})
+
+
+def measure(stage, path, repeat):
+    context = multiprocessing.get_context('spawn')
+    queue = context.Queue()
+    process = context.Process(target=_measure, args=(stage, path, repeat, queue))
+    process.start()
+    result = queue.get()
+    process.join()
+    return result
+
+
+def ocr_available():
+    return bool(shutil.which('pdftoppm') and shutil.which('tesseract'))
+
+
+def run(variants, page_counts, repeat, corpus_dir):
+    results = []
+    for variant in variants:
+        for pages in page_counts:
+            path = synthetic_reports.build(variant, pages, corpus_dir)
+            for stage in STAGES[variant]:
+                record = {'stage': stage, 'variant': variant, 'pages': pages}
+                if variant == 'scanned' and not ocr_available():
+                    record['skipped'] = 'poppler/tesseract not installed'
+                else:
+                    record.update(measure(stage, path, repeat))
+                results.append(record)
+                print(_format(record), flush=True)
+    return results
+
+
+def _format(record, baseline=None):
+    label = f"{record['stage']:<32} {record['variant']:<14} {record['pages']:>4}p"
+    if 'skipped' in record or 'error' in record:
+        return f"{label}  {record.get('skipped') or record.get('error')}"
+    line = (f"{label} {record['seconds']:>9.3f}s {record['peak_rss_kb'] / 1024:>8.1f} MiB"
+            f"  items={record['items']}")
+    if baseline:
+        line += (f"  ({record['seconds'] / baseline['seconds']:.2f}x time,"
+                 f" {record['peak_rss_kb'] / baseline['peak_rss_kb']:.2f}x rss)")
+    return line
+
+
+def compare(results, baseline_results, tolerance):
+    """Return the records that regressed against the baseline."""
+    baseline = {(r['stage'], r['variant'], r['pages']): r
+                for r in baseline_results if 'seconds' in r}
+    regressions = []
+    print('\nAgainst baseline:')
+    for record in results:
+        base = baseline.get((record['stage'], record['variant'], record['pages']))
+        if base is None or 'seconds' not in record:
+            continue
+        print(_format(record, base))
+        if (record['seconds'] > base['seconds'] * (1 + tolerance)
+                or record['peak_rss_kb'] > base['peak_rss_kb'] * (1 + tolerance)):
+            regressions.append(record)
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--variants', nargs='+', default=list(STAGES),
+                        choices=list(STAGES))
+    parser.add_argument('--pages', nargs='+', type=int, default=[1, 10, 50])
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--corpus-dir',
+                        default=os.path.join(tempfile.gettempdir(),
+                                             'plant-therapy-bench-corpus'))
+    parser.add_argument('--output', default='benchmark-results.json')
+    parser.add_argument('--baseline', help='results JSON to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help='allowed slowdown/growth as a fraction')
+    args = parser.parse_args(argv)
+
+    # Keep the extraction and OCR caches out of the measurements
+    os.environ['EXTRACTION_CACHE_PATH'] = ''
+    os.environ['OCR_CACHE_PATH'] = ''
+    os.environ['EXTRACTION_CACHE_MEMORY_ENTRIES'] = '0'
+    os.environ.setdefault('OPENAI_API_KEY', 'benchmark')
+
+    results = run(args.variants, args.pages, args.repeat, args.corpus_dir)
+    with open(args.output, 'w') as f:
+        json.dump({
+            'meta': {
+                'timestamp': datetime.now(timezone.utc).isoformat(),
+                'python': platform.python_version(),
+                'platform': platform.platform(),
+                'cpu_count': os.cpu_count(),
+                'repeat': args.repeat,
+            },
+            'results': results,
+        }, f, indent=2)
+    print(f'\nWrote {args.output}')
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f)['results'], args.tolerance)
+        if regressions:
+            print(f'\n{len(regressions)} regression(s) beyond {args.tolerance:.0%}:')
+            for record in regressions:
+                print('  ' + _format(record))
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
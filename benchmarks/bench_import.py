@@ -0,0 +1,78 @@
+"""Benchmark the cold start of the backend: importing app in a fresh process.
+
+Each variant runs ``--repeat`` times in a new interpreter and the best
+wall time, module count and peak RSS are reported:
+
+- lazy: ``import app``, what a worker pays before its first request
+- warm: ``import app`` plus ``warmup()``, i.e. the libraries imported up
+  front as every start used to (and as ``APP_WARMUP=1`` still does)
+- first_pdf: lazy import plus the deferred pdfplumber import on the first
+  extraction request
+
+    python benchmarks/bench_import.py --repeat 5 --output import-results.json
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+BACKEND = os.path.join(os.path.dirname(HERE), 'backend')
+
+VARIANTS = {
+    'lazy': 'import app',
+    'warm': 'import app; app.warmup()',
+    'first_pdf': 'import app; import pdfplumber',
+}
+
+PROBE = '''
+import resource, sys, time
+start = time.perf_counter()
+{statement}
+seconds = time.perf_counter() - start
+peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print(seconds, len(sys.modules), peak // 1024 if sys.platform == 'darwin' else peak)
+'''
+
+
+def measure(statement, repeat):
+    env = dict(os.environ, OPENAI_API_KEY=os.environ.get('OPENAI_API_KEY', 'benchmark'),
+               EXTRACTION_CACHE_PATH='', APP_WARMUP='0')
+    runs = []
+    for _ in range(repeat):
+        output = subprocess.run(
+            [sys.executable, '-c', PROBE.format(statement=statement)],
+            cwd=BACKEND, env=env, capture_output=True, text=True, check=True)
+        seconds, modules, peak_rss_kb = output.stdout.split()[-3:]
+        runs.append((float(seconds), int(modules), int(peak_rss_kb)))
+    seconds, modules, peak_rss_kb = min(runs)
+    return {'seconds': seconds, 'modules': modules, 'peak_rss_kb': peak_rss_kb}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--variants', nargs='+', default=list(VARIANTS),
+                        choices=list(VARIANTS))
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--output', help='write the results as JSON here')
+    args = parser.parse_args(argv)
+
+    results = {}
+    for variant in args.variants:
+        record = results[variant] = measure(VARIANTS[variant], args.repeat)
+        print(f"{variant:<10} {record['seconds']:>7.3f}s {record['modules']:>6} modules"
+              f" {record['peak_rss_kb'] / 1024:>8.1f} MiB", flush=True)
+    if 'lazy' in results and 'warm' in results:
+        print(f"\nlazy import is {results['warm']['seconds'] / results['lazy']['seconds']:.1f}x"
+              f" faster than importing everything up front")
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'python': sys.version.split()[0], 'repeat': args.repeat,
+                       'results': results}, f, indent=2)
+        print(f'\nWrote {args.output}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
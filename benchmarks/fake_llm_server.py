@@ -0,0 +1,176 @@
+"""Local OpenAI-compatible chat completions server for load tests.
+
+Answers ``POST .../chat/completions`` with a canned summary after a set
+latency, and can misbehave like the real provider: reject requests past
+a requests-per-minute limit with 429 and Retry-After, and fail a fraction
+of requests with 500. Point the backend at it with ``LLM_BASE_URL``:
+
+    python benchmarks/fake_llm_server.py --port 8089 --rpm 60 --error-rate 0.1
+    LLM_BASE_URL=http://127.0.0.1:8089/v1 OPENAI_API_KEY=fake python backend/app.py
+
+``GET /stats`` returns the number of requests served, rate limited and
+failed. Tests can also script the exact answers to the next requests
+(``FakeCompletions(script=[429, 500, 200])``) and set the error code of a
+429, e.g. ``insufficient_quota`` for an exhausted quota.
+"""
+import argparse
+import json
+import random
+import sys
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class FakeCompletions:
+    def __init__(self, latency=0.2, rpm=0, error_rate=0.0, seed=None,
+                 script=(), rate_limit_code='rate_limit_exceeded'):
+        self.latency = latency
+        self.rpm = rpm
+        self.error_rate = error_rate
+        # Statuses, or (status, headers), answered before anything else
+        self.script = deque(script)
+        self.rate_limit_code = rate_limit_code
+        self.random = random.Random(seed)
+        self.stats = {'ok': 0, 'rate_limited': 0, 'failed': 0}
+        self._recent = deque()
+        self._lock = threading.Lock()
+
+    def admit(self):
+        """(status, headers) for a new request under the rate limit."""
+        with self._lock:
+            if self.script:
+                answer = self.script.popleft()
+                status, headers = answer if isinstance(answer, tuple) else (answer, {})
+                outcome = {200: 'ok', 429: 'rate_limited'}.get(status, 'failed')
+                self.stats[outcome] += 1
+                return status, headers
+            now = time.monotonic()
+            while self._recent and now - self._recent[0] >= 60:
+                self._recent.popleft()
+            if self.rpm and len(self._recent) >= self.rpm:
+                self.stats['rate_limited'] += 1
+                retry_after = 60 - (now - self._recent[0])
+                return 429, {'retry-after': f'{retry_after:.3f}'}
+            self._recent.append(now)
+            if self.random.random() < self.error_rate:
+                self.stats['failed'] += 1
+                return 500, {}
+            self.stats['ok'] += 1
+            return 200, {}
+
+    def completion(self, body):
+        prompt = ' '.join(m.get('content', '') for m in body.get('messages', []))
+        prompt_tokens = max(1, len(prompt) // 4)
+        text = f'Fake summary of a {prompt_tokens}-token prompt.'
+        completion_tokens = len(text) // 4
+        return {
+            'id': f'chatcmpl-fake-{time.monotonic_ns()}',
+            'object': 'chat.completion',
+            'created': int(time.time()),
+            'model': body.get('model', 'fake'),
+            'choices': [{'index': 0, 'finish_reason': 'stop',
+                         'message': {'role': 'assistant', 'content': text}}],
+            'usage': {'prompt_tokens': prompt_tokens,
+                      'completion_tokens': completion_tokens,
+                      'total_tokens': prompt_tokens + completion_tokens},
+        }
+
+
+class FakeServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # Clients that time out hang up on slow answers; that is expected
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+
+def make_handler(fake):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def _send(self, status, payload, headers=()):
+            data = json.dumps(payload).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(data)))
+            for name, value in dict(headers).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            if self.path.rstrip('/') == '/stats':
+                self._send(200, fake.stats)
+            else:
+                self._send(404, {'error': {'message': 'Not found'}})
+
+        def do_POST(self):
+            length = int(self.headers.get('Content-Length') or 0)
+            body = json.loads(self.rfile.read(length) or b'{}')
+            if not self.path.rstrip('/').endswith('/chat/completions'):
+                self._send(404, {'error': {'message': 'Not found'}})
+                return
+            status, headers = fake.admit()
+            if status == 429:
+                self._send(429, {'error': {'message': 'Rate limit reached',
+                                           'type': 'requests',
+                                           'code': fake.rate_limit_code}}, headers)
+                return
+            time.sleep(fake.latency)
+            if status == 500:
+                self._send(500, {'error': {'message': 'Fake server error',
+                                           'type': 'server_error'}})
+                return
+            self._send(200, fake.completion(body))
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+@contextmanager
+def serve(fake, host='127.0.0.1', port=0):
+    """Serve ``fake`` on a background thread; yields the /v1 base URL."""
+    server = FakeServer((host, port), make_handler(fake))
+    thread = threading.Thread(target=server.serve_forever, args=(0.05,),
+                              daemon=True)
+    thread.start()
+    try:
+        yield f'http://{host}:{server.server_address[1]}/v1'
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8089)
+    parser.add_argument('--latency', type=float, default=0.2,
+                        help='seconds per completion')
+    parser.add_argument('--rpm', type=int, default=0,
+                        help='requests per minute before 429s (0: no limit)')
+    parser.add_argument('--error-rate', type=float, default=0.0,
+                        help='fraction of requests that fail with 500')
+    parser.add_argument('--seed', type=int)
+    args = parser.parse_args(argv)
+
+    fake = FakeCompletions(args.latency, args.rpm, args.error_rate, args.seed)
+    server = FakeServer((args.host, args.port), make_handler(fake))
+    print(f'Serving fake completions on http://{args.host}:{args.port}/v1')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+
+if __name__ == '__main__':
+    main()
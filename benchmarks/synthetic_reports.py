@@ -0,0 +1,155 @@
+"""Synthetic lab reports for the extraction benchmarks.
+
+Soil reports are drawn with ruled tables so pdfplumber finds them the same
+way it finds them in real lab PDFs:
+
+- ``text``: one paddock's tables on the first page, glossary text after it
+- ``multi_paddock``: a full set of tables for a new paddock on every page
+- ``scanned``: the multi-paddock report rasterized to image-only pages
+
+Leaf reports (``leaf``) follow the text layout that
+plant_nutritional_deviation_score_2.extract_reports expects: a PADDOCK:
+block with the 15 nutrients and a Plant TherapyTM range block per page.
+
+All content is generated from a seeded RNG, so a given (variant, pages,
+seed) always produces the same document.
+"""
+import os
+import random
+
+import fitz  # PyMuPDF
+
+SOIL_ELEMENTS = [
+    ('Calcium (Mehlich III)', 'ppm', (1000, 1500)),
+    ('Magnesium (Mehlich III)', 'ppm', (120, 180)),
+    ('Potassium (Mehlich III)', 'ppm', (150, 250)),
+    ('Sodium (Mehlich III)', 'ppm', (20, 60)),
+    ('Phosphorus (Mehlich III)', 'ppm', (40, 80)),
+    ('Sulfur (KCl)', 'ppm', (20, 40)),
+    ('Boron (Hot CaCl2)', 'ppm', (1, 2)),
+    ('Iron (DTPA)', 'ppm', (40, 200)),
+    ('Manganese (DTPA)', 'ppm', (30, 100)),
+    ('Copper (DTPA)', 'ppm', (2, 7)),
+    ('Zinc (DTPA)', 'ppm', (5, 10)),
+]
+
+TAE_ELEMENTS = [
+    ('Calcium', 'ppm', (2000, 4000)),
+    ('Magnesium', 'ppm', (400, 800)),
+    ('Potassium', 'ppm', (800, 1600)),
+    ('Zinc', 'ppm', (20, 60)),
+]
+
+BASE_SATURATION = [
+    ('Calcium', (65, 80)),
+    ('Magnesium', (10, 20)),
+    ('Potassium', (2, 5)),
+    ('Sodium', (0.5, 3)),
+    ('Other Bases', (2, 5)),
+]
+
+LEAF_NUTRIENTS = [
+    'N - Nitrogen', 'P - Phosphorus', 'K - Potassium', 'S - Sulphur',
+    'Ca - Calcium', 'Mg - Magnesium', 'Na - Sodium', 'Cu - Copper',
+    'Zn - Zinc', 'Mn - Manganese', 'Fe - Iron', 'B - Boron',
+    'Mo - Molybdenum', 'Si - Silicon', 'Co - Cobalt',
+]
+
+GLOSSARY = (
+    'Cation exchange capacity describes the ability of a soil to hold '
+    'positively charged nutrients. Base saturation is the share of that '
+    'capacity occupied by calcium, magnesium, potassium and sodium. '
+)
+
+SOIL_VARIANTS = ('text', 'multi_paddock', 'scanned')
+VARIANTS = SOIL_VARIANTS + ('leaf',)
+
+
+def _draw_table(page, top, rows, widths, left=40, row_height=16):
+    for r, row in enumerate(rows):
+        x = left
+        for cell, width in zip(row, widths):
+            rect = fitz.Rect(x, top + r * row_height, x + width,
+                             top + (r + 1) * row_height)
+            page.draw_rect(rect, color=(0, 0, 0), width=0.5)
+            page.insert_text((x + 3, top + r * row_height + 11), cell,
+                             fontsize=8)
+            x += width
+    return top + len(rows) * row_height + 14
+
+
+def _level(rng, low, high):
+    return rng.uniform(low * 0.5, high * 1.5)
+
+
+def _draw_paddock(page, rng, paddock):
+    top = _draw_table(page, 40, [['Wheat'], [f'Paddock {paddock}'],
+                                 ['12/03/2024']], [200])
+    rows = [['ELEMENT', 'YOUR LEVEL', 'ACCEPTABLE RANGE']]
+    for name, unit, (low, high) in SOIL_ELEMENTS:
+        rows.append([name, f'{_level(rng, low, high):.1f} {unit}',
+                     f'{low} - {high}'])
+    top = _draw_table(page, top, rows, [170, 100, 120])
+    rows = [['CATEGORY', 'T.A.E. LEVEL', 'RANGE']]
+    for name, unit, (low, high) in TAE_ELEMENTS:
+        rows.append([name, f'{_level(rng, low, high):.0f} {unit}',
+                     f'{low} - {high}'])
+    top = _draw_table(page, top, rows, [170, 100, 120])
+    rows = [[name, f'{_level(rng, low, high):.1f} %', f'{low} - {high}']
+            for name, (low, high) in BASE_SATURATION]
+    return _draw_table(page, top, rows, [170, 100, 120])
+
+
+def soil_report(variant, pages, seed=0):
+    """Build a soil report ``fitz.Document`` of the given variant."""
+    rng = random.Random(seed)
+    doc = fitz.open()
+    for page_num in range(pages):
+        page = doc.new_page()
+        if variant == 'text' and page_num > 0:
+            page.insert_textbox(page.rect + (40, 40, -40, -40),
+                                GLOSSARY * 12, fontsize=9)
+        else:
+            _draw_paddock(page, rng, page_num + 1)
+    if variant != 'scanned':
+        return doc
+    scanned = fitz.open()
+    for page in doc:
+        pixmap = page.get_pixmap(dpi=150, colorspace=fitz.csGRAY)
+        image_page = scanned.new_page(width=page.rect.width,
+                                      height=page.rect.height)
+        image_page.insert_image(image_page.rect, pixmap=pixmap)
+    doc.close()
+    return scanned
+
+
+def leaf_report(pages, seed=0):
+    """Build a leaf test ``fitz.Document`` with one paddock per page."""
+    rng = random.Random(seed)
+    doc = fitz.open()
+    for page_num in range(pages):
+        page = doc.new_page(height=1400)
+        lines = ['Leaf Test Report', 'PADDOCK:', f'Block {page_num + 1}']
+        for nutrient in LEAF_NUTRIENTS:
+            lines += [nutrient, '%', f'{rng.uniform(0.01, 60):.2f}']
+        lines.append('Plant TherapyTM')
+        for _ in LEAF_NUTRIENTS:
+            low = rng.uniform(0.1, 30)
+            lines.append(f'{low:.2f} - {low * rng.uniform(1.2, 2):.2f}')
+        page.insert_text((40, 30), '\n'.join(lines), fontsize=8)
+    return doc
+
+
+def build(variant, pages, directory, seed=0):
+    """Write the report to ``directory`` (reusing an existing file)."""
+    path = os.path.join(directory, f'{variant}-{pages}p-s{seed}.pdf')
+    if os.path.exists(path):
+        return path
+    os.makedirs(directory, exist_ok=True)
+    if variant == 'leaf':
+        doc = leaf_report(pages, seed)
+    else:
+        doc = soil_report(variant, pages, seed)
+    doc.save(path, garbage=3, deflate=True)
+    doc.close()
+    return path
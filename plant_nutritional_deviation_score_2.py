@@ -5,7 +5,11 @@ Updated on May 15, 2025
 Reads all PDF leaf test reports in a folder, extracts nutrient data,
 calculates deviation and score (with stronger penalty for large deviations,
 and zero score for deviations >= 250%),
-and prints summary tables.
+and prints summary tables. With --output, the readings and paddock scores
+are also written as Parquet (needs pyarrow), partitioned by season and
+source file. With --incremental, only PDFs that are new or changed since
+the last run are parsed (see ScoreManifest), and --watch keeps polling the
+folder for new files.
 
 @author: Franz Hentze
 """
@@ -13,9 +17,24 @@ and prints summary tables.
 import fitz  # PyMuPDF
 import re
 import os
+import sys
+import argparse
+import hashlib
+import sqlite3
+import time
+import urllib.parse
 import pandas as pd
 import numpy as np
 from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+# Nutrient name canonicalization is shared with the soil report backend
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "backend"))
+from nutrient_names import canonical_name  # noqa: E402
+
+# Bump whenever extraction or scoring changes its results, so an
+# incremental run re-scores every file
+PARSER_VERSION = "3"
 
 def smooth_score(deviation, D=50, n=2, cutoff=250):
     """
@@ -29,118 +48,397 @@ def smooth_score(deviation, D=50, n=2, cutoff=250):
     score = 100 / (1 + (x / D)**n)
     return max(min(score, 100), 0)
 
-def extract_reports(pdf_path):
-    doc = fitz.open(pdf_path)
-    text = "\n".join(page.get_text() for page in doc)
-    raw_sections = text.split("PADDOCK:")
-
-    expected_nutrients = [
-        "N - Nitrogen", "P - Phosphorus", "K - Potassium", "S - Sulphur",
-        "Ca - Calcium", "Mg - Magnesium", "Na - Sodium", "Cu - Copper",
-        "Zn - Zinc", "Mn - Manganese", "Fe - Iron", "B - Boron",
-        "Mo - Molybdenum", "Si - Silicon", "Co - Cobalt"
-    ]
-
-    reports = []
-
-    for section in raw_sections[1:]:
-        lines = section.splitlines()
-
-        paddock = next((line.strip() for line in lines if line.strip()), "Unknown")
-        paddock = paddock.replace("\u201c", "\"").replace("\u201d", "\"").replace("\u2013", "-")
-
-        actual_values = []
-        i = 0
-        while i < len(lines):
-            line = lines[i].strip()
-            if any(n in line for n in expected_nutrients):
-                nutrient = line
-                j = i + 1
-                while j < len(lines):
-                    val_line = lines[j].strip()
-                    try:
-                        value = float(val_line)
-                        actual_values.append((nutrient, value))
-                        break
-                    except ValueError:
-                        j += 1
-                i = j
-            else:
-                i += 1
-
-        actual_values = actual_values[:15]
+# Nutrients scored against the top of their range instead of the midpoint
+USE_MAX_AS_IDEAL = ["P - Phosphorus", "Ca - Calcium", "Mg - Magnesium", "B - Boron"]
 
-        if "Plant TherapyTM" not in section:
-            print(f"⚠️ Skipping paddock '{paddock}' – no ideal range block.")
-            continue
+STATUS_LABELS = ["Extremely Deficient", "Deficient", "Good", "Excessive"]
 
-        range_block = section.split("Plant TherapyTM")[1]
-        range_lines = range_block.splitlines()
-        range_values = []
-        for line in range_lines:
-            line = line.strip()
-            if "N/A" in line:
-                continue
-            match = re.match(r"(\d+\.?\d*)\s*-\s*(\d+\.?\d*)", line)
-            if match:
-                range_values.append((float(match.group(1)), float(match.group(2))))
+def smooth_scores(deviation, D=50, n=2, cutoff=250):
+    """
+    Vectorized smooth_score: same curve and cutoff, applied to an array
+    of deviations (fractions).
+    """
+    x = np.abs(deviation) * 100
+    # float_power goes through libm pow like the scalar `**`; plain `**`
+    # squares with a multiply and can differ in the last bit
+    with np.errstate(over="ignore", invalid="ignore"):
+        score = 100 / (1 + np.float_power(x / D, n))
+    return np.where(x >= cutoff, 0.0, np.clip(score, 0, 100))
+
+STATUSES = STATUS_LABELS + ["Extremely Excessive"]
+
+def status_codes(deviation_pct):
+    """Index into STATUSES of the status of each deviation (%) in an array."""
+    return np.select(
+        [deviation_pct <= -100, deviation_pct <= -25, deviation_pct < 25, deviation_pct <= 100],
+        np.arange(len(STATUS_LABELS), dtype=np.int8),
+        default=np.int8(len(STATUS_LABELS)))
+
+def classify_status(deviation_pct):
+    """Status label for each deviation (%) in an array."""
+    return np.array(STATUSES)[status_codes(deviation_pct)]
+
+def score_nutrients(actual, min_val, max_val, use_max):
+    """
+    Score any number of nutrient readings in one NumPy pass.
 
-        if len(range_values) == 0:
-            print(f"⚠️ Skipping paddock '{paddock}' – no usable ranges found.")
-            continue
+    actual, min_val and max_val are equal-length arrays; use_max is a
+    boolean mask selecting the nutrients whose ideal is the top of the
+    range rather than the midpoint. Returns a dict of arrays with the
+    ideal, deviation (%), score and status of every reading, matching
+    smooth_score and the status thresholds element for element.
+    """
+    actual = np.asarray(actual, dtype=float)
+    min_val = np.asarray(min_val, dtype=float)
+    max_val = np.asarray(max_val, dtype=float)
+    ideal = np.where(use_max, max_val, (min_val + max_val) / 2)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        deviation = (actual - ideal) / ideal
+    deviation_pct = deviation * 100
+    return {
+        "ideal": ideal,
+        "deviation_pct": deviation_pct,
+        "score": smooth_scores(deviation),
+        "status": classify_status(deviation_pct),
+    }
+
+REPORT_COLUMNS = ["Nutrient", "Actual", "Min", "Max", "Ideal",
+                  "Deviation (%)", "Score", "Status"]
+
+def intern_codes(values):
+    """
+    Distinct values in first-seen order, and the int32 code of each value.
+    """
+    uniques = []
+    index = {}
+    codes = np.empty(len(values), dtype=np.int32)
+    for i, value in enumerate(values):
+        code = index.get(value)
+        if code is None:
+            code = index[value] = len(uniques)
+            uniques.append(value)
+        codes[i] = code
+    return uniques, codes
+
+class NutrientTable:
+    """
+    Scored nutrient readings of any number of paddocks, stored as columns.
+
+    Every reading is one row. The number columns (actual, min, max, ideal,
+    deviation_pct, score) are NumPy arrays; nutrient names and statuses are
+    integer codes into the interned nutrient_names list and STATUSES.
+    Paddock p owns rows offsets[p]:offsets[p + 1] and came from
+    source_files[p]. A reading takes about 55 bytes instead of a dict of
+    eight keys, and the columns convert to pandas or Arrow without copying
+    the numbers.
+
+    deviation_pct and score hold the values rounded to 2 places, as in the
+    report dicts, and to_reports() returns exactly what extract_reports
+    always has.
+    """
 
-        nutrients = []
-        for (label, actual), (min_val, max_val) in zip(actual_values[:len(range_values)], range_values):
-            # Adjust ideal: use max for P, Ca, Mg, B; else average
-            if any(x in label for x in ["P - Phosphorus", "Ca - Calcium", "Mg - Magnesium", "B - Boron"]):
-                ideal = max_val
-            else:
-                ideal = (min_val + max_val) / 2
-
-            deviation = (actual - ideal) / ideal
-            score = smooth_score(deviation)
-            deviation_pct = deviation * 100
-
-            # Classify status
-            if deviation_pct <= -100:
-                status = "Extremely Deficient"
-            elif -100 < deviation_pct <= -25:
-                status = "Deficient"
-            elif -25 < deviation_pct < 25:
-                status = "Good"
-            elif 25 <= deviation_pct <= 100:
-                status = "Excessive"
-            else:
-                status = "Extremely Excessive"
-
-
-            nutrients.append({
-                "Nutrient": label,
-                "Actual": actual,
-                "Min": min_val,
-                "Max": max_val,
-                "Ideal": ideal,
-                "Deviation (%)": round(deviation_pct, 2),
-                "Score": round(score, 2),
-                "Status": status
-            })
-
-        reports.append({
-            "paddock": paddock,
-            "nutrients": nutrients
+    __slots__ = ("paddocks", "source_files", "offsets", "nutrient_names",
+                 "nutrient_codes", "status_codes", "actual", "min", "max",
+                 "ideal", "deviation_pct", "score")
+
+    NUMBER_COLUMNS = {"Actual": "actual", "Min": "min", "Max": "max",
+                      "Ideal": "ideal", "Deviation (%)": "deviation_pct",
+                      "Score": "score"}
+
+    def __init__(self, paddocks, source_files, offsets, nutrient_names,
+                 nutrient_codes, status_codes, actual, min, max, ideal,
+                 deviation_pct, score):
+        self.paddocks = paddocks
+        self.source_files = source_files
+        self.offsets = offsets
+        self.nutrient_names = nutrient_names
+        self.nutrient_codes = nutrient_codes
+        self.status_codes = status_codes
+        self.actual = actual
+        self.min = min
+        self.max = max
+        self.ideal = ideal
+        self.deviation_pct = deviation_pct
+        self.score = score
+
+    @classmethod
+    def from_parsed(cls, parsed, source_file=None):
+        """
+        Build a table from [(paddock, [(label, actual, min, max), ...]), ...],
+        scoring every reading of every paddock in one vectorized pass.
+        """
+        readings = [reading for _, paddock_readings in parsed for reading in paddock_readings]
+        nutrient_names, nutrient_codes = intern_codes([label for label, _, _, _ in readings])
+        use_max = np.array([any(x in label for x in USE_MAX_AS_IDEAL)
+                            for label in nutrient_names], dtype=bool)
+        scored = score_nutrients(
+            [actual for _, actual, _, _ in readings],
+            [min_val for _, _, min_val, _ in readings],
+            [max_val for _, _, _, max_val in readings],
+            use_max[nutrient_codes])
+        # Python's round on floats, as the report dicts have always used
+        deviation_pct = np.array([round(v, 2) for v in scored["deviation_pct"].tolist()], dtype=float)
+        score = np.array([round(v, 2) for v in scored["score"].tolist()], dtype=float)
+        offsets = np.zeros(len(parsed) + 1, dtype=np.int64)
+        np.cumsum([len(paddock_readings) for _, paddock_readings in parsed], out=offsets[1:])
+        return cls([paddock for paddock, _ in parsed], [source_file] * len(parsed),
+                   offsets, nutrient_names, nutrient_codes,
+                   status_codes(scored["deviation_pct"]),
+                   np.asarray([actual for _, actual, _, _ in readings], dtype=float),
+                   np.asarray([min_val for _, _, min_val, _ in readings], dtype=float),
+                   np.asarray([max_val for _, _, _, max_val in readings], dtype=float),
+                   scored["ideal"], deviation_pct, score)
+
+    @classmethod
+    def concat(cls, tables):
+        """One table with the paddocks of all `tables`, in order."""
+        tables = list(tables)
+        if not tables:
+            return cls.from_parsed([])
+        nutrient_names, name_codes = intern_codes(
+            [name for table in tables for name in table.nutrient_names])
+        codes = []
+        offsets = [np.zeros(1, dtype=np.int64)]
+        names_seen = rows_seen = 0
+        for table in tables:
+            remap = name_codes[names_seen:names_seen + len(table.nutrient_names)]
+            codes.append(remap[table.nutrient_codes])
+            offsets.append(table.offsets[1:] + rows_seen)
+            names_seen += len(table.nutrient_names)
+            rows_seen += table.offsets[-1]
+
+        def column(name):
+            return np.concatenate([getattr(table, name) for table in tables])
+
+        return cls([paddock for table in tables for paddock in table.paddocks],
+                   [f for table in tables for f in table.source_files],
+                   np.concatenate(offsets), nutrient_names,
+                   np.concatenate(codes), column("status_codes"),
+                   column("actual"), column("min"), column("max"),
+                   column("ideal"), column("deviation_pct"), column("score"))
+
+    def __len__(self):
+        return len(self.paddocks)
+
+    @property
+    def nbytes(self):
+        """Bytes held by the column arrays."""
+        return sum(getattr(self, name).nbytes for name in (
+            "offsets", "nutrient_codes", "status_codes", "actual", "min",
+            "max", "ideal", "deviation_pct", "score"))
+
+    def rows(self, p):
+        """Slice of the rows belonging to paddock p."""
+        return slice(int(self.offsets[p]), int(self.offsets[p + 1]))
+
+    def with_source_file(self, source_file):
+        self.source_files = [source_file] * len(self)
+        return self
+
+    def general_score(self, p):
+        """Mean score of paddock p, rounded to 2 places."""
+        # NumPy's rounding (not Python's), as the pandas mean always used
+        return round(self.score[self.rows(p)].mean(), 2)
+
+    def general_scores(self):
+        return [self.general_score(p) for p in range(len(self))]
+
+    def report(self, p):
+        """Paddock p as the {"paddock", "nutrients"} dict of extract_reports."""
+        rows = self.rows(p)
+        columns = [[self.nutrient_names[code] for code in self.nutrient_codes[rows].tolist()]]
+        columns += [getattr(self, attr)[rows].tolist() for attr in self.NUMBER_COLUMNS.values()]
+        columns.append([STATUSES[code] for code in self.status_codes[rows].tolist()])
+        return {
+            "paddock": self.paddocks[p],
+            "nutrients": [dict(zip(REPORT_COLUMNS, row)) for row in zip(*columns)]
+        }
+
+    def to_reports(self):
+        return [self.report(p) for p in range(len(self))]
+
+    def paddock_frame(self, p):
+        """The readings of paddock p as a DataFrame of REPORT_COLUMNS."""
+        return pd.DataFrame(self.report(p)["nutrients"], columns=REPORT_COLUMNS)
+
+    def _coded_columns(self):
+        """(name, per-row codes, categories) of the non-number columns."""
+        row_paddocks = np.repeat(np.arange(len(self)), np.diff(self.offsets))
+        paddocks, paddock_codes = intern_codes(self.paddocks)
+        files, file_codes = intern_codes(self.source_files)
+        # Resolved once per distinct name; unknown names are kept as printed
+        canonical, canonical_codes = intern_codes(
+            [canonical_name(name) or name for name in self.nutrient_names])
+        return [
+            ("Paddock", paddock_codes[row_paddocks], paddocks),
+            ("Nutrient", self.nutrient_codes, self.nutrient_names),
+            ("Canonical Nutrient", canonical_codes[self.nutrient_codes], canonical),
+            ("Status", self.status_codes, STATUSES),
+            ("Source File", file_codes[row_paddocks], files),
+        ]
+
+    def _column_order(self):
+        return (["Paddock", "Nutrient", "Canonical Nutrient"] + REPORT_COLUMNS[1:]
+                + ["Source File"])
+
+    def to_pandas(self):
+        """
+        One row per reading. Number columns share memory with the table;
+        paddocks, nutrients (as printed and canonical, e.g. "Sulphur" for
+        "S - Sulphur"), statuses and files are categoricals.
+        """
+        columns = {name: pd.Categorical.from_codes(codes, categories=categories)
+                   for name, codes, categories in self._coded_columns()}
+        columns.update((name, getattr(self, attr))
+                       for name, attr in self.NUMBER_COLUMNS.items())
+        return pd.DataFrame({name: columns[name] for name in self._column_order()},
+                            copy=False)
+
+    def summary_to_arrow(self):
+        """
+        One row per paddock: its name, general score and reading count
+        (needs pyarrow).
+        """
+        import pyarrow as pa
+
+        return pa.table({
+            "Paddock": pa.array(self.paddocks, type=pa.string()),
+            "General Score": pa.array(np.array(self.general_scores(), dtype=float)),
+            "Readings": pa.array(np.diff(self.offsets).astype(np.int32)),
         })
 
-    return reports
+    def to_arrow(self):
+        """
+        The rows of to_pandas as a pyarrow.Table (needs pyarrow). Number
+        columns are zero-copy; the others are dictionary-encoded.
+        """
+        import pyarrow as pa
+
+        columns = {name: pa.DictionaryArray.from_arrays(
+                       pa.array(codes, type=pa.int32()), pa.array(categories, type=pa.string()))
+                   for name, codes, categories in self._coded_columns()}
+        columns.update((name, pa.array(getattr(self, attr)))
+                       for name, attr in self.NUMBER_COLUMNS.items())
+        return pa.table({name: columns[name] for name in self._column_order()})
+
+EXPECTED_NUTRIENTS = [
+    "N - Nitrogen", "P - Phosphorus", "K - Potassium", "S - Sulphur",
+    "Ca - Calcium", "Mg - Magnesium", "Na - Sodium", "Cu - Copper",
+    "Zn - Zinc", "Mn - Manganese", "Fe - Iron", "B - Boron",
+    "Mo - Molybdenum", "Si - Silicon", "Co - Cobalt"
+]
+
+PADDOCK_MARKER = "PADDOCK:"
+RANGE_MARKER = "Plant TherapyTM"
+# Any expected nutrient name anywhere in a line, in one regex search
+NUTRIENT_PATTERN = re.compile("|".join(re.escape(n) for n in EXPECTED_NUTRIENTS))
+RANGE_PATTERN = re.compile(r"(\d+\.?\d*)\s*-\s*(\d+\.?\d*)")
+MAX_READINGS = len(EXPECTED_NUTRIENTS)
+
+def finish_paddock(paddock, values, ranges, has_range_block):
+    """(paddock, [(label, actual, min, max), ...]), or None if unusable."""
+    paddock = (paddock or "Unknown").replace("\u201c", "\"").replace("\u201d", "\"").replace("\u2013", "-")
+    if not has_range_block:
+        print(f"⚠️ Skipping paddock '{paddock}' – no ideal range block.")
+        return None
+    if not ranges:
+        print(f"⚠️ Skipping paddock '{paddock}' – no usable ranges found.")
+        return None
+    return paddock, [(label, actual, min_val, max_val)
+                     for (label, actual), (min_val, max_val) in zip(values, ranges)]
+
+def iter_paddock_readings(lines):
+    """
+    Yield (paddock, [(label, actual, min, max), ...]) for each usable
+    "PADDOCK:" section of a report, given its text lines in order.
+
+    A single pass over the lines: each nutrient line takes the first
+    number-only line after it as its reading (lines in between are
+    skipped), and the ranges are the "a - b" lines between the first
+    "Plant TherapyTM" marker of the section and the next one. Only the
+    first MAX_READINGS of each are kept, so memory stays constant however
+    long the report is.
+    """
+    nutrient_search = NUTRIENT_PATTERN.search
+    range_match = RANGE_PATTERN.match
+    in_section = False
+    paddock = pending = None
+    values, ranges = [], []
+    # 0: before the section's range block, 1: inside it, 2: after it
+    range_state = 0
+    for line in lines:
+        segments = line.split(PADDOCK_MARKER) if PADDOCK_MARKER in line else (line,)
+        for n, segment in enumerate(segments):
+            if n:
+                # Text after a "PADDOCK:" marker starts a new section
+                if in_section:
+                    result = finish_paddock(paddock, values, ranges, range_state)
+                    if result is not None:
+                        yield result
+                in_section = True
+                paddock = pending = None
+                values, ranges = [], []
+                range_state = 0
+            elif not in_section:
+                continue
+
+            stripped = segment.strip()
+            if paddock is None and stripped:
+                paddock = stripped
+            if len(values) < MAX_READINGS:
+                if pending is not None:
+                    try:
+                        values.append((pending, float(stripped)))
+                        pending = None
+                    except ValueError:
+                        pass
+                if pending is None and nutrient_search(stripped):
+                    pending = stripped
 
-def print_summary_score_table(all_reports):
-    paddock_scores = []
+            if range_state == 2:
+                continue
+            if range_state == 0:
+                start = segment.find(RANGE_MARKER)
+                if start < 0:
+                    continue
+                range_state = 1
+                segment = segment[start + len(RANGE_MARKER):]
+            end = segment.find(RANGE_MARKER)
+            if end >= 0:
+                segment = segment[:end]
+                range_state = 2
+            segment = segment.strip()
+            if len(ranges) < MAX_READINGS and "N/A" not in segment:
+                match = range_match(segment)
+                if match:
+                    ranges.append((float(match.group(1)), float(match.group(2))))
+    if in_section:
+        result = finish_paddock(paddock, values, ranges, range_state)
+        if result is not None:
+            yield result
+
+def iter_pdf_lines(pdf_path):
+    """The text lines of a PDF, one page in memory at a time."""
+    with fitz.open(pdf_path) as doc:
+        for page in doc:
+            yield from page.get_text().splitlines()
+
+def extract_table(pdf_path):
+    """
+    Parse and score every paddock of a leaf test PDF into a NutrientTable.
+    """
+    parsed = list(iter_paddock_readings(iter_pdf_lines(pdf_path)))
+    return NutrientTable.from_parsed(parsed, source_file=os.path.basename(pdf_path))
 
-    for report in all_reports:
-        df = pd.DataFrame(report["nutrients"])
-        score = round(df["Score"].mean(), 2)
-        filename = report.get("source_file", "N/A")
-        paddock_scores.append((report["paddock"], score, filename))
+def extract_reports(pdf_path):
+    return extract_table(pdf_path).to_reports()
 
+def print_summary_score_table(paddock_scores):
+    """
+    Print and return the ranking of [(paddock, general score, source file)].
+    """
+    paddock_scores = [(paddock, score, filename or "N/A")
+                      for paddock, score, filename in paddock_scores]
     sorted_scores = sorted(paddock_scores, key=lambda x: x[1])
 
     print("\n📊 Summary Table – General Nutritional Scores (Lowest to Highest):\n")
@@ -151,9 +449,296 @@ def print_summary_score_table(all_reports):
     summary_df = pd.DataFrame(sorted_scores, columns=["Paddock", "General Score", "Source File"])
     return summary_df
 
-def process_all_pdfs(folder_path):
-    all_data = []
-    all_reports = []
+def extract_file(pdf_path):
+    """
+    Extract the NutrientTable of a single PDF without letting a bad file
+    abort a batch. Returns (table, error) where error is None on success.
+    """
+    try:
+        return extract_table(pdf_path), None
+    except Exception as e:
+        return None, f"{type(e).__name__}: {e}"
+
+def _extract_chunk(folder_path, filenames):
+    return [(filename,) + extract_file(os.path.join(folder_path, filename))
+            for filename in filenames]
+
+def iter_extracted_pdfs(folder_path, pdf_files, workers=1, chunksize=4):
+    """
+    Yield (filename, table, error) for every PDF in pdf_files.
+
+    With workers > 1 the files are sent to a process pool in chunks of
+    `chunksize` and results are yielded in completion order; at most two
+    chunks per worker are in flight at any time.
+    """
+    if workers == 1:
+        for filename in pdf_files:
+            yield _extract_chunk(folder_path, [filename])[0]
+        return
+
+    workers = workers or os.cpu_count() or 1
+    chunks = iter([pdf_files[i:i + chunksize]
+                   for i in range(0, len(pdf_files), chunksize)])
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = {}
+
+        def submit_next():
+            chunk = next(chunks, None)
+            if chunk is not None:
+                pending[executor.submit(_extract_chunk, folder_path, chunk)] = chunk
+
+        for _ in range(workers * 2):
+            submit_next()
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                chunk = pending.pop(future)
+                try:
+                    results = future.result()
+                except Exception as e:
+                    results = [(filename, None, f"{type(e).__name__}: {e}")
+                               for filename in chunk]
+                yield from results
+                submit_next()
+
+def print_paddocks(table):
+    for p in range(len(table)):
+        print(f"📍 Paddock: {table.paddocks[p]}")
+        print(table.paddock_frame(p).to_string(index=False))
+        print(f"🌿 General Nutritional Score: {table.general_score(p)}/100\n")
+
+def write_parquet_partition(table, output_dir, season):
+    """
+    Write the readings and paddock scores of one source file as Parquet
+    under output_dir, in Hive-style partitions that pyarrow.dataset, pandas
+    and DuckDB read back as season/source_file columns:
+
+        readings/season=<season>/source_file=<file>/part-0.parquet
+        paddocks/season=<season>/source_file=<file>/part-0.parquet
+
+    Scoring the same file again replaces its partition.
+    """
+    import pyarrow.parquet as pq
+
+    partition = os.path.join(
+        f"season={urllib.parse.quote(str(season), safe='')}",
+        f"source_file={urllib.parse.quote(table.source_files[0], safe='')}")
+    readings = table.to_arrow().drop_columns(["Source File"])
+    for name, data in (("readings", readings), ("paddocks", table.summary_to_arrow())):
+        directory = os.path.join(output_dir, name, partition)
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, "part-0.parquet")
+        # Write then rename so readers never see a half-written file
+        pq.write_table(data, path + ".tmp")
+        os.replace(path + ".tmp", path)
+
+def remove_parquet_partition(source_file, output_dir, season):
+    """Delete a source file's partitions for one season, if present."""
+    partition = os.path.join(
+        f"season={urllib.parse.quote(str(season), safe='')}",
+        f"source_file={urllib.parse.quote(source_file, safe='')}")
+    for name in ("readings", "paddocks"):
+        path = os.path.join(output_dir, name, partition, "part-0.parquet")
+        if os.path.exists(path):
+            os.remove(path)
+            os.rmdir(os.path.dirname(path))
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+class ScoreManifest:
+    """
+    SQLite record of the scored PDFs of a folder: size, mtime, content hash
+    and parser version of each file, plus the general score of each of its
+    paddocks, so the ranking can be rebuilt without opening any PDF. The
+    season a file's Parquet partitions were last written under is kept too,
+    so they can be replaced or removed after the season changes.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._conn = sqlite3.connect(path)
+        with self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS files ("
+                "name TEXT PRIMARY KEY, size INTEGER NOT NULL, "
+                "mtime_ns INTEGER NOT NULL, sha256 TEXT NOT NULL, "
+                "parser_version TEXT NOT NULL, error TEXT, updated REAL NOT NULL, "
+                "season TEXT)")
+            columns = {row[1] for row in self._conn.execute("PRAGMA table_info(files)")}
+            if "season" not in columns:
+                # Manifest written before seasons were recorded
+                self._conn.execute("ALTER TABLE files ADD COLUMN season TEXT")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS paddocks ("
+                "name TEXT NOT NULL, idx INTEGER NOT NULL, paddock TEXT NOT NULL, "
+                "score REAL NOT NULL, PRIMARY KEY (name, idx))")
+
+    def close(self):
+        self._conn.close()
+
+    def files(self):
+        """
+        {name: (size, mtime_ns, sha256, parser_version, season)} of recorded
+        files; season is None when no partitions were written for the file.
+        """
+        return {row[0]: row[1:] for row in self._conn.execute(
+            "SELECT name, size, mtime_ns, sha256, parser_version, season FROM files")}
+
+    def record(self, name, stat, sha256, table=None, error=None, season=None):
+        """
+        Store a file's stats and its paddock scores (or its error), and the
+        season its partitions are written under.
+        """
+        with self._conn:
+            self._conn.execute("DELETE FROM paddocks WHERE name = ?", (name,))
+            self._conn.execute(
+                "INSERT OR REPLACE INTO files (name, size, mtime_ns, sha256, "
+                "parser_version, error, updated, season) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (name, stat.st_size, stat.st_mtime_ns, sha256, PARSER_VERSION,
+                 error, time.time(), season))
+            if table is not None:
+                self._conn.executemany(
+                    "INSERT INTO paddocks VALUES (?, ?, ?, ?)",
+                    [(name, p, paddock, float(score)) for p, (paddock, score)
+                     in enumerate(zip(table.paddocks, table.general_scores()))])
+
+    def restamp(self, name, stat):
+        """Record new stats for a file whose content did not change."""
+        with self._conn:
+            self._conn.execute(
+                "UPDATE files SET size = ?, mtime_ns = ?, updated = ? WHERE name = ?",
+                (stat.st_size, stat.st_mtime_ns, time.time(), name))
+
+    def remove(self, name):
+        with self._conn:
+            self._conn.execute("DELETE FROM paddocks WHERE name = ?", (name,))
+            self._conn.execute("DELETE FROM files WHERE name = ?", (name,))
+
+    def paddock_scores(self, file_order):
+        """[(paddock, score, name)] of every paddock, files in file_order."""
+        rows = self._conn.execute("SELECT name, idx, paddock, score FROM paddocks").fetchall()
+        rows.sort(key=lambda row: (file_order.get(row[0], len(file_order)), row[1]))
+        return [(paddock, score, name) for name, _, paddock, score in rows]
+
+def process_new_pdfs(folder_path, state_path=None, workers=1, chunksize=4,
+                     output_dir=None, season=None):
+    """
+    Incremental process_all_pdfs. Only PDFs that are new or changed since
+    the run recorded in the manifest at state_path are parsed, deleted
+    ones are dropped, and the full ranking is rebuilt from the manifest.
+
+    A file with unchanged size and mtime is trusted without reading it; one
+    whose stats changed but whose content hash did not is only re-stamped.
+    Files that failed are recorded too and retried once they change.
+
+    With output_dir, the partitions of a deleted file, or of a changed one
+    that now fails or has no paddocks, are removed, as are those written
+    under an earlier season when a file is scored for a new one.
+    """
+    state_path = state_path or os.path.join(folder_path, ".nutritional_scores.sqlite3")
+    if output_dir:
+        import pyarrow  # noqa: F401 -- fail before parsing anything
+        season = season or str(datetime.now().year)
+    manifest = ScoreManifest(state_path)
+    try:
+        pdf_files = [f for f in os.listdir(folder_path) if f.lower().endswith(".pdf")]
+        known = manifest.files()
+
+        for name in known.keys() - set(pdf_files):
+            print(f"🗑️ Removed: {name}")
+            manifest.remove(name)
+            if output_dir:
+                # Manifests from before seasons were recorded have None
+                remove_parquet_partition(name, output_dir, known[name][4] or season)
+
+        changed = {}
+        for name in pdf_files:
+            path = os.path.join(folder_path, name)
+            stat = os.stat(path)
+            entry = known.get(name)
+            current = entry is not None and entry[3] == PARSER_VERSION
+            if current and entry[:2] == (stat.st_size, stat.st_mtime_ns):
+                continue
+            sha256 = file_sha256(path)
+            if current and entry[2] == sha256:
+                manifest.restamp(name, stat)
+                continue
+            changed[name] = (stat, sha256)
+
+        print(f"📁 Found {len(pdf_files)} PDF(s), {len(changed)} new or changed.")
+        for filename, table, error in iter_extracted_pdfs(folder_path, list(changed), workers, chunksize):
+            stat, sha256 = changed[filename]
+            old_season = known[filename][4] if filename in known else None
+            print(f"\n📄 Processing: {filename}")
+            written = bool(output_dir and not error and len(table))
+            if output_dir:
+                partition_season = season if written else None
+                # Manifests from before seasons were recorded have None
+                stale_season = old_season or season
+                if not written or stale_season != season:
+                    remove_parquet_partition(filename, output_dir, stale_season)
+            else:
+                # Partitions written by an earlier run are left as they are
+                partition_season = old_season
+            if error:
+                print(f"❌ Failed to process {filename}: {error}")
+                manifest.record(filename, stat, sha256, error=error,
+                                season=partition_season)
+                continue
+            print_paddocks(table)
+            manifest.record(filename, stat, sha256, table.with_source_file(filename),
+                            season=partition_season)
+            if written:
+                write_parquet_partition(table, output_dir, season)
+
+        paddock_scores = manifest.paddock_scores(
+            {name: i for i, name in enumerate(pdf_files)})
+    finally:
+        manifest.close()
+
+    if not paddock_scores:
+        print("❌ No valid data extracted.")
+        return None
+    return print_summary_score_table(paddock_scores)
+
+def folder_snapshot(folder_path):
+    """Sorted (name, size, mtime_ns) of every PDF in the folder."""
+    snapshot = []
+    for entry in os.scandir(folder_path):
+        if entry.name.lower().endswith(".pdf"):
+            stat = entry.stat()
+            snapshot.append((entry.name, stat.st_size, stat.st_mtime_ns))
+    return sorted(snapshot)
+
+def watch_folder(folder_path, interval=30, **kwargs):
+    """
+    Run process_new_pdfs now, then again whenever the folder's PDFs change.
+    A change is only acted on once two polls agree, so files that are still
+    being copied in are not parsed half-written. Stop with Ctrl+C.
+    """
+    processed = previous = folder_snapshot(folder_path)
+    process_new_pdfs(folder_path, **kwargs)
+    print(f"\n👀 Watching {folder_path} every {interval}s (Ctrl+C to stop)")
+    try:
+        while True:
+            time.sleep(interval)
+            snapshot = folder_snapshot(folder_path)
+            if snapshot == previous and snapshot != processed:
+                process_new_pdfs(folder_path, **kwargs)
+                processed = snapshot
+            previous = snapshot
+    except KeyboardInterrupt:
+        pass
+
+def process_all_pdfs(folder_path, workers=1, chunksize=4, output_dir=None,
+                     season=None):
+    tables = []
 
     pdf_files = [f for f in os.listdir(folder_path) if f.lower().endswith(".pdf")]
     if not pdf_files:
@@ -161,32 +746,57 @@ def process_all_pdfs(folder_path):
         return
 
     print(f"📁 Found {len(pdf_files)} PDF(s) to process.")
+    if output_dir:
+        import pyarrow  # noqa: F401 -- fail before parsing anything
+        season = season or str(datetime.now().year)
 
-    for filename in pdf_files:
-        pdf_path = os.path.join(folder_path, filename)
+    file_order = {filename: i for i, filename in enumerate(pdf_files)}
+    for filename, table, error in iter_extracted_pdfs(folder_path, pdf_files, workers, chunksize):
         print(f"\n📄 Processing: {filename}")
-        reports = extract_reports(pdf_path)
-
-        for report in reports:
-            df = pd.DataFrame(report["nutrients"])
-            general_score = round(df["Score"].mean(), 2)
-
-            print(f"📍 Paddock: {report['paddock']}")
-            print(df.to_string(index=False))
-            print(f"🌿 General Nutritional Score: {general_score}/100\n")
-
-            df.insert(0, "Paddock", report["paddock"])
-            df["General Score"] = general_score
-            all_data.append(df)
-
-            report["source_file"] = filename
-            all_reports.append(report)
+        if error:
+            print(f"❌ Failed to process {filename}: {error}")
+            continue
 
-    if all_data:
-        summary_df = print_summary_score_table(all_reports)
+        print_paddocks(table)
+        if len(table):
+            tables.append(table.with_source_file(filename))
+            if output_dir:
+                write_parquet_partition(table, output_dir, season)
+
+    if tables:
+        # Restore folder order so ties in the ranking match a serial run
+        tables.sort(key=lambda table: file_order[table.source_files[0]])
+        table = NutrientTable.concat(tables)
+        summary_df = print_summary_score_table(
+            zip(table.paddocks, table.general_scores(), table.source_files))
     else:
         print("❌ No valid data extracted.")
 
 if __name__ == "__main__":
-    folder_path = r"C:\Users\Franz Hentze\Desktop\NTS\NTS Digital\Crop Nutrition\NTS G.R.O.W Nutritional Score\NTS Plant Nutritional Score"
-    process_all_pdfs(folder_path)
+    parser = argparse.ArgumentParser(description="Score all leaf test PDFs in a folder.")
+    parser.add_argument("folder", nargs="?",
+                        default=r"C:\Users\Franz Hentze\Desktop\NTS\NTS Digital\Crop Nutrition\NTS G.R.O.W Nutritional Score\NTS Plant Nutritional Score")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="worker processes (0 = one per CPU, 1 = serial)")
+    parser.add_argument("--chunksize", type=int, default=4,
+                        help="PDFs per task sent to a worker")
+    parser.add_argument("--output",
+                        help="directory to write Parquet readings and paddock scores to")
+    parser.add_argument("--season",
+                        help="season partition for --output (default: current year)")
+    parser.add_argument("--incremental", action="store_true",
+                        help="only score PDFs that are new or changed since the last run")
+    parser.add_argument("--state",
+                        help="manifest for --incremental/--watch "
+                             "(default: .nutritional_scores.sqlite3 in the folder)")
+    parser.add_argument("--watch", type=float, metavar="SECONDS",
+                        help="keep scoring new PDFs, polling the folder at this interval")
+    args = parser.parse_args()
+    options = dict(workers=args.workers, chunksize=args.chunksize,
+                   output_dir=args.output, season=args.season)
+    if args.watch:
+        watch_folder(args.folder, args.watch, state_path=args.state, **options)
+    elif args.incremental:
+        process_new_pdfs(args.folder, state_path=args.state, **options)
+    else:
+        process_all_pdfs(args.folder, **options)
@@ -0,0 +1,15 @@
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# The backend modules import each other as top-level modules; the fake
+# completion server lives with the benchmarks
+for path in (ROOT, os.path.join(ROOT, 'backend'),
+             os.path.join(ROOT, 'benchmarks')):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+# Nothing below opens an extraction cache or job database, but keep the
+# app's defaults out of the shared temp directory if anything does
+os.environ.setdefault('EXTRACTION_CACHE_PATH', '')
+os.environ.setdefault('OPENAI_API_KEY', 'test')
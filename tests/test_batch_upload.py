@@ -0,0 +1,108 @@
+"""Batch uploads stop at the file count and byte budget while reading,
+before a zip bomb or an oversized upload is expanded into memory."""
+import io
+import zipfile
+
+import pytest
+
+import app
+
+PDF = b'%PDF-1.4 ' + b'x' * 100
+
+
+def zip_of(members, compression=zipfile.ZIP_DEFLATED):
+    data = io.BytesIO()
+    with zipfile.ZipFile(data, 'w', compression) as archive:
+        for name, content in members:
+            archive.writestr(name, content)
+    return data.getvalue()
+
+
+@pytest.fixture
+def limits(monkeypatch):
+    monkeypatch.setattr(app, 'BATCH_MAX_FILES', 3)
+    monkeypatch.setattr(app, 'BATCH_MAX_FILE_BYTES', 1000)
+    monkeypatch.setattr(app, 'BATCH_MAX_TOTAL_BYTES', 10_000)
+
+
+def test_zip_members_read_within_limits(limits):
+    data = zip_of([('a.pdf', PDF), ('notes.txt', b'x'), ('__MACOSX/a.pdf', PDF),
+                   ('dir/b.pdf', b'not a pdf')])
+    entries, total = app.read_zip_pdfs('r.zip', data, 3, 10_000)
+    assert entries == [('r.zip/a.pdf', PDF, None),
+                       ('r.zip/dir/b.pdf', None, 'Not a PDF')]
+    assert total == len(PDF) + len(b'not a pdf')
+
+
+def test_zip_with_too_many_members(limits):
+    data = zip_of([(f'{i}.pdf', PDF) for i in range(4)])
+    with pytest.raises(app.BatchTooLarge, match='at most 3'):
+        app.read_zip_pdfs('r.zip', data, 3, 10_000)
+
+
+def test_zip_bomb_stops_at_the_byte_budget(limits, monkeypatch):
+    monkeypatch.setattr(app, 'BATCH_MAX_FILE_BYTES', 100_000_000)
+    # 3 x 50 MB of zeros compress to well under 1 MB
+    data = zip_of([(f'{i}.pdf', b'%PDF-' + bytes(50_000_000)) for i in range(3)])
+    assert len(data) < 1_000_000
+    read = []
+    open_member = zipfile.ZipExtFile.read
+
+    def counting_read(self, n=-1):
+        chunk = open_member(self, n)
+        read.append(len(chunk))
+        return chunk
+
+    monkeypatch.setattr(zipfile.ZipExtFile, 'read', counting_read)
+    with pytest.raises(app.BatchTooLarge, match='larger than 10000 bytes'):
+        app.read_zip_pdfs('bomb.zip', data, 3, 10_000)
+    # Reading stops one byte past the budget, not at 150 MB
+    assert read and sum(read) <= 10_000 + 1
+
+
+def post_batch(files):
+    return app.app.test_client().post('/extract-soil-report/batch', data={
+        'files': [(io.BytesIO(data), name) for name, data in files]})
+
+
+def test_too_many_uploads_is_a_400(limits):
+    response = post_batch([(f'{i}.pdf', PDF) for i in range(4)])
+    assert response.status_code == 400
+    assert 'at most 3' in response.get_json()['error']
+
+
+def test_zip_bomb_upload_is_a_400(limits):
+    response = post_batch([('bomb.zip', zip_of(
+        [(f'{i}.pdf', b'%PDF-' + bytes(5_000_000)) for i in range(3)]))])
+    assert response.status_code == 400
+    assert 'in total' in response.get_json()['error']
+
+
+def test_upload_read_stops_at_the_byte_budget(limits):
+    class Upload:
+        filename = 'big.pdf'
+
+        def __init__(self):
+            self.requested = []
+
+        def read(self, size=-1):
+            self.requested.append(size)
+            return b'%PDF-' + bytes(size - 5)
+
+    upload = Upload()
+    with pytest.raises(app.BatchTooLarge):
+        app.read_batch_uploads([upload])
+    assert upload.requested == [10_001]
+
+
+def test_request_body_over_max_content_length_is_a_413(monkeypatch):
+    flask_app = app.create_app()
+    monkeypatch.setitem(flask_app.config, 'MAX_CONTENT_LENGTH', 1000)
+    for path in ('/extract-soil-report/batch', '/extract-soil-report',
+                 '/jobs/extract'):
+        field = 'files' if path.endswith('batch') else 'file'
+        response = flask_app.test_client().post(path, data={
+            field: (io.BytesIO(PDF * 20), 'big.pdf')})
+        assert response.status_code == 413, path
+        assert 'larger than' in response.get_json()['error']
+    assert app.create_app().config['MAX_CONTENT_LENGTH'] == app.MAX_UPLOAD_BYTES
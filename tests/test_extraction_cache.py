@@ -0,0 +1,53 @@
+"""The extraction cache key changes with every setting that shapes the
+analyses, so a restart under new settings never serves old results."""
+import pytest
+
+import app
+import ocr_pipeline
+from cache import TieredCache
+
+PDF = b'%PDF-1.4 test'
+ANALYSES = [{'id': 0, 'nutrients': [{'name': 'Calcium', 'current': 1.0}]}]
+
+
+@pytest.fixture
+def extractions(monkeypatch, tmp_path):
+    """Count iter_analyses calls behind a fresh on-disk extraction cache."""
+    cache = TieredCache(memory_entries=0,
+                        disk_path=str(tmp_path / 'extraction.sqlite3'))
+    calls = []
+
+    def iter_analyses(file, progress=None, **options):
+        calls.append(options)
+        return iter(ANALYSES)
+
+    monkeypatch.setattr(app, 'extraction_cache', lambda: cache)
+    monkeypatch.setattr(app, 'iter_analyses', iter_analyses)
+    return calls
+
+
+def test_same_settings_hit_the_cache(extractions):
+    assert app.extract_pdf_bytes(PDF, {}) == ANALYSES
+    assert app.extract_pdf_bytes(PDF, {}) == ANALYSES
+    assert len(extractions) == 1
+
+
+@pytest.mark.parametrize('module, name, value', [
+    (ocr_pipeline, 'OCR_DPI', 300),
+    (ocr_pipeline, 'OCR_GRAYSCALE', False),
+    (ocr_pipeline, 'OCR_CROP', (0.0, 0.1, 1.0, 0.7)),
+    (ocr_pipeline, 'OCR_TESSERACT_CONFIG', '--psm 6'),
+    (app, 'TEXT_LAYER_MIN_CHARS', 200),
+])
+def test_changed_setting_is_a_cache_miss(extractions, monkeypatch, module,
+                                         name, value):
+    app.extract_pdf_bytes(PDF, {})
+    monkeypatch.setattr(module, name, value)
+    app.extract_pdf_bytes(PDF, {})
+    assert len(extractions) == 2
+
+
+def test_options_are_part_of_the_key(extractions):
+    app.extract_pdf_bytes(PDF, {})
+    app.extract_pdf_bytes(PDF, {'max_pages': 2})
+    assert len(extractions) == 2
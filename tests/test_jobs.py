@@ -0,0 +1,106 @@
+"""Background extraction jobs: the bounded queue, its 503, progress of
+cached extractions and failures."""
+import io
+import logging
+import threading
+import time
+
+import pytest
+
+import app
+from cache import TieredCache
+from jobs import JobQueue, JobStore, QueueFull
+
+PDF = b'%PDF-1.4 job'
+ANALYSES = [{'id': 0, 'nutrients': []}, {'id': 1, 'nutrients': []}]
+
+
+@pytest.fixture
+def queue(tmp_path, monkeypatch):
+    queue = JobQueue(JobStore(str(tmp_path / 'jobs.sqlite3')),
+                     max_workers=1, max_pending=2)
+    monkeypatch.setattr(app, 'job_queue', lambda: queue)
+    return queue
+
+
+def wait_for(queue, job_id, timeout=5):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = queue.store.get(job_id)
+        if job['status'] in ('done', 'failed'):
+            return job
+        time.sleep(0.01)
+    raise AssertionError(f'job {job_id} did not finish')
+
+
+def blocked(release):
+    def run(progress=None):
+        release.wait(5)
+        return {}
+    return run
+
+
+def test_queue_full_past_max_pending(queue):
+    release = threading.Event()
+    try:
+        first = queue.submit('test', blocked(release))
+        queue.submit('test', blocked(release))
+        with pytest.raises(QueueFull):
+            queue.submit('test', blocked(release))
+    finally:
+        release.set()
+    wait_for(queue, first)
+    # Finished jobs free their slots
+    deadline = time.monotonic() + 5
+    while queue._pending and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert wait_for(queue, queue.submit('test', blocked(release)))['status'] == 'done'
+
+
+def test_full_queue_is_a_503_with_retry_after(queue):
+    release = threading.Event()
+    client = app.app.test_client()
+    try:
+        queue.submit('test', blocked(release))
+        queue.submit('test', blocked(release))
+        response = client.post('/jobs/extract', data={
+            'file': (io.BytesIO(PDF), 'report.pdf')})
+    finally:
+        release.set()
+    assert response.status_code == 503
+    assert response.headers['Retry-After'] == app.JOBS_RETRY_AFTER
+    assert 'try again later' in response.get_json()['error']
+
+
+def test_unknown_job_is_a_404(queue):
+    response = app.app.test_client().get('/jobs/0123456789abcdef')
+    assert response.status_code == 404
+    assert response.get_json() == {'error': 'Unknown job'}
+
+
+def test_cached_extraction_reports_finished_progress(queue, monkeypatch):
+    cache = TieredCache(memory_entries=16)
+    cache.set(app.extraction_cache_key(PDF, {}), ANALYSES)
+    monkeypatch.setattr(app, 'extraction_cache', lambda: cache)
+    client = app.app.test_client()
+    response = client.post('/jobs/extract', data={
+        'file': (io.BytesIO(PDF), 'report.pdf')})
+    assert response.status_code == 202
+    job_id = response.get_json()['job_id']
+    wait_for(queue, job_id)
+    job = client.get(f'/jobs/{job_id}').get_json()
+    assert job['status'] == 'done'
+    assert job['progress'] == {'stage': 'cache', 'done': 2, 'total': 2}
+    assert job['result'] == {'analyses': ANALYSES, 'count': 2}
+
+
+def test_failed_job_is_logged(queue, caplog):
+    def fail(progress=None):
+        raise RuntimeError('broken PDF')
+
+    with caplog.at_level(logging.ERROR, logger='jobs'):
+        job = wait_for(queue, queue.submit('test', fail))
+    assert job['status'] == 'failed'
+    assert job['error'] == 'broken PDF'
+    assert any(record.exc_info and 'failed' in record.getMessage()
+               for record in caplog.records)
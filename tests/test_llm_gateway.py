@@ -0,0 +1,156 @@
+"""LLMGateway against the local fake completion server: retries with
+backoff or Retry-After, failing fast on an exhausted quota, token bucket
+refunds, per-call timeouts, and the 503 the API answers with."""
+import types
+
+import pytest
+
+import app
+import llm_gateway
+from fake_llm_server import FakeCompletions, serve
+from llm_gateway import LLMGateway, LLMUnavailable, TokenBucket
+
+MESSAGES = [{'role': 'user', 'content': 'x' * 400}]
+
+
+class FixedClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    """Seconds the gateway slept between attempts, without sleeping."""
+    slept = []
+    monkeypatch.setattr(llm_gateway, 'time', types.SimpleNamespace(
+        sleep=slept.append, monotonic=llm_gateway.time.monotonic))
+    return slept
+
+
+@pytest.fixture
+def jitter(monkeypatch):
+    """Backoff bounds drawn from; the full bound is used as the delay."""
+    bounds = []
+
+    def uniform(low, high):
+        bounds.append((low, high))
+        return high
+
+    monkeypatch.setattr(llm_gateway, 'random',
+                        types.SimpleNamespace(uniform=uniform))
+    return bounds
+
+
+def gateway(base_url, **kwargs):
+    options = dict(api_key='test', base_url=base_url, timeout=5.0,
+                   max_retries=3, backoff_base=0.5, backoff_max=30.0)
+    options.update(kwargs)
+    return LLMGateway(**options)
+
+
+def test_retries_rate_limit_and_server_error_then_succeeds(sleeps, jitter):
+    fake = FakeCompletions(latency=0, script=[429, 500, 200])
+    with serve(fake) as base_url:
+        text = gateway(base_url).complete('fake', MESSAGES, max_tokens=50)
+    assert text.startswith('Fake summary')
+    assert fake.stats == {'ok': 1, 'rate_limited': 1, 'failed': 1}
+    # Full jitter over an exponentially growing bound
+    assert jitter == [(0, 0.5), (0, 1.0)]
+    assert sleeps == [0.5, 1.0]
+
+
+def test_honours_retry_after(sleeps, jitter):
+    fake = FakeCompletions(latency=0, script=[
+        (429, {'retry-after': '2.5'}), (429, {'retry-after-ms': '750'}),
+        (429, {'retry-after': '120'}), 200])
+    with serve(fake) as base_url:
+        gateway(base_url).complete('fake', MESSAGES, max_tokens=50)
+    # Capped at backoff_max; no jitter drawn
+    assert sleeps == [2.5, 0.75, 30.0]
+    assert jitter == []
+
+
+def test_gives_up_after_max_retries(sleeps, jitter):
+    fake = FakeCompletions(latency=0, script=[500] * 10)
+    with serve(fake) as base_url:
+        with pytest.raises(LLMUnavailable, match='after 3 attempts'):
+            gateway(base_url, max_retries=2).complete(
+                'fake', MESSAGES, max_tokens=50)
+    assert fake.stats['failed'] == 3
+    assert len(sleeps) == 2
+
+
+def test_exhausted_quota_fails_fast(sleeps):
+    import openai
+
+    fake = FakeCompletions(latency=0, script=[429, 200],
+                           rate_limit_code='insufficient_quota')
+    with serve(fake) as base_url:
+        with pytest.raises(openai.RateLimitError):
+            gateway(base_url).complete('fake', MESSAGES, max_tokens=50)
+    assert fake.stats['rate_limited'] == 1
+    assert sleeps == []
+
+
+def test_timeout_is_retried_then_unavailable(sleeps, jitter):
+    fake = FakeCompletions(latency=1.0)
+    with serve(fake) as base_url:
+        with pytest.raises(LLMUnavailable, match='timeout'):
+            gateway(base_url, timeout=0.1, max_retries=1).complete(
+                'fake', MESSAGES, max_tokens=50)
+    assert len(sleeps) == 1
+
+
+def test_tokens_settled_against_usage(sleeps):
+    clock = FixedClock()
+    fake = FakeCompletions(latency=0)
+    with serve(fake) as base_url:
+        client = gateway(base_url)
+        client.tokens = TokenBucket(1000, clock=clock, sleep=sleeps.append)
+        client.complete('fake', MESSAGES, max_tokens=50)
+    # Reserved 400 // 4 + 50 up front, then charged the reported usage
+    usage = fake.completion({'messages': MESSAGES})['usage']
+    assert usage['total_tokens'] != 400 // 4 + 50
+    assert client.tokens._tokens == 1000 - usage['total_tokens']
+
+
+def test_failed_attempts_refund_their_tokens(sleeps, jitter):
+    clock = FixedClock()
+    fake = FakeCompletions(latency=0, script=[500, 500])
+    with serve(fake) as base_url:
+        client = gateway(base_url, max_retries=1)
+        client.tokens = TokenBucket(1000, clock=clock, sleep=sleeps.append)
+        with pytest.raises(LLMUnavailable):
+            client.complete('fake', MESSAGES, max_tokens=50)
+    assert client.tokens._tokens == 1000
+
+
+def test_request_bucket_paces_bursts():
+    clock = FixedClock()
+    slept = []
+    bucket = TokenBucket(60, clock=clock, sleep=slept.append)
+    for _ in range(60):
+        assert bucket.acquire() == 0.0
+    # One request a second once the burst is spent, queued in order
+    assert bucket.acquire() == pytest.approx(1.0)
+    assert bucket.acquire() == pytest.approx(2.0)
+    assert slept == pytest.approx([1.0, 2.0])
+    clock.now += 10
+    bucket.refund(1)
+    assert bucket._tokens == pytest.approx(9.0)
+
+
+def test_unavailable_provider_is_a_503_with_retry_after(monkeypatch, sleeps, jitter):
+    fake = FakeCompletions(latency=0, error_rate=1.0)
+    with serve(fake) as base_url:
+        monkeypatch.setattr(app, 'llm_gateway',
+                            gateway(base_url, max_retries=1, backoff_max=7))
+        response = app.app.test_client().post('/generate-soil-comments', json={
+            'section': 'Summary', 'deficient': ['Calcium'], 'cache': 'bypass'})
+    assert response.status_code == 503
+    assert response.headers['Retry-After'] == '7'
+    assert 'error' in response.get_json()
+    assert fake.stats['failed'] == 2
@@ -0,0 +1,142 @@
+"""MetadataIndex answers info() exactly as the table-rescanning
+extract_analysis_info it replaced, kept here as the reference."""
+import random
+import re
+
+import pytest
+
+from app import MetadataIndex
+
+
+def extract_analysis_info(tables, table_idx):
+    """The original lookup: rescan tables 0..table_idx for every analysis."""
+    info = {
+        'name': f'Analysis {table_idx + 1}',
+        'page': table_idx + 1,
+        'crop': 'Unknown',
+        'location': 'Unknown',
+        'date': 'Unknown',
+        'paddock': 'Unknown'
+    }
+    date_pattern = re.compile(r"\d{2}/\d{2}/\d{4}")
+
+    if table_idx > 0:
+        prev_table = tables[table_idx - 1]
+        if 2 <= len(prev_table) <= 4:
+            rows = [row[0] if row and isinstance(row[0], str) else '' for row in prev_table]
+            rows = [r.strip() for r in rows if r and r.strip()]
+            if len(rows) >= 2:
+                if not date_pattern.match(rows[0]):
+                    info['crop'] = rows[0]
+                if len(rows) > 1:
+                    if not date_pattern.match(rows[1]) and rows[1] != info['crop']:
+                        info['paddock'] = rows[1]
+                if len(rows) > 2:
+                    if date_pattern.match(rows[2]):
+                        info['date'] = rows[2]
+
+    for idx in range(0, table_idx + 1):
+        if idx < 0 or idx >= len(tables):
+            continue
+        table = tables[idx]
+        if 2 <= len(table) <= 4:
+            rows = [row[0] if row and isinstance(row[0], str) else '' for row in table]
+            rows = [r.strip() for r in rows if r and r.strip()]
+            if len(rows) >= 2:
+                if info['crop'] == 'Unknown' and not date_pattern.match(rows[0]):
+                    info['crop'] = rows[0]
+                if info['paddock'] == 'Unknown' and len(rows) > 1:
+                    if not date_pattern.match(rows[1]) and rows[1] != info['crop']:
+                        info['paddock'] = rows[1]
+                if info['date'] == 'Unknown' and len(rows) > 2:
+                    if date_pattern.match(rows[2]):
+                        info['date'] = rows[2]
+        for row in table:
+            if not row:
+                continue
+            row_text = ' '.join([str(cell) for cell in row if cell])
+            paddock_match = re.search(r"PADDOCK:?\s*([\w\-\s]+)", row_text, re.IGNORECASE)
+            if paddock_match:
+                paddock_val = paddock_match.group(1).strip()
+                if paddock_val:
+                    info['paddock'] = paddock_val
+            if info['crop'] == 'Unknown':
+                crop_match = re.search(r"CROP:?\s*([\w\-\s]+)", row_text, re.IGNORECASE)
+                if crop_match:
+                    crop_val = crop_match.group(1).strip()
+                    if crop_val:
+                        info['crop'] = crop_val
+            if info['date'] == 'Unknown':
+                date_match = date_pattern.search(row_text)
+                if date_match:
+                    info['date'] = date_match.group(0)
+            if info['location'] == 'Unknown':
+                loc_match = re.search(r"LOCATION:?\s*([\w\-\s]+)", row_text, re.IGNORECASE)
+                if loc_match:
+                    loc_val = loc_match.group(1).strip()
+                    if loc_val:
+                        info['location'] = loc_val
+    return info
+
+
+CELLS = ['Wheat', 'Barley', 'Canola', 'Block 7', 'North', 'Unknown', '12/03/2024',
+         '01/11/2023', 'PADDOCK: Top Field', 'Paddock 4', 'CROP: Oats',
+         'LOCATION: Esperance', 'Location', 'Calcium', '1977.7', '1000 - 1500',
+         '  ', '', None, 7]
+
+
+def random_table(rng):
+    if rng.random() < 0.5:
+        # Short metadata-like table
+        return [[rng.choice(CELLS)] for _ in range(rng.randint(1, 5))]
+    return [[rng.choice(CELLS) for _ in range(rng.randint(0, 4))]
+            for _ in range(rng.randint(0, 8))]
+
+
+def random_tables(rng):
+    return [random_table(rng) for _ in range(rng.randint(1, 12))]
+
+
+def test_info_of_short_table_before_nutrient_table():
+    tables = [
+        [['LOCATION: Esperance']],
+        [['Wheat'], ['Block 7'], ['12/03/2024']],
+        [['Calcium', '1977.7', '1000 - 1500']],
+    ]
+    expected = extract_analysis_info(tables, 2)
+    assert expected == {'name': 'Analysis 3', 'page': 3, 'crop': 'Wheat',
+                        'location': 'Esperance', 'date': '12/03/2024',
+                        'paddock': 'Block 7'}
+    assert MetadataIndex(tables).info(2) == expected
+
+
+def test_explicit_paddock_overrides_earlier_tables():
+    tables = [
+        [['Wheat'], ['Block 7'], ['12/03/2024']],
+        [['PADDOCK: Top Field']],
+        [['Calcium', '1977.7', '1000 - 1500']],
+    ]
+    assert MetadataIndex(tables).info(2) == extract_analysis_info(tables, 2)
+    assert MetadataIndex(tables).info(2)['paddock'] == 'Top Field'
+
+
+@pytest.mark.parametrize('seed', range(20))
+def test_info_matches_rescanning_lookup(seed):
+    rng = random.Random(seed)
+    for _ in range(100):
+        tables = random_tables(rng)
+        index = MetadataIndex(tables)
+        for table_idx in range(len(tables)):
+            assert index.info(table_idx) == extract_analysis_info(tables, table_idx), (
+                tables, table_idx)
+
+
+def test_info_available_as_tables_are_added():
+    rng = random.Random(1234)
+    for _ in range(200):
+        tables = random_tables(rng)
+        index = MetadataIndex()
+        for table_idx, table in enumerate(tables):
+            index.add(table)
+            assert index.info(table_idx) == extract_analysis_info(tables, table_idx), (
+                tables, table_idx)
@@ -0,0 +1,148 @@
+"""iter_paddock_readings parses leaf reports exactly as the split-based
+parser it replaced, kept here as the reference."""
+import random
+import re
+
+import pytest
+
+from plant_nutritional_deviation_score_2 import iter_paddock_readings
+
+
+def split_paddock_readings(text):
+    """The original parser: split the whole text on "PADDOCK:" markers."""
+    raw_sections = text.split("PADDOCK:")
+
+    expected_nutrients = [
+        "N - Nitrogen", "P - Phosphorus", "K - Potassium", "S - Sulphur",
+        "Ca - Calcium", "Mg - Magnesium", "Na - Sodium", "Cu - Copper",
+        "Zn - Zinc", "Mn - Manganese", "Fe - Iron", "B - Boron",
+        "Mo - Molybdenum", "Si - Silicon", "Co - Cobalt"
+    ]
+
+    parsed = []
+
+    for section in raw_sections[1:]:
+        lines = section.splitlines()
+
+        paddock = next((line.strip() for line in lines if line.strip()), "Unknown")
+        paddock = paddock.replace("“", "\"").replace("”", "\"").replace("–", "-")
+
+        actual_values = []
+        i = 0
+        while i < len(lines):
+            line = lines[i].strip()
+            if any(n in line for n in expected_nutrients):
+                nutrient = line
+                j = i + 1
+                while j < len(lines):
+                    val_line = lines[j].strip()
+                    try:
+                        value = float(val_line)
+                        actual_values.append((nutrient, value))
+                        break
+                    except ValueError:
+                        j += 1
+                i = j
+            else:
+                i += 1
+
+        actual_values = actual_values[:15]
+
+        if "Plant TherapyTM" not in section:
+            print(f"⚠️ Skipping paddock '{paddock}' – no ideal range block.")
+            continue
+
+        range_block = section.split("Plant TherapyTM")[1]
+        range_lines = range_block.splitlines()
+        range_values = []
+        for line in range_lines:
+            line = line.strip()
+            if "N/A" in line:
+                continue
+            match = re.match(r"(\d+\.?\d*)\s*-\s*(\d+\.?\d*)", line)
+            if match:
+                range_values.append((float(match.group(1)), float(match.group(2))))
+
+        if len(range_values) == 0:
+            print(f"⚠️ Skipping paddock '{paddock}' – no usable ranges found.")
+            continue
+
+        readings = [(label, actual, min_val, max_val)
+                    for (label, actual), (min_val, max_val)
+                    in zip(actual_values[:len(range_values)], range_values)]
+        parsed.append((paddock, readings))
+
+    return parsed
+
+
+REPORT = """Leaf Analysis Report
+PADDOCK:
+Block “7” – North
+N - Nitrogen
+1.61
+%
+P - Phosphorus
+0.32
+K - Potassium
+N/A
+2.1
+Plant TherapyTM
+3.5 - 5.5
+0.3-0.5
+N/A
+1.8 - 2.5
+PADDOCK: Creek Flat
+N - Nitrogen
+4.2
+PADDOCK: Top Field
+B - Boron
+35
+Plant TherapyTM
+N/A
+"""
+
+TOKENS = ['PADDOCK:', 'Plant TherapyTM', 'N - Nitrogen', 'B - Boron', 'Zn - Zinc',
+          'Co - Cobalt', '1.5', ' 2 ', 'nan', '1e3', '-4', '3.2 - 4.5', '0.1-0.9',
+          'N/A', '', 'Block “7” – A', 'x', '\x0c', ' 12.5 - 13 extra',
+          '7 -', 'Paddock']
+
+
+def random_report(rng):
+    lines = []
+    for _ in range(rng.randint(0, 40)):
+        words = rng.choice([1, 1, 1, 2, 3])
+        lines.append(' '.join(rng.choice(TOKENS) for _ in range(words)))
+    return rng.choice(['\n', '\r\n']).join(lines)
+
+
+def assert_same_parse(text, capsys):
+    expected = split_paddock_readings(text)
+    expected_output = capsys.readouterr().out
+    # Compared as repr: a "nan" reading is never == itself
+    assert repr(list(iter_paddock_readings(text.splitlines()))) == repr(expected), text
+    assert capsys.readouterr().out == expected_output, text
+
+
+def test_report(capsys):
+    assert split_paddock_readings(REPORT) == [
+        ('Block "7" - North', [('N - Nitrogen', 1.61, 3.5, 5.5),
+                               ('P - Phosphorus', 0.32, 0.3, 0.5),
+                               ('K - Potassium', 2.1, 1.8, 2.5)])]
+    capsys.readouterr()
+    assert_same_parse(REPORT, capsys)
+
+
+def test_readings_capped_at_fifteen(capsys):
+    lines = ['PADDOCK: Long']
+    for i in range(20):
+        lines += ['Zn - Zinc', str(i)]
+    lines.append('Plant TherapyTM')
+    lines += [f'{i} - {i + 1}' for i in range(20)]
+    assert_same_parse('\n'.join(lines), capsys)
+
+
+@pytest.mark.parametrize('seed', range(20))
+def test_matches_split_parser(seed, capsys):
+    rng = random.Random(seed)
+    for _ in range(250):
+        assert_same_parse(random_report(rng), capsys)
@@ -0,0 +1,52 @@
+"""process_local builds once per process and starts over in a fork."""
+import os
+
+import pytest
+
+import ocr_pipeline
+from process_local import process_local
+
+pytestmark = pytest.mark.skipif(not hasattr(os, 'fork'), reason='needs fork()')
+
+
+def in_child(check):
+    """Run ``check()`` in a forked child; True if it returned truthy."""
+    pid = os.fork()
+    if pid == 0:
+        try:
+            os._exit(0 if check() else 1)
+        except BaseException:
+            os._exit(2)
+    _, status = os.waitpid(pid, 0)
+    return os.waitstatus_to_exitcode(status) == 0
+
+
+def test_built_once_per_process():
+    built = []
+    get = process_local(lambda: built.append(object()) or built[-1])
+    assert get() is get()
+    parent = get()
+    assert len(built) == 1
+    # The child builds its own instead of reusing the parent's copy
+    assert in_child(lambda: get() is not parent and len(built) == 2)
+    assert get() is parent
+
+
+def test_ocr_pool_and_page_cache_are_per_process(monkeypatch, tmp_path):
+    monkeypatch.setattr(ocr_pipeline, 'OCR_CACHE_PATH', str(tmp_path / 'ocr.sqlite3'))
+    monkeypatch.setattr(ocr_pipeline, 'OCR_MAX_WORKERS', 1)
+
+    def check():
+        # In a child of the test process, so the module-wide pool and
+        # cache of the test process itself are left alone
+        executor = ocr_pipeline.get_executor()
+        cache = ocr_pipeline.get_page_cache()
+        try:
+            return (ocr_pipeline.get_executor() is executor
+                    and cache is not None
+                    and in_child(lambda: ocr_pipeline.get_executor() is not executor
+                                 and ocr_pipeline.get_page_cache() is not cache))
+        finally:
+            executor.shutdown()
+
+    assert in_child(check)
@@ -0,0 +1,61 @@
+"""/generate-soil-comments/batch answers one result per named section and
+rejects sections it could not key before spending any completion."""
+import pytest
+
+import app
+
+
+@pytest.fixture
+def summaries(monkeypatch):
+    """Sections summarized, answering with their names."""
+    calls = []
+
+    def soil_section_summary(section):
+        calls.append(section['section'])
+        return f'summary of {section["section"]}'
+
+    monkeypatch.setattr(app, 'soil_section_summary', soil_section_summary)
+    return calls
+
+
+def post(body):
+    return app.app.test_client().post('/generate-soil-comments/batch', json=body)
+
+
+def test_one_summary_per_section(summaries):
+    response = post({'sections': [{'section': 'Cations'}, {'section': 'Trace'}]})
+    assert response.status_code == 200
+    assert response.get_json() == {
+        'summaries': {'Cations': 'summary of Cations', 'Trace': 'summary of Trace'},
+        'errors': {}}
+
+
+@pytest.mark.parametrize('sections, error', [
+    ([{'section': 'Cations'}, {'section': 'Cations'}], 'Duplicate sections: Cations'),
+    ([{'section': 'Cations'}, {'deficient': ['Calcium']}], 'needs a "section" name'),
+    ([{'section': ''}], 'needs a "section" name'),
+])
+def test_unkeyable_sections_are_rejected(summaries, sections, error):
+    response = post({'sections': sections})
+    assert response.status_code == 400
+    assert error in response.get_json()['error']
+    assert summaries == []
+
+
+def test_paddocks_are_checked_before_any_is_submitted(summaries):
+    response = post({'paddocks': [
+        {'id': 1, 'sections': [{'section': 'Cations'}]},
+        {'id': 2, 'sections': [{'section': 'Trace'}, {'section': 'Trace'}]}]})
+    assert response.status_code == 400
+    assert response.get_json()['error'] == 'Paddock 2: Duplicate sections: Trace'
+    assert summaries == []
+
+
+def test_paddocks_may_share_section_names(summaries):
+    response = post({'paddocks': [
+        {'id': 1, 'sections': [{'section': 'Cations'}]},
+        {'id': 2, 'sections': [{'section': 'Cations'}]}]})
+    assert response.status_code == 200
+    assert [p['summaries'] for p in response.get_json()['paddocks']] == [
+        {'Cations': 'summary of Cations'}] * 2
+    assert summaries == ['Cations', 'Cations']
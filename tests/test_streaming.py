@@ -0,0 +1,72 @@
+"""Streamed extraction sends each analysis as it is parsed and only keeps
+what fits the cache budget."""
+import io
+import json
+
+import pytest
+
+import app
+from cache import TieredCache
+
+PAGES = 5
+
+
+@pytest.fixture
+def cache(monkeypatch):
+    cache = TieredCache(memory_entries=16)
+    monkeypatch.setattr(app, 'extraction_cache', lambda: cache)
+    return cache
+
+
+@pytest.fixture
+def pages(monkeypatch, cache):
+    """Pages parsed so far by a fake iter_analyses yielding one per page."""
+    parsed = []
+
+    def iter_analyses(file, progress=None, **options):
+        for page in range(1, PAGES + 1):
+            parsed.append(page)
+            yield {'id': page - 1, 'info': {'page': page},
+                   'nutrients': [{'name': 'Calcium', 'current': float(page)}]}
+
+    monkeypatch.setattr(app, 'iter_analyses', iter_analyses)
+    return parsed
+
+
+def stream(pdf=b'%PDF-1.4 streamed'):
+    response = app.app.test_client().post(
+        '/extract-soil-report?stream=1',
+        data={'file': (io.BytesIO(pdf), 'report.pdf')}, buffered=False)
+    assert response.mimetype == 'application/x-ndjson'
+    return response
+
+
+def records(response):
+    return [json.loads(line) for line in
+            b''.join(response.response).decode('utf-8').splitlines()]
+
+
+def test_first_record_sent_before_last_page_is_parsed(pages):
+    response = stream()
+    first = json.loads(next(iter(response.response)))
+    assert first['type'] == 'analysis'
+    assert first['analysis']['info']['page'] == 1
+    assert pages[-1] < PAGES
+    rest = records(response)
+    assert [r['type'] for r in rest] == ['analysis'] * (PAGES - 1) + ['summary']
+    assert rest[-1]['count'] == PAGES
+
+
+def test_small_result_is_cached(pages, cache):
+    records(stream())
+    key = app.extraction_cache_key(b'%PDF-1.4 streamed', {})
+    assert len(cache.get(key)) == PAGES
+
+
+def test_result_over_budget_is_streamed_but_not_cached(pages, cache, monkeypatch):
+    monkeypatch.setattr(app, 'STREAM_CACHE_MAX_BYTES', 300)
+    result = records(stream())
+    assert result[-1] == {'type': 'summary', 'count': PAGES}
+    key = app.extraction_cache_key(b'%PDF-1.4 streamed', {})
+    assert pages == list(range(1, PAGES + 1))
+    assert cache.get(key) is None